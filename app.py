@@ -1,91 +1,92 @@
 import streamlit as st
-import requests
-import math
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import time
-import itertools
 import pandas as pd
+import numpy as np
 import json  # 👈 用來處理詳細的下注資料
+import csv
+import io
+from draw_archive import DrawArchive, fill_range, locate_draw
+from draw_refresher import TW, DrawRefresher, latest_expected_draw
+from backtest import PLAYS, backtest
+from bankroll_sim import simulate_bankroll
+from bet_model import Bet, PlayType
+from bet_analysis import hit_analysis, payout_distribution
+from draw_stats import CooccurrenceIndex, DrawMatrix
+from lotto_rules import DEFAULT_ODDS, car_cost, get_tail_numbers, touch_cost
+from record_journal import JournalFlusher, RecordJournal
+from record_pages import date_range, get_pager, invalidate, pending_row
+from slip_parser import SlipError, csv_lines, decode_slip, parse_bet, parse_slip, spec_cost, spec_touches
+from settlement import settle_dates, settle_slip, settlement_key, slip_details
+from slip_exposure import format_touch, slip_exposure
+from storage import STORAGE_SPEC, open_storage
+from touch_math import touch_counts
 
 # ==========================================
 # 🗄️ 資料庫初始化與工具函式
 # ==========================================
 st.set_page_config(layout="wide")
 
-def calculate_combinations(n, k):
-    if n < k: return 0
-    return math.comb(n, k)
-
-def get_tail_numbers(tail_digit):
-    return [i * 10 + tail_digit for i in range(4) if 1 <= i * 10 + tail_digit <= 39]
-
-def calculate_lizhu_touches(counts, star_level):
-    if len(counts) < star_level: return 0
-    total = 0
-    for combo in itertools.combinations(counts, star_level):
-        prod = 1
-        for c in combo: prod *= c
-        total += prod
-    return total
-
 # ==========================================
-# 💡 老弟特製版：X光掃描法 (無視網頁排版，強制抓取)
+# 💡 老弟特製版：X光掃描法 + 本地開獎資料庫 (增量同步)
 # ==========================================
-@st.cache_data(ttl=600)  # 快取 10 分鐘，不卡頓
+@st.cache_resource
+def get_draw_archive():
+    return DrawArchive()
+
+@st.cache_resource
+def get_draw_refresher():
+    # 背景依開獎排程自動更新，所有 session 共用同一個
+    return DrawRefresher(get_draw_archive()).start()
+
+@st.cache_resource
+def get_record_journal():
+    # 存檔先寫本機日誌 (重開機也不會掉)，所有 session 共用
+    return RecordJournal()
+
+@st.cache_resource
+def get_journal_flusher():
+    # 背景把日誌整批送進儲存後端；store 在下面初始化後才有，第一次存檔時才會用到
+    return JournalFlusher(get_record_journal(), store).start()
+
+@st.cache_resource
+def get_local_storage(spec):
+    # 本機 SQLite / 記憶體後端 (LTO539_STORAGE=sqlite:檔名 或 memory)，所有 session 共用同一個
+    return open_storage(spec)
+
+@st.cache_resource(max_entries=1)
+def get_draw_matrix(newest, count):
+    # newest / count 只用來當快取鍵：資料庫有新開獎才重建矩陣
+    # 只用從最新一期連續接下來的那段 (查舊日期存進來的零散舊頁會讓「前 N 期」跳期)
+    return DrawMatrix.from_draws(get_draw_archive().contiguous(None))
+
+@st.cache_resource
+def get_cooccurrence_index():
+    # 2星/3星同開索引：整個 process 共用，新開獎增量加入
+    return CooccurrenceIndex()
+
+@st.cache_data(max_entries=50)
+def get_payout_distribution(dist_key, _bets, _odds):
+    # dist_key = settlement_key(整張單, (), 賠率)：只用內容雜湊當快取鍵，不用每次重跑都把整張單轉 JSON
+    return payout_distribution(_bets, _odds)
+
+@st.cache_data(max_entries=50)
+def get_slip_exposure(bets_json):
+    return slip_exposure([Bet.from_compact(b) for b in json.loads(bets_json)])
+
+def bulk_progress(bar, label):
+    # bulk_write 每送完一個 batch 回報一次 (在主執行緒)，更新進度條
+    return lambda done, total: bar.progress(done / total if total else 1.0, text=f"{label} {done:,}/{total:,} 筆")
+
+def journal_records(records):
+    # 損益紀錄寫進本機日誌就返回，叫醒背景執行緒送上 Firestore；損益表會把還在排隊的一起顯示
+    get_record_journal().append(st.session_state.logged_in_user, records)
+    get_journal_flusher().notify()
+    invalidate(st.session_state.record_pages, st.session_state.logged_in_user)
+
 def get_recent_100_draws():
-    import re # 引入正則表達式模組
-    results = []
-    session = requests.Session()
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-    
-    # 雙重保險：BIG 版抓不到就抓標準版
-    urls = [f"https://www.pilio.idv.tw/lto539/list539BIG.asp?indexpage={i}&orderby=new" for i in range(1, 4)]
-    urls += [f"https://www.pilio.idv.tw/lto539/list.asp?indexpage={i}&orderby=new" for i in range(1, 4)]
-    
-    for url in urls:
-        if len(results) >= 100: break # 抓滿 100 筆就停
-        try:
-            r = session.get(url, headers=headers, timeout=10)
-            try: html_text = r.content.decode('big5')
-            except: html_text = r.content.decode('utf-8', errors='ignore')
-                
-            soup = BeautifulSoup(html_text, "html.parser")
-            
-            # 掃描每一行
-            for row in soup.find_all("tr"):
-                row_text = row.get_text(separator=' ', strip=True)
-                
-                # 1. 找日期 (特徵：YYYY/MM/DD)
-                date_match = re.search(r'(\d{4}/\d{2}/\d{2})', row_text)
-                if not date_match: continue
-                dt_str = date_match.group(1)
-                
-                # 2. 找號碼 (特徵：5個 2位數)
-                nums = []
-                for cell in row.find_all(['td', 'span', 'div', 'font']):
-                    # 把所有的逗號、全形頓號、隱藏空白全部變成普通空白
-                    c_text = cell.get_text(strip=True).replace(',', ' ').replace('、', ' ').replace('\xa0', ' ')
-                    
-                    # 把字串切開，只要長度是 2 且都是數字的，就收起來
-                    tokens = [t for t in c_text.split() if t.isdigit() and len(t) == 2]
-                    
-                    if len(tokens) >= 5: # 成功抓到至少 5 個號碼
-                        nums = sorted([int(t) for t in tokens[:5]])
-                        break
-                        
-                    # 防呆：如果網頁把數字黏在一起 (例如 0102030405)
-                    if len(c_text) == 10 and c_text.isdigit():
-                        nums = sorted([int(c_text[k:k+2]) for k in range(0, 10, 2)])
-                        break
-                        
-                # 確保有抓到且不重複
-                if len(nums) == 5 and not any(d == dt_str for d, n in results):
-                    results.append((dt_str, nums))
-        except Exception as e:
-            continue
-            
-    return results
+    get_draw_refresher().ensure_fresh() # 舊資料先給，背景再更新
+    return get_draw_archive().contiguous(100)
 
 # --- 1. 網頁基本配置 ---
 st.set_page_config(page_title="539 專業管理系統", layout="wide")
@@ -156,6 +157,9 @@ if 'page' not in st.session_state: st.session_state.page = "首頁"
 if 'my_bets' not in st.session_state: st.session_state.my_bets = []
 if 'reset_id' not in st.session_state: st.session_state.reset_id = 0
 if 'show_result' not in st.session_state: st.session_state.show_result = False
+if 'record_pages' not in st.session_state: st.session_state.record_pages = {} # 損益表分頁快取 (使用者, 起, 迄) → RecordPager
+if 'record_page_no' not in st.session_state: st.session_state.record_page_no = {}
+if 'seen_pending' not in st.session_state: st.session_state.seen_pending = {} # 帳號 → 上次看到還在本地日誌的冪等鍵
 if "history_df" not in st.session_state:
     import pandas as pd # 確保有載入 pandas
     st.session_state.history_df = pd.DataFrame()
@@ -167,29 +171,33 @@ def go_to(page_name):
 
 # ==========================================
 # ☁️ Google Firebase 雲端資料庫初始化 (機密安全版)
+# 帳號 / 損益紀錄 / 彙總都透過 store 存取 (storage.py)；設 LTO539_STORAGE=memory 或 sqlite:檔名 就完全不連雲端
 # ==========================================
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-import json
-
-if not firebase_admin._apps:
-    try:
-        # 判斷是否在 Streamlit Cloud 雲端環境
-        if "firebase" in st.secrets:
-            # ☁️ 從 Streamlit 雲端機密保險箱讀取
-            key_dict = json.loads(st.secrets["firebase"]["my_project_settings"])
-            cred = credentials.Certificate(key_dict)
-        else:
-            # 💻 本地端電腦測試時，讀取實體檔案
-            cred = credentials.Certificate('firebase_key.json')
-            
-        firebase_admin.initialize_app(cred)
-    except Exception as e:
-        st.error(f"❌ Firebase 初始化失敗，請檢查金鑰設定！錯誤訊息：{e}")
-        st.stop()
+if STORAGE_SPEC == "firestore":
+    import firebase_admin
+    from firebase_admin import credentials
+    from firebase_admin import firestore
+    from firestore_storage import FirestoreStorage
 
-db = firestore.client()
+    if not firebase_admin._apps:
+        try:
+            # 判斷是否在 Streamlit Cloud 雲端環境
+            if "firebase" in st.secrets:
+                # ☁️ 從 Streamlit 雲端機密保險箱讀取
+                key_dict = json.loads(st.secrets["firebase"]["my_project_settings"])
+                cred = credentials.Certificate(key_dict)
+            else:
+                # 💻 本地端電腦測試時，讀取實體檔案
+                cred = credentials.Certificate('firebase_key.json')
+                
+            firebase_admin.initialize_app(cred)
+        except Exception as e:
+            st.error(f"❌ Firebase 初始化失敗，請檢查金鑰設定！錯誤訊息：{e}")
+            st.stop()
+
+    store = FirestoreStorage(firestore.client())
+else:
+    store = get_local_storage(STORAGE_SPEC)
 
 # ==========================================
 # 🧮 計算機初始化與核心運算邏輯 (終極文字解析版)
@@ -197,10 +205,35 @@ db = firestore.client()
 if 'calc_text' not in st.session_state: st.session_state.calc_text = ""
 if 'calc_result' not in st.session_state: st.session_state.calc_result = ""
 
+def sidebar_odds():
+    # ⚙️ 側邊欄的成本 / 獎金設定 (兌獎、預測回測共用同一組 key，換頁數值不會跑掉)
+    st.sidebar.header("⚙️ 全局參數設定")
+    with st.sidebar.expander("🚗 坐車成本 (10元基準)", expanded=False):
+        base_rate = 10 
+        base_cost_val = st.number_input(f"坐車 {base_rate} 元 = ? (成本)", value=304, step=1, key="sb_base_cost")
+
+    with st.sidebar.expander("💥 連碰/立柱成本 (折扣)", expanded=False):
+        combo_discount = st.number_input("連碰/立柱折扣 (預設 0.78)", value=0.78, step=0.01, format="%.2f", key="sb_combo_discount")
+
+    st.sidebar.subheader("💰 獎金 (賠率) 設定")
+    with st.sidebar.expander("🚗 坐車獎金", expanded=False):
+        prize_car_base = st.number_input(f"坐車 {base_rate} 元 = ? (獎金)", value=2120, step=10, key="sb_p_car")
+
+    with st.sidebar.expander("💥 連碰/立柱獎金 (每 10 元)", expanded=False):
+        p_2star_val = st.number_input("二星獎金 (10元/碰)", value=530, step=10, key="sb_p2")
+        p_3star_val = st.number_input("三星獎金 (10元/碰)", value=5700, step=100, key="sb_p3")
+        p_4star_val = st.number_input("四星獎金 (10元/碰)", value=800000, step=1000, key="sb_p4")
+
+    # 💡 整包賠率設定，給風險分析、回測等引擎用
+    return {"car_cost": base_cost_val, "combo_discount": combo_discount, "car_prize": prize_car_base,
+            "star_prizes": {2: p_2star_val, 3: p_3star_val, 4: p_4star_val}}
+
+def calc_ev_html(analysis):
+    # 📐 超幾何精算結果：中獎機率、每 10 元期望回收、莊家優勢
+    return (f"<div style='margin-top:10px; font-size:18px; color:#555; text-align:right;'>"
+            f"📐 中獎機率 {analysis['p_win']:.2%} ｜ 每 10 元期望回收 {analysis['ev_per_10']:.2f} 元 ｜ 莊家優勢 {analysis['house_edge']:.1%}</div>")
+
 def handle_calc(key):
-    import math
-    import re
-    
     # 💡 將粗體按鈕符號轉換為運算邏輯符號
     if key == '➕': key = '+'
     elif key == '➖': key = '-'
@@ -250,100 +283,61 @@ def handle_calc(key):
     text = st.session_state.calc_text
     if not text: return
     
-    # 【模式 A】 539 專業模式
+    # 【模式 A】 539 專業模式 (與批次匯入共用同一套文法與成本算法)
     if any(k in text for k in ['柱', '碰', '車', '星']):
-        if '車' in text:
-            cars = re.findall(r'(\d+)車', text)
-            if not cars: 
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 格式錯誤 (例: 5車)</span>"
-                return
-            n = int(cars[-1])
-            if n > 39 or n < 1:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 號碼數量請介於 1~39</span>"
-                return
-            
-            car_cost = 304 ; car_prize = 2120 
-            total_cost = n * car_cost
+        try: spec = parse_bet(text)
+        except SlipError as e:
+            st.session_state.calc_result = f"<span style='color:#ff4b4b;'>⚠️ {e}</span>"
+            return
+        odds = st.session_state.get("calc_odds", DEFAULT_ODDS) # 計算機頁每次重跑都從側邊欄更新
+        total_cost = spec_cost(spec, odds)
+        prizes = odds["star_prizes"]
+
+        if spec['play'] == PlayType.CAR:
+            n = spec['singles']
+            car_prize = odds["car_prize"]
+            analysis = hit_analysis("car", (n,), odds=odds)
+            hit_probs = {h: prob for h, _, prob in analysis['outcomes']}
             win_scenarios = []
             for hits in range(min(n, 5), 0, -1):
                 prize = hits * car_prize
-                win_scenarios.append(f"<span style='color:#555;'>若中 {hits} 顆</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{prize:,} 元</span>")
+                win_scenarios.append(f"<span style='color:#555;'>若中 {hits} 顆</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{prize:,} 元</span> <span style='color:#888; font-size:16px;'>({hit_probs.get(hits, 0):.4%})</span>")
             
             win_html = "<div style='margin-top:15px; border-top:2px dashed #ccc; padding-top:15px; font-size:22px; line-height:1.6; text-align:right;'>" + "<br>".join(win_scenarios) + "</div>"
-            st.session_state.calc_result = f"買 {n} 個號碼坐車<br><span style='color:#0000ff; font-size:28px;'>總成本約 {total_cost:,} 元</span>{win_html}"
-
-        elif '柱' in text:
-            cols = [int(c) for c in re.findall(r'(\d+)柱', text)]
-            stars = [int(s) for s in re.findall(r'(\d)星', text)]
-            if len(cols) < 2:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 立柱至少需 2 柱</span>"
-                return
-            if any(c == 0 for c in cols):
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 每柱至少需 1 個號碼</span>"
-                return
-            if not stars:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 請選擇星等</span>"
-                return
-                
-            total_touches = 0; res_texts = []; prizes = {2: 530, 3: 5700, 4: 800000}
-            for k in stars:
-                touches = calculate_lizhu_touches(cols, k)
-                res_texts.append(f"{k}星 x {touches:,}碰")
-                total_touches += touches
-            
-            cost = math.ceil(total_touches * 10 * 0.78)
-            res_str = "、".join(res_texts)
+            st.session_state.calc_result = f"買 {n} 個號碼坐車<br><span style='color:#0000ff; font-size:28px;'>總成本約 {total_cost:,} 元</span>{win_html}{calc_ev_html(analysis)}"
+
+        elif spec['play'] == PlayType.LIZHU:
+            stars = spec['stars']
+            all_touches = spec_touches(spec)
+            total_touches = sum(all_touches[k] for k in stars)
+            res_str = "、".join(f"{k}星 x {all_touches[k]:,}碰" for k in stars)
+            # 💡 多變量超幾何精算：同柱、跨柱的所有中獎情況都算進去，只列獎金最高的幾種 (柱碰混合的連碰號碼每碼自成一柱)
+            analysis = hit_analysis("lizhu", spec['cols'] + [1] * spec['singles'], stars, odds)
             win_scenarios = []
-            for hits in range(min(len(cols), 5), 1, -1):
-                scenario_prize = 0; scenario_texts = []
-                for k in stars:
-                    if hits >= k:
-                        w_touches = calculate_combinations(hits, k)
-                        if w_touches > 0:
-                            scenario_prize += (w_touches * prizes[k])
-                            scenario_texts.append(f"{k}星{w_touches}碰")
-                if scenario_prize > 0:
-                    win_scenarios.append(f"<span style='color:#555;'>中 {hits} 顆(皆不同柱)</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{scenario_prize:,} 元</span>")
+            for hits, scenario_prize, prob in [o for o in analysis['outcomes'] if o[1] > 0][:8]:
+                win_scenarios.append(f"<span style='color:#555;'>中 {hits} 顆</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{scenario_prize:,} 元</span> <span style='color:#888; font-size:16px;'>({prob:.4%})</span>")
             
             win_html = "<div style='margin-top:15px; border-top:2px dashed #ccc; padding-top:15px; font-size:22px; line-height:1.6; text-align:right;'>" + "<br>".join(win_scenarios) + "</div>" if win_scenarios else ""
-            st.session_state.calc_result = f"{res_str}<br><span style='color:#0000ff; font-size:28px;'>共 {total_touches:,} 碰 ➔ 成本約 {cost:,} 元</span>{win_html}"
-
-        elif '碰' in text:
-            nums = [int(n) for n in re.findall(r'(\d+)碰', text)]
-            stars = [int(s) for s in re.findall(r'(\d)星', text)]
-            if not nums:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 格式錯誤 (例: 5碰2星)</span>"
-                return
-            n = nums[-1] 
-            if n < 2:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 連碰至少需 2 個號碼</span>"
-                return
-            if not stars:
-                st.session_state.calc_result = "<span style='color:#ff4b4b;'>⚠️ 請選擇星等</span>"
-                return
-                
-            total_touches = 0; res_texts = []; prizes = {2: 530, 3: 5700, 4: 800000}
-            for k in stars:
-                touches = calculate_combinations(n, k)
-                res_texts.append(f"{k}星 x {touches:,}碰")
-                total_touches += touches
-            
-            cost = math.ceil(total_touches * 10 * 0.78)
-            res_str = "、".join(res_texts)
+            st.session_state.calc_result = f"{res_str}<br><span style='color:#0000ff; font-size:28px;'>共 {total_touches:,} 碰 ➔ 成本約 {total_cost:,} 元</span>{win_html}{calc_ev_html(analysis)}"
+
+        else:
+            n, stars = spec['singles'], spec['stars']
+            all_touches = spec_touches(spec)
+            total_touches = sum(all_touches[k] for k in stars)
+            res_str = "、".join(f"{k}星 x {all_touches[k]:,}碰" for k in stars)
+            analysis = hit_analysis("combo", (n,), stars, odds)
+            hit_probs = {h: prob for h, _, prob in analysis['outcomes']}
             win_scenarios = []
             for hits in range(min(n, 5), 1, -1):
-                scenario_prize = 0; scenario_texts = []
+                scenario_prize = 0
+                won = touch_counts(singles=hits)
                 for k in stars:
-                    if hits >= k:
-                        w_touches = calculate_combinations(hits, k)
-                        if w_touches > 0:
-                            scenario_prize += (w_touches * prizes[k])
-                            scenario_texts.append(f"{k}星{w_touches}碰")
+                    if hits >= k and won[k] > 0: scenario_prize += (won[k] * prizes[k])
                 if scenario_prize > 0:
-                    win_scenarios.append(f"<span style='color:#555;'>若中 {hits} 顆</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{scenario_prize:,} 元</span>")
+                    win_scenarios.append(f"<span style='color:#555;'>若中 {hits} 顆</span> ➔ <span style='color:#ff0000; font-weight:bold;'>{scenario_prize:,} 元</span> <span style='color:#888; font-size:16px;'>({hit_probs.get(hits, 0):.4%})</span>")
             
             win_html = "<div style='margin-top:15px; border-top:2px dashed #ccc; padding-top:15px; font-size:22px; line-height:1.6; text-align:right;'>" + "<br>".join(win_scenarios) + "</div>" if win_scenarios else ""
-            st.session_state.calc_result = f"{res_str}<br><span style='color:#0000ff; font-size:28px;'>共 {total_touches:,} 碰 ➔ 成本約 {cost:,} 元</span>{win_html}"
+            st.session_state.calc_result = f"{res_str}<br><span style='color:#0000ff; font-size:28px;'>共 {total_touches:,} 碰 ➔ 成本約 {total_cost:,} 元</span>{win_html}{calc_ev_html(analysis)}"
     
     # 【模式 B】 一般數學模式
     else:
@@ -374,11 +368,9 @@ if st.session_state.logged_in_user is None:
             r_pass = st.text_input("設定密碼", type="password", key="r_pass")
             if st.form_submit_button("註冊", use_container_width=True):
                 if r_user and r_pass and r_nick:
-                    user_ref = db.collection('users').document(r_user)
-                    if user_ref.get().exists:
+                    if not store.create_user(r_user, {"password": r_pass, "nickname": r_nick}):
                         st.error("❌ 此帳號已被使用，請換一個！")
                     else:
-                        user_ref.set({"password": r_pass, "nickname": r_nick})
                         st.success("✅ 註冊成功！請切換到登入頁面登入。")
                 else:
                     st.warning("⚠️ 請輸入完整的註冊資料")
@@ -389,9 +381,8 @@ if st.session_state.logged_in_user is None:
             l_user = st.text_input("帳號", key="l_user")
             l_pass = st.text_input("密碼", type="password", key="l_pass")
             if st.form_submit_button("登入", use_container_width=True):
-                user_doc = db.collection('users').document(l_user).get()
-                if user_doc.exists:
-                    u_data = user_doc.to_dict()
+                u_data = store.get_user(l_user)
+                if u_data:
                     if u_data['password'] == l_pass:
                         st.session_state.logged_in_user = l_user
                         st.session_state.nickname = u_data.get('nickname', l_user)
@@ -451,6 +442,7 @@ if st.session_state.page == "首頁":
 # 🧮 獨立計算機頁面區塊 (RWD 適配版結構)
 # ==========================================
 elif st.session_state.page == "計算機":
+    st.session_state.calc_odds = sidebar_odds() # 成本 / 獎金跟兌獎、預測頁同一組側邊欄設定
     # 💡 終極保證版：手機回歸穩定 Grid (絕不爆版) + 電腦版霸氣鎖死
     st.markdown("""
     <style>
@@ -590,6 +582,7 @@ elif st.session_state.page == "計算機":
 
 elif st.session_state.page == "預測":
     if st.button("⬅️ 返回首頁"): go_to("首頁")
+    bt_odds = sidebar_odds() # 回測的成本 / 獎金跟兌獎頁同一組側邊欄設定
 
     # ==========================================
     # 🌟 新增：最上方「最新開出獎號」展示與手動更新
@@ -615,70 +608,61 @@ elif st.session_state.page == "預測":
             # 推一點空白，讓按鈕乖乖對齊到右下方
             st.markdown("<div style='height: 5px;'></div>", unsafe_allow_html=True)
             if st.button("🔄 更新號碼", use_container_width=True):
-                get_recent_100_draws.clear()  # 💡 殺掉 Streamlit 的舊快取
-                st.rerun()                    # 重新整理網頁，強制重新抓取
+                get_draw_refresher().refresh() # 💡 強制同步 (別人正在抓就等他的結果)
+                st.rerun()                     # 重新整理網頁，顯示最新資料
 
         st.write("---") # 畫一條分隔線區隔下方預測區
 
+    refresh_error = get_draw_refresher().last_error
+    if refresh_error: st.caption(f"⚠️ 上次更新開獎號碼失敗 ({type(refresh_error).__name__}: {refresh_error})，目前顯示的是資料庫裡已有的資料")
+
     # ==========================================
     # 原本的預測區標題與資料轉換
     # ==========================================
     st.subheader("🤖 專業大數據預測與趨勢分析")
 
-    # 把它轉換成預測區需要的格式
-    all_draws = []
-    if raw_draws:
-        for dt, nums in raw_draws:
-            all_draws.append({
-                "date": dt,
-                "nums": nums
-            })
+    # 💡 整個資料庫的 one-hot 矩陣 (有新開獎才重建)，換統計期數只是切不同列數
+    archive = get_draw_archive()
+    draw_matrix = get_draw_matrix(archive.newest(), archive.count())
 
     # ==========================================
     # 防呆機制與專業運算區
     # ==========================================
-    if not all_draws:
+    if len(draw_matrix) == 0:
         st.warning("⚠️ 網站嚴重改版或連線受阻，目前暫時無法取得最新開獎數據。")
     else:
-        import pandas as pd
-        
-        # 💡 只嚴格取最近 50 期
-        recent_50 = all_draws[:50]
+        window_options = {"近 10 期": 10, "近 50 期": 50, "近 100 期": 100, "近 500 期": 500, "全部": None, "自訂區間": "range"}
+        window_label = st.radio("📏 統計期數", list(window_options), index=1, horizontal=True)
         
-        stats = []
-        for n in range(1, 40):
-            # 計算出現次數
-            count = sum(1 for d in recent_50 if n in d['nums'])
-            last_date = "50期內未開"
-            distance = "超過50期"
-            
-            # 尋找最後一次出現的日期與距離期數
-            for i, d in enumerate(recent_50):
-                if n in d['nums']:
-                    last_date = d['date']
-                    distance = i
-                    break
-                    
-            stats.append({
-                "號碼": str(n).zfill(2),
-                "出現次數": count,
-                "上期出現日期": last_date,
-                "距離本期有幾期": distance
-            })
-            
-        stats_df = pd.DataFrame(stats)
+        if window_options[window_label] == "range":
+            # 💡 拖曳區間：前綴和索引讓任何區間都是 O(39)，拉到哪算到哪
+            date_axis = list(draw_matrix.dates[::-1])
+            start_date, end_date = st.select_slider(
+                "📅 拖曳選擇統計區間", options=date_axis,
+                value=(date_axis[max(0, len(date_axis) - 50)], date_axis[-1])
+            )
+            row_start, row_stop = draw_matrix.rows_between(start_date, end_date)
+            range_title = f"{start_date} ~ {end_date}"
+        else:
+            row_start, row_stop = 0, draw_matrix.window(window_options[window_label])
+            range_title = f"{row_stop} 期"
+        win = row_stop - row_start
         
-        # 熱門前 10 名
-        hot_df = stats_df.sort_values(by=["出現次數"], ascending=False).head(10)
+        # 出現次數、距離區間最後一期幾期、冷熱排名：全部由索引直接算出
+        freq = draw_matrix.range_frequency(row_start, row_stop)
+        gap = draw_matrix.range_last_seen(row_start, row_stop)
+        hot_order, cold_order = draw_matrix.range_hot_cold(row_start, row_stop)
         
-        # 冷門前 5 名 (為了排序，把'超過50期'暫時當作 50)
-        stats_df["sort_dist"] = stats_df["距離本期有幾期"].apply(lambda x: 50 if x == "超過50期" else x)
-        cold_df = stats_df.sort_values(by=["出現次數", "sort_dist"], ascending=[True, False]).head(10)
+        stats_df = pd.DataFrame({
+            "號碼": [str(n).zfill(2) for n in range(1, 40)],
+            "出現次數": freq,
+            "上期出現日期": np.where(gap >= 0, draw_matrix.dates[np.maximum(gap, 0) + row_start], f"{win}期內未開"),
+            "距離本期有幾期": [int(g) if g >= 0 else f"超過{win}期" for g in gap],
+        })
         
-        # 欄位整理
-        display_cols = ["號碼", "出現次數", "上期出現日期", "距離本期有幾期"]
-        hot_display = hot_df[display_cols]
-        cold_display = cold_df[display_cols]
+        # 熱門 / 冷門前 10 名
+        hot_display = stats_df.iloc[hot_order[:10] - 1]
+        cold_display = stats_df.iloc[cold_order[:10] - 1]
         
         # AI 包牌精選
         ai_picks = sorted([
@@ -737,7 +721,7 @@ elif st.session_state.page == "預測":
         c1, c_mid, c2 = st.columns([4.5, 1, 4.5])
         
         with c1:
-            st.markdown("### 🔥 50 期 TOP 10 熱門號碼")
+            st.markdown(f"### 🔥 {range_title} TOP 10 熱門號碼")
             st.markdown(render_custom_table(hot_display), unsafe_allow_html=True)
             
         with c_mid:
@@ -751,9 +735,38 @@ elif st.session_state.page == "預測":
             """, unsafe_allow_html=True)
             
         with c2:
-            st.markdown("### ❄️ 50 期 TOP 10 冷門號碼")
+            st.markdown(f"### ❄️ {range_title} TOP 10 冷門號碼")
             st.markdown(render_custom_table(cold_display), unsafe_allow_html=True)
 
+        st.markdown("---")
+        
+        # ==========================================
+        # 👯 2星 / 3星 同開組合 (連碰、立柱下注參考)
+        # ==========================================
+        co_index = get_cooccurrence_index()
+        if len(co_index) < archive.count(): co_index.add(archive.recent(None)) # 只會把新的期數加進去
+        
+        def combo_table(items):
+            return pd.DataFrame({
+                "組合": [" - ".join(f"{n:02d}" for n in combo) for combo, _ in items],
+                "同開次數": [cnt for _, cnt in items],
+            })
+        
+        st.markdown(f"### 👯 全部 {len(co_index)} 期 2星 / 3星 同開排行")
+        p1, p2, p3, p4 = st.columns(4)
+        with p1:
+            st.markdown("#### 🔥 熱門二星")
+            st.markdown(render_custom_table(combo_table(co_index.top_pairs(10))), unsafe_allow_html=True)
+        with p2:
+            st.markdown("#### ❄️ 冷門二星")
+            st.markdown(render_custom_table(combo_table(co_index.top_pairs(10, hot=False))), unsafe_allow_html=True)
+        with p3:
+            st.markdown("#### 🔥 熱門三星")
+            st.markdown(render_custom_table(combo_table(co_index.top_triples(10))), unsafe_allow_html=True)
+        with p4:
+            st.markdown("#### ❄️ 冷門三星")
+            st.markdown(render_custom_table(combo_table(co_index.top_triples(10, hot=False))), unsafe_allow_html=True)
+        
         st.markdown("---")
         # 下面接續你的 AI 推薦組合代碼...
 
@@ -766,6 +779,22 @@ elif st.session_state.page == "預測":
             st.session_state.calc_text = " ".join(ai_picks) + " "
             go_to("計算機")
             
+        # ==========================================
+        # 📈 回測：這個「3 熱 + 2 冷」邏輯過去到底賺還是賠？
+        # ==========================================
+        with st.expander(f"📈 回測「3 熱 + 2 冷」選號邏輯 (每期只用前 {win} 期資料選號)", expanded=False):
+            bt_play = st.radio("回測玩法 (每期 10 元，賠率用側邊欄設定)", list(PLAYS), index=1, horizontal=True, key="bt_play")
+            bt = backtest(draw_matrix, window=win, n_hot=3, n_cold=2, play=bt_play, odds=bt_odds)
+            if bt["draws"] == 0:
+                st.info(f"📭 資料庫只有 {len(draw_matrix)} 期，不夠做 {win} 期視窗的回測，請改選較短的統計期數。")
+            else:
+                b1, b2, b3, b4 = st.columns(4)
+                b1.metric(f"回測 {bt['draws']} 期總成本", f"{bt['cost']:,.0f} 元")
+                b2.metric("總獎金", f"{bt['prize']:,.0f} 元")
+                b3.metric("淨損益", f"{bt['profit']:,.0f} 元", delta=f"{bt['roi']:.1%}")
+                b4.metric("中獎率 / 最大回檔", f"{bt['hit_rate']:.1%}", delta=f"-{bt['max_drawdown']:,.0f} 元", delta_color="off")
+                st.line_chart(pd.DataFrame({"累計損益": bt["cum_pnl"]}, index=pd.to_datetime(bt["dates"], format="%Y/%m/%d")))
+        
         st.caption("⚠️ 免責聲明：本預測僅依據歷史數據進行機率統計，539 為獨立隨機事件，不保證中獎，請視為娛樂參考，量力而為！")
 
 # ==========================================
@@ -783,12 +812,11 @@ elif st.session_state.page == "帳戶設定":
         new_nick = st.text_input("修改暱稱", value=curr_nick)
         new_pass = st.text_input("修改新密碼 (不改請留空)", type="password")
         if st.form_submit_button("💾 儲存修改設定", use_container_width=True):
-            user_ref = db.collection('users').document(st.session_state.logged_in_user)
             update_data = {"nickname": new_nick}
             if new_pass.strip():
                 update_data["password"] = new_pass
             try:
-                user_ref.update(update_data)
+                store.update_user(st.session_state.logged_in_user, update_data)
                 st.session_state.nickname = new_nick 
                 st.success("✅ 雲端設定已同步更新！"); time.sleep(1); st.rerun()
             except Exception as e:
@@ -834,74 +862,80 @@ elif st.session_state.page == "損益表":
             st.warning("⚠️ 確定要清除所有對獎紀錄嗎？")
             st.error("此操作無法復原！")
             if st.button("🚨 確認刪除", type="primary", use_container_width=True):
+                bar = st.progress(0.0, text="🗑️ 刪除中...")
                 try:
-                    # ☁️ 雲端刪除需要一筆一筆刪 (或是批次刪除)
-                    batch = db.batch()
-                    docs_to_del = db.collection('records').where("username", "==", st.session_state.logged_in_user).stream()
-                    for doc in docs_to_del:
-                        batch.delete(doc.reference)
-                    batch.commit()
-                    st.toast("✅ 雲端歷史紀錄已全數清除！", icon="🗑️")
+                    # ☁️ 紀錄與彙總一起切成 ≤500 筆的 batch 平行刪除，上限不再卡在單一 batch
+                    n_del = get_record_journal().discard(st.session_state.logged_in_user) # 還沒送上去的也不要了
+                    n_del += store.clear_history(st.session_state.logged_in_user, progress=bulk_progress(bar, "🗑️ 刪除中"))
+                    invalidate(st.session_state.record_pages, st.session_state.logged_in_user)
+                    st.toast(f"✅ 雲端歷史紀錄已全數清除！(共 {n_del} 筆)", icon="🗑️")
                     time.sleep(1.5); st.rerun() 
                 except Exception as e:
+                    invalidate(st.session_state.record_pages, st.session_state.logged_in_user) # 可能已經刪掉一部分
                     st.error(f"❌ 雲端刪除失敗：{e}")
         
-   # ☁️ 從 Firebase 抓取資料
-    docs = db.collection('records').where("username", "==", st.session_state.logged_in_user).order_by("date", direction=firestore.Query.DESCENDING).stream()
-    
-    data_list = []
-    for doc in docs:
-        d = doc.to_dict()
-        data_list.append({
-            "開獎日期": d.get("date"),
-            "總成本": d.get("cost"),
-            "總獎金": d.get("prize"),
-            "淨損益": d.get("profit"),
-            "details": d.get("details")
-        })
-    df = pd.DataFrame(data_list)
+    # ☁️ 從 Firebase 抓取資料：日期區間在伺服器端篩、一次只抓一頁，抓過的頁留在 session 快取
+    range_start, range_end, display_title = date_range(time_filter, today, custom_date_range)
+    page_key = (range_start, range_end)
+    page_no = st.session_state.record_page_no.get(page_key, 0)
+    pending = []
+    if display_title is None:
+        display_title = "自訂區間 (請選擇完整日期)"
+        df = pd.DataFrame()
+    else:
+        # ⏳ 剛存、還在本地日誌排隊送上雲端的紀錄；上次還在、這次不在 = 已經送上去了，快取的頁要重抓
+        user = st.session_state.logged_in_user
+        pending_all = get_record_journal().pending(user)
+        pending_keys = {p['id'] for p in pending_all}
+        if st.session_state.seen_pending.get(user, set()) - pending_keys: invalidate(st.session_state.record_pages, user)
+        st.session_state.seen_pending[user] = pending_keys
+        if pending_all: get_journal_flusher() # 上次還沒送完就重開了：確定背景有人在送
+        pager = get_pager(st.session_state.record_pages, store, user, range_start, range_end)
+        if page_no and not pager.page(page_no): page_no = 0 # 紀錄變少 (刪除) 後原本的頁碼可能已經不存在
+        rows = pager.page(page_no)
+        # 剛好在這兩步之間送上去的，雲端那筆跟日誌那筆是同一個 ID，只留一筆
+        fetched = {r['id'] for r in rows}
+        pending = [p for p in pending_all if p['id'] not in fetched and p.get('date')
+                   and (not range_start or p['date'] >= range_start) and (not range_end or p['date'] <= range_end)]
+        if page_no == 0: rows = [pending_row(p) for p in reversed(pending)] + rows
+        df = pd.DataFrame(rows)
 
-    
-    display_title = time_filter # 用來顯示在統計總結上的文字
-    
-    if not df.empty:
-        df['開獎日期'] = pd.to_datetime(df['開獎日期'], format='mixed').dt.date
-        
-        if time_filter == "近一周":
-            target_date = today - timedelta(days=7)
-            df = df[df['開獎日期'] >= target_date]
-        elif time_filter == "近一個月":
-            target_date = today - timedelta(days=30)
-            df = df[df['開獎日期'] >= target_date]
-        elif time_filter == "自訂區間":
-            # 💡 處理自訂區間的過濾邏輯
-            if custom_date_range and len(custom_date_range) == 2:
-                start_date, end_date = custom_date_range
-                df = df[(df['開獎日期'] >= start_date) & (df['開獎日期'] <= end_date)]
-                display_title = f"{start_date} 至 {end_date}"
-            elif custom_date_range and len(custom_date_range) == 1:
-                # 萬一使用者只點了一天
-                start_date = custom_date_range[0]
-                df = df[df['開獎日期'] == start_date]
-                display_title = f"{start_date} 單日"
-            else:
-                display_title = "自訂區間 (請選擇完整日期)"
-                
     if df.empty:
         st.info(f"🔍 目前沒有【{display_title}】的對獎紀錄喔！")
     else:
-        total_cost = df['總成本'].sum()
-        total_prize = df['總獎金'].sum()
-        total_profit = df['淨損益'].sum()
+        df['開獎日期'] = pd.to_datetime(df['開獎日期'], format='mixed').dt.date
+        totals = pager.totals()
+        total_cost = totals['cost'] + sum(p.get('cost', 0) for p in pending)
+        total_prize = totals['prize'] + sum(p.get('prize', 0) for p in pending)
+        total_profit = totals['profit'] + sum(p.get('profit', 0) for p in pending)
+        if pending:
+            errs = [p['last_error'] for p in pending if p['attempts']]
+            st.caption(f"⏳ 有 {len(pending)} 筆剛存的紀錄正在同步到雲端 (已算進統計)" + (f"，上次失敗：{errs[-1]}" if errs else ""))
         
         st.write(f"### 📈 【{display_title}】統計總結")
         c1, c2, c3 = st.columns(3)
         c1.metric(f"區間總成本", f"{total_cost:,.0f} 元")
         c2.metric(f"區間總獎金", f"{total_prize:,.0f} 元")
         c3.metric(f"區間淨損益", f"{total_profit:,.0f} 元", delta=float(total_profit))
+
+        # 📉 累計損益與回檔：直接讀每日 / 每月彙總畫，不用抓全部紀錄
+        curve = pager.curve()
+        if curve and curve['periods']:
+            st.write("#### 📉 累計損益與回檔")
+            st.line_chart(pd.DataFrame({"累計損益": curve['cum_profit'], "回檔": curve['drawdown']}, index=curve['periods']))
+            st.caption(f"最大回檔：{curve['drawdown'].min():,.0f} 元")
         
         st.divider()
         st.subheader("📝 詳細對獎明細 (點擊展開看下了什麼)")
+
+        # 📄 翻頁：上一頁直接用快取，下一頁才從上一頁最後一筆接著抓
+        n_pages = -(-totals['n'] // pager.page_size)
+        p_prev, p_info, p_next = st.columns([1, 2, 1])
+        if p_prev.button("⬅️ 上一頁", disabled=page_no == 0, use_container_width=True):
+            st.session_state.record_page_no[page_key] = page_no - 1; st.rerun()
+        p_info.caption(f"第 {page_no + 1} / {max(n_pages, 1)} 頁 (共 {totals['n']} 筆)")
+        if p_next.button("下一頁 ➡️", disabled=page_no + 1 >= n_pages, use_container_width=True):
+            st.session_state.record_page_no[page_key] = page_no + 1; st.rerun()
         
         for idx, row in df.iterrows():
             date_str = str(row['開獎日期'])
@@ -909,9 +943,11 @@ elif st.session_state.page == "損益表":
             emoji = "🟢" if profit > 0 else "🔴" if profit < 0 else "⚪"
             
             expander_title = f"{emoji} {date_str} | 成本: {row['總成本']:,.0f} | 獎金: {row['總獎金']:,.0f} | 淨損益: {profit:,.0f} 元"
+            if row['pending']: expander_title = f"⏳ {expander_title} (同步中)"
             
             with st.expander(expander_title):
                 details_str = row['details']
+                restored = []
                 if pd.notna(details_str) and details_str:
                     try:
                         import json
@@ -929,10 +965,16 @@ elif st.session_state.page == "損益表":
                             
                             if b_idx < len(bets) - 1:
                                 st.markdown("---")
+                        restored = [Bet.from_detail(b) for b in bets]
                     except:
                         st.write("⚠️ 舊版紀錄，無法顯示詳細資料。")
                 else:
                     st.write("⚠️ 舊版紀錄，未儲存下注細節。")
+                # 💡 新版紀錄有存精簡下注格式，可以整張單原封不動載回兌獎區再對別期
+                if restored and all(restored):
+                    if st.button("📋 把這張單載入兌獎區", key=f"reload_{row['id']}"):
+                        st.session_state.my_bets = restored
+                        go_to("兌獎")
 
 # ==========================================
 # 🏆 兌獎區 (雙重保險，優先從快取對獎)
@@ -944,23 +986,7 @@ elif st.session_state.page == "兌獎":
     with col_title:
         st.title("📅 今彩 539 專業兌獎系統")
 
-    st.sidebar.header("⚙️ 全局參數設定")
-    with st.sidebar.expander("🚗 坐車成本 (10元基準)", expanded=False):
-        base_rate = 10 
-        base_cost_val = st.number_input(f"坐車 {base_rate} 元 = ? (成本)", value=304, step=1, key="sb_base_cost")
-        per_unit_cost = base_cost_val / base_rate
-
-    with st.sidebar.expander("💥 連碰/立柱成本 (折扣)", expanded=False):
-        combo_discount = st.number_input("連碰/立柱折扣 (預設 0.78)", value=0.78, step=0.01, format="%.2f", key="sb_combo_discount")
-
-    st.sidebar.subheader("💰 獎金 (賠率) 設定")
-    with st.sidebar.expander("🚗 坐車獎金", expanded=False):
-        prize_car_base = st.number_input(f"坐車 {base_rate} 元 = ? (獎金)", value=2120, step=10, key="sb_p_car")
-
-    with st.sidebar.expander("💥 連碰/立柱獎金 (每 10 元)", expanded=False):
-        p_2star_val = st.number_input("二星獎金 (10元/碰)", value=530, step=10, key="sb_p2")
-        p_3star_val = st.number_input("三星獎金 (10元/碰)", value=5700, step=100, key="sb_p3")
-        p_4star_val = st.number_input("四星獎金 (10元/碰)", value=800000, step=1000, key="sb_p4")
+    odds = sidebar_odds()
 
     st.subheader("📢 設定開獎號碼")
     data_source = st.radio("請選擇開獎號碼來源：", ["網路自動抓取", "手動輸入"], horizontal=True)
@@ -970,36 +996,19 @@ elif st.session_state.page == "兌獎":
 
     if data_source == "網路自動抓取":
         def get_539_data_by_date(target_date):
-            import re
             t_str = target_date.strftime("%Y/%m/%d")
             
-            # 1. 先從記憶體裡的 100 筆找，瞬間完成！
-            recent_draws = get_recent_100_draws()
-            for dt, nums in recent_draws:
-                if dt == t_str:
-                    return sorted(nums)
+            # 1. 先從本地資料庫的日期索引找，瞬間完成！
+            get_recent_100_draws()
+            archive = get_draw_archive()
+            nums = archive.get(t_str)
+            if nums: return nums
             
-            # 2. 如果選了很久以前的日期，用 X光法 去翻舊網頁
-            for i in range(3, 10): 
-                url = f"https://www.pilio.idv.tw/lto539/list539BIG.asp?indexpage={i}&orderby=new"
-                try:
-                    r = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-                    html_text = r.content.decode('big5', errors='ignore')
-                    soup = BeautifulSoup(html_text, "html.parser")
-                    
-                    for row in soup.find_all("tr"):
-                        row_text = row.get_text(separator=' ', strip=True)
-                        # 如果這行文字裡面有我們要的日期
-                        if t_str in row_text: 
-                            for cell in row.find_all(['td', 'span', 'div', 'font']):
-                                c_text = cell.get_text(strip=True).replace(',', ' ').replace('\xa0', ' ')
-                                tokens = [t for t in c_text.split() if t.isdigit() and len(t) == 2]
-                                if len(tokens) >= 5:
-                                    return sorted([int(t) for t in tokens[:5]])
-                                if len(c_text) == 10 and c_text.isdigit():
-                                    return sorted([int(c_text[k:k+2]) for k in range(0, 10, 2)])
-                except: pass
-            return None
+            # 2. 如果選了很久以前的日期，對舊網頁做二分搜尋 (翻到的整頁都存進資料庫，永久記住)
+            #    週日、還沒開獎的日期不用翻網頁
+            latest = latest_expected_draw(datetime.now(TW)).strftime("%Y/%m/%d")
+            try: return locate_draw(archive, t_str, latest=latest)
+            except Exception: return None
 
         fetched_numbers = get_539_data_by_date(pick_date)
 
@@ -1027,7 +1036,7 @@ elif st.session_state.page == "兌獎":
     st.divider()
 
     st.subheader("🕹️ 選擇投注玩法")
-    tab1, tab2, tab3 = st.tabs(["💥 綜合碰數 (連碰/立柱)", "🚗 坐車 (單選)", "🐾 坐尾數 (多選)"])
+    tab1, tab2, tab3, tab4 = st.tabs(["💥 綜合碰數 (連碰/立柱)", "🚗 坐車 (單選)", "🐾 坐尾數 (多選)", "📥 批次匯入"])
     rid = st.session_state.reset_id
 
     with tab1:
@@ -1059,13 +1068,14 @@ elif st.session_state.page == "兌獎":
                 elif len(flat_nums_with_dupes) != len(unique_nums): st.error("⚠️ 不同柱之間不能包含「重複」的號碼！")
                 elif not (buy_p2 or buy_p3 or buy_p4): st.warning("請至少勾選一種星等！")
                 else:
-                    p2 = calculate_lizhu_touches(counts, 2) if buy_p2 else 0
-                    p3 = calculate_lizhu_touches(counts, 3) if buy_p3 else 0
-                    p4 = calculate_lizhu_touches(counts, 4) if buy_p4 else 0
+                    t = touch_counts(counts)
+                    p2 = t[2] if buy_p2 else 0
+                    p3 = t[3] if buy_p3 else 0
+                    p4 = t[4] if buy_p4 else 0
                     total_t = p2 + p3 + p4
-                    # 💡 重點更新：從 round() 改成 math.ceil()，強迫無條件進位
-                    cost = math.ceil(total_t * combo_amt * combo_discount)
-                    st.session_state.my_bets.append({"type": mode, "cols": cols_data, "nums": sorted(list(unique_nums)), "bet_amount": combo_amt, "actual_cost": cost, "stars_bought": (buy_p2, buy_p3, buy_p4), "touches": (p2, p3, p4)})
+                    # 💡 重點更新：從 round() 改成 math.ceil()，強迫無條件進位 (與計算機、批次匯入同一套算法)
+                    cost = touch_cost(total_t, combo_amt, odds)
+                    st.session_state.my_bets.append(Bet.build(mode, cols=cols_data, bet_amount=combo_amt, actual_cost=cost, stars_bought=(buy_p2, buy_p3, buy_p4), touches=(p2, p3, p4)))
                     st.toast(f"已加入{mode}，共 {total_t} 碰")
 
         elif "連碰" in mode:
@@ -1080,24 +1090,25 @@ elif st.session_state.page == "兌獎":
                 if n < 2: st.warning("至少需 2 個號碼以上")
                 elif not (buy_p2 or buy_p3 or buy_p4): st.warning("請至少勾選一種星等！")
                 else:
-                    p2 = calculate_combinations(n, 2) if buy_p2 else 0
-                    p3 = calculate_combinations(n, 3) if buy_p3 else 0
-                    p4 = calculate_combinations(n, 4) if buy_p4 else 0
+                    t = touch_counts(singles=n)
+                    p2 = t[2] if buy_p2 else 0
+                    p3 = t[3] if buy_p3 else 0
+                    p4 = t[4] if buy_p4 else 0
                     total_t = p2 + p3 + p4
-                    # 💡 重點更新：改用 math.ceil() 無條件進位
-                    cost = math.ceil(total_t * combo_amt * combo_discount)
-                    st.session_state.my_bets.append({"type": mode, "nums": sorted(bet_nums), "bet_amount": combo_amt, "actual_cost": cost, "stars_bought": (buy_p2, buy_p3, buy_p4), "touches": (p2, p3, p4)})
+                    # 💡 重點更新：改用 math.ceil() 無條件進位 (與計算機、批次匯入同一套算法)
+                    cost = touch_cost(total_t, combo_amt, odds)
+                    st.session_state.my_bets.append(Bet.build(mode, nums=bet_nums, bet_amount=combo_amt, actual_cost=cost, stars_bought=(buy_p2, buy_p3, buy_p4), touches=(p2, p3, p4)))
                     st.toast(f"已加入{mode}，共 {total_t} 碰")
 
     with tab2:
         bet_car = st.multiselect("選擇坐車號碼：", options=range(1, 40), format_func=lambda x: f"{x:02d}", key=f"ms_car_{rid}")
         car_amt = st.number_input("下注金額 (倍率)", value=10, step=5, key=f"ni_car_amt_{rid}")
         # 💡 同步更新坐車成本，確保全系統一致無條件進位
-        c_cost = math.ceil(len(bet_car) * (car_amt * per_unit_cost))
+        c_cost = car_cost(len(bet_car), car_amt, odds)
         if st.button("➕ 加入坐車", key="btn_car"):
             if not bet_car: st.warning("請選號碼")
             else:
-                st.session_state.my_bets.append({"type": "坐車", "nums": sorted(bet_car), "bet_amount": car_amt, "actual_cost": c_cost})
+                st.session_state.my_bets.append(Bet.build("坐車", nums=bet_car, bet_amount=car_amt, actual_cost=c_cost))
                 st.toast("已加入坐車")
 
     with tab3:
@@ -1107,14 +1118,37 @@ elif st.session_state.page == "兌獎":
         for t in bet_tails: tail_nos.extend(get_tail_numbers(t))
         tail_nos = sorted(list(set(tail_nos)))
         # 💡 同步更新坐尾數成本
-        t_cost = math.ceil(len(tail_nos) * (tail_amt * per_unit_cost))
+        t_cost = car_cost(len(tail_nos), tail_amt, odds)
         if st.button("➕ 加入坐尾數", key="btn_tail"):
             if not bet_tails: st.warning("請至少選擇一個尾數")
             else:
                 tail_str = ",".join([str(t) for t in sorted(bet_tails)])
-                st.session_state.my_bets.append({"type": f"坐尾數({tail_str})", "nums": tail_nos, "bet_amount": tail_amt, "actual_cost": t_cost})
+                st.session_state.my_bets.append(Bet.build(f"坐尾數({tail_str})", nums=tail_nos, bet_amount=tail_amt, actual_cost=t_cost))
                 st.toast(f"已加入坐尾數({tail_str})")
 
+    with tab4:
+        # 📥 一次貼上 / 上傳整張單，文法跟計算機一樣，成本照側邊欄設定算
+        st.caption("一行一注，例：01 05 12 33碰2星3星 x20、01 02柱05 06 07柱2星、1尾柱3,5尾柱2星、01 05 12車、1,3尾車 (金額寫 x20 或 20元，預設 10 元；# 開頭是註解)")
+        slip_text = st.text_area("貼上下注單：", height=180, key=f"slip_text_{rid}")
+        slip_file = st.file_uploader("或上傳 .txt / .csv (CSV 第 1 欄下注內容、第 2 欄金額)", type=["txt", "csv"], key=f"slip_file_{rid}")
+        if st.button("📥 全部匯入", key="btn_import"):
+            lines = slip_text.splitlines()
+            if slip_file is not None:
+                try:
+                    text = decode_slip(slip_file.getvalue())
+                    lines = csv_lines(csv.reader(io.StringIO(text, newline=""))) if slip_file.name.lower().endswith(".csv") else text.splitlines()
+                except SlipError as e:
+                    st.error(f"⚠️ {e}")
+                    lines = None
+            if lines is not None:
+                new_bets, errors = parse_slip(lines, odds)
+                st.session_state.my_bets.extend(new_bets) # 整批一次加入，不用一注一注按
+                if new_bets: st.toast(f"已匯入 {len(new_bets)} 注")
+                if errors:
+                    st.error(f"⚠️ 有 {len(errors)} 行沒有匯入：")
+                    st.dataframe(pd.DataFrame(errors, columns=["行號", "內容", "錯誤"]), use_container_width=True, hide_index=True)
+                elif not new_bets: st.warning("沒有可以匯入的下注")
+
     if st.session_state.my_bets:
         st.write("---")
         st.subheader("📝 我的下注清單")
@@ -1129,21 +1163,20 @@ elif st.session_state.page == "兌獎":
         for idx, bet in enumerate(st.session_state.my_bets):
             st.markdown("<div style='margin: 10px 0;'>", unsafe_allow_html=True)
             c1, c2 = st.columns([4, 1.2])
-            play_type = bet['type']
-            title = f"**【{play_type}-{bet['bet_amount']}元】**"
+            title = f"**【{bet.label}-{bet.bet_amount}元】**"
 
-            if "連碰" in play_type or "立柱" in play_type:
-                t2, t3, t4 = bet['touches']
+            if bet.play in (PlayType.COMBO, PlayType.LIZHU):
+                t2, t3, t4 = bet.touches
                 touch_details = []
                 if t2 > 0: touch_details.append(f"2星{t2}碰")
                 if t3 > 0: touch_details.append(f"3星{t3}碰")
                 if t4 > 0: touch_details.append(f"4星{t4}碰")
-                detail_info = f"(成本:{bet['actual_cost']}元 / {'、'.join(touch_details)})"
-                if "立柱" in play_type: nums_str = " | ".join([",".join([f"{n:02d}" for n in sorted(col)]) for col in bet['cols']])
-                else: nums_str = ", ".join([f"{n:02d}" for n in bet['nums']])
+                detail_info = f"(成本:{bet.actual_cost}元 / {'、'.join(touch_details)})"
+                if bet.play == PlayType.LIZHU: nums_str = " | ".join([",".join([f"{n:02d}" for n in col]) for col in bet.cols])
+                else: nums_str = ", ".join([f"{n:02d}" for n in bet.nums])
             else:
-                detail_info = f"(成本:{bet['actual_cost']}元)"
-                nums_str = ", ".join([f"{n:02d}" for n in bet['nums']])
+                detail_info = f"(成本:{bet.actual_cost}元)"
+                nums_str = ", ".join([f"{n:02d}" for n in bet.nums])
             
             c1.markdown(f"#### {idx+1}. {title}: :red[**{nums_str}**]  \n&nbsp;&nbsp;&nbsp;&nbsp;{detail_info}")
             if c2.button("刪除", key=f"del_{idx}"):
@@ -1152,6 +1185,107 @@ elif st.session_state.page == "兌獎":
                 st.rerun()
             st.markdown("</div>", unsafe_allow_html=True)
 
+        # 📊 整張單對全部 575,757 種開獎結果的精確損益分佈 (邊下注邊更新)
+        with st.expander("📊 整張單風險分析 (全部 575,757 種開獎結果精算)", expanded=False):
+            dist = get_payout_distribution(settlement_key(st.session_state.my_bets, (), odds), st.session_state.my_bets, odds)
+            r1, r2, r3, r4 = st.columns(4)
+            r1.metric("總成本", f"{dist['cost']:,.0f} 元")
+            r2.metric("期望獎金", f"{dist['expected_prize']:,.1f} 元")
+            r3.metric("期望損益", f"{dist['expected_profit']:,.1f} 元", delta=f"{dist['expected_profit'] / dist['cost']:.1%}" if dist['cost'] else None)
+            r4.metric("賺錢機率", f"{dist['p_profit']:.2%}", delta=f"有中獎 {dist['p_any_win']:.2%}", delta_color="off")
+            q1, q2, q3 = st.columns(3)
+            q1.metric("最差情況", f"{dist['worst']:,.0f} 元")
+            q2.metric("中位數", f"{dist['percentiles'][50]:,.0f} 元")
+            q3.metric("最好情況", f"{dist['best']:,.0f} 元")
+            st.caption("損益百分位數：" + "、".join(f"P{q} {v:,.0f} 元" for q, v in dist['percentiles'].items()))
+
+        # 🔁 同一個 2星 / 3星 碰被好幾注重複買到、每個號碼押了多少
+        with st.expander("🔁 重複碰數與號碼曝險分析", expanded=False):
+            ex = get_slip_exposure(json.dumps([b.to_compact() for b in st.session_state.my_bets], ensure_ascii=False))
+            e1, e2 = st.columns(2)
+            for col, key, star in ((e1, "pairs", "2星"), (e2, "triples", "3星")):
+                info = ex[key]
+                col.metric(f"{star} 買到的碰數", f"{info['bought']:,} 碰", delta=f"不重複 {info['unique']:,} 碰", delta_color="off")
+                col.metric(f"{star} 重複買到", f"{info['duplicated']:,} 碰",
+                           delta=f"{info['duplicated'] / info['bought']:.1%}" if info['bought'] else None, delta_color="inverse")
+            for key, star in (("pairs", "2星"), ("triples", "3星")):
+                if ex[key]["top"]:
+                    st.write(f"**{star} 重複最多的碰**")
+                    st.dataframe(pd.DataFrame([{"碰": format_touch(nums), "買到次數": n, "哪幾注 (清單順序)": "、".join(f"第{i}注" for i in holders)}
+                                               for nums, n, holders in ex[key]["top"]]), use_container_width=True, hide_index=True)
+            if not (ex["pairs"]["top"] or ex["triples"]["top"]): st.success("✅ 沒有重複買到的 2星 / 3星 碰")
+            by_num = ex["by_number"]
+            st.write("**每個號碼的曝險** (碰數依倍率加權，開出這個號碼時牽動的碰)")
+            st.bar_chart(pd.DataFrame({"2星碰": by_num["pair_stake"], "3星碰": by_num["triple_stake"], "坐車": by_num["car_stake"]},
+                                      index=[f"{n:02d}" for n in range(1, 40)]))
+
+        # 🎲 同一張單連買 N 天的資金模擬
+        with st.expander("🎲 多日資金模擬 (每天都買這張單)", expanded=False):
+            m1, m2, m3 = st.columns(3)
+            sim_days = m1.number_input("連續幾天", min_value=1, max_value=365, value=30, step=1, key="sim_days")
+            sim_bankroll = m2.number_input("起始資金 (元)", min_value=0, value=100000, step=10000, key="sim_bankroll")
+            sim_paths = m3.selectbox("模擬次數", [100_000, 300_000, 1_000_000], index=1, format_func=lambda x: f"{x:,} 次", key="sim_paths")
+            # 網頁伺服器本身是多執行緒的，不在裡面 fork 子行程，只用目前這個執行緒算
+            # 路徑數 × 天數 最多 3000 萬格 (單核約 2 秒)，天數多就自動少模擬幾條路徑
+            run_paths = min(sim_paths, max(1, 30_000_000 // int(sim_days)))
+            if st.button("🎲 開始模擬", use_container_width=True):
+                with st.spinner("⏳ 模擬中..."):
+                    sim = simulate_bankroll(st.session_state.my_bets, days=int(sim_days), bankroll=sim_bankroll, paths=run_paths, odds=odds, processes=1)
+                if run_paths < sim_paths: st.caption(f"連續 {int(sim_days)} 天，模擬次數降為 {run_paths:,} 次")
+                s1, s2, s3, s4 = st.columns(4)
+                s1.metric("破產機率", f"{sim['p_ruin']:.2%}", delta=f"中位數第 {sim['median_ruin_day']:.0f} 天" if sim['median_ruin_day'] else None, delta_color="off")
+                s2.metric("最後有賺的機率", f"{sim['p_profit']:.2%}")
+                s3.metric("期末資金中位數", f"{sim['ending_percentiles'][50]:,.0f} 元")
+                s4.metric("最大回檔中位數", f"{sim['drawdown_percentiles'][50]:,.0f} 元")
+                st.caption("期末資金百分位數：" + "、".join(f"P{q} {v:,.0f} 元" for q, v in sim['ending_percentiles'].items()))
+                hist, edges = np.histogram(sim['ending'], bins=40)
+                st.bar_chart(pd.DataFrame({"路徑數": hist}, index=[f"{e:,.0f}" for e in edges[:-1]]))
+
+        # 📅 同一張單對一段日期的每一期一次對完 (不用一天一天換日期)
+        with st.expander("📅 多日連續對獎 (同一張單對一段日期)", expanded=False):
+            today = datetime.now().date()
+            range_pick = st.date_input("對獎日期區間", value=(today - timedelta(days=30), today), max_value=today, key="range_dates")
+            if st.button("🚀 區間全量對獎", use_container_width=True):
+                if len(range_pick) != 2: st.warning("請選擇開始與結束日期")
+                else:
+                    with st.spinner("⏳ 補齊區間開獎號碼並結算中..."):
+                        get_recent_100_draws()
+                        latest = latest_expected_draw(datetime.now(TW)).strftime("%Y/%m/%d")
+                        range_draws = fill_range(get_draw_archive(), range_pick[0], range_pick[1], latest=latest)
+                        st.session_state.range_result = settle_dates(st.session_state.my_bets, range_draws, odds) if range_draws else None
+                        # 整張單 + 賠率的雜湊：單或側邊欄賠率改了，舊結果就不能再拿來顯示 / 存檔
+                        st.session_state.range_key = settlement_key(st.session_state.my_bets, (), odds)
+                    if not range_draws: st.warning("🔍 這段日期找不到任何開獎資料")
+
+            rr = st.session_state.get("range_result")
+            if rr and st.session_state.get("range_key") == settlement_key(st.session_state.my_bets, (), odds):
+                g1, g2, g3, g4 = st.columns(4)
+                g1.metric("對獎期數", f"{len(rr['dates'])} 期")
+                g2.metric("區間總成本", f"{rr['cost'] * len(rr['dates']):,.0f} 元")
+                g3.metric("區間總獎金", f"{rr['prize'].sum():,.0f} 元")
+                g4.metric("區間淨損益", f"{rr['profit'].sum():,.0f} 元", delta=float(rr['profit'].sum()))
+                st.line_chart(pd.DataFrame({"累計損益": rr['cum_profit']}, index=pd.to_datetime(rr['dates'])))
+                st.dataframe(pd.DataFrame({
+                    "日期": rr['dates'],
+                    "開獎號碼": [", ".join(f"{n:02d}" for n in sorted(d)) for d in rr['draws']],
+                    "成本": rr['cost'], "獎金": rr['prize'], "損益": rr['profit'], "累計損益": rr['cum_profit']
+                }).iloc[::-1], use_container_width=True, hide_index=True)
+
+                if st.button("💾 整段儲存至損益表 (每期一筆)", type="primary"):
+                    try:
+                        # 先寫本機日誌馬上返回，背景再切 batch 平行送上雲端 (每日 / 每月彙總跟著所屬紀錄一起累加)
+                        journal_records([{
+                            "date": rr['dates'][j].replace("/", "-"),
+                            "cost": rr['cost'],
+                            "prize": float(rr['prize'][j]),
+                            "profit": float(rr['profit'][j]),
+                            "details": json.dumps(slip_details(st.session_state.my_bets, rr['draws'][j], rr['bet_prize'][:, j]), ensure_ascii=False),
+                        } for j in range(len(rr['dates']))])
+                        st.success(f"✅ 已將 {len(rr['dates'])} 期紀錄存檔，背景同步至 Google 雲端資料庫中！")
+                        st.session_state.range_result = None
+                    except Exception as e:
+                        st.error(f"❌ 存檔失敗：{e}")
+
     if st.button("🚀 開始全量對獎", type="primary", use_container_width=True):
         if not draw_numbers: st.error("無開獎號碼")
         elif not st.session_state.my_bets: st.warning("清單為空")
@@ -1160,55 +1294,48 @@ elif st.session_state.page == "兌獎":
             
     if st.session_state.show_result:
         st.header("🏆 對獎結果明細")
-        g_cost, g_prize = 0, 0
-        bet_details_list = [] # 👈 新增：用來收集每一組的下注與中獎細節
+        # 🧾 先整張單一次算完 (bitmask 批次結算)，下面只負責畫面
+        # 結果以 (整張單, 開獎號碼, 賠率設定) 的內容雜湊存在 session：三者沒變，頁面上其他操作都不用重算
+        settle_key = settlement_key(st.session_state.my_bets, draw_numbers, odds)
+        fresh_settle = st.session_state.get("settled_key") != settle_key
+        if fresh_settle:
+            settled = settle_slip(st.session_state.my_bets, draw_numbers, odds)
+            st.session_state.settled = {
+                "rows": settled,
+                "g_cost": sum(bet.actual_cost for bet in st.session_state.my_bets),
+                "g_prize": sum(r['prize'] for r in settled),
+                # 💡 幾千注就不一張一張展開了，改成一張表 (表也一起存起來)
+                "table": pd.DataFrame([{
+                    "組合": idx + 1, "玩法": bet.label, "中幾碼": r['hits'],
+                    "對中號碼": ", ".join(f"{n:02d}" for n in r['matched']),
+                    "二星碰": r['won'][0], "三星碰": r['won'][1], "四星碰": r['won'][2],
+                    "成本": r['cost'], "獎金": r['prize']
+                } for idx, (bet, r) in enumerate(zip(st.session_state.my_bets, settled))]) if len(settled) > 200 else None,
+                # 💡 收集每組的細節準備存檔
+                "details": [bet.detail(r['prize'], r['matched']) for bet, r in zip(st.session_state.my_bets, settled)],
+            }
+            st.session_state.settled_key = settle_key
+        settled_view = st.session_state.settled
+        g_cost, g_prize = settled_view['g_cost'], settled_view['g_prize']
+        bet_details_list = settled_view['details']
         
-        for idx, bet in enumerate(st.session_state.my_bets):
-            matched = sorted(list(set(bet['nums']) & set(draw_numbers)))
-            count = len(matched)
-            current_prize = 0
-            g_cost += bet['actual_cost']
-            with st.expander(f"組合 {idx+1}: 【{bet['type']}】 (共中 {count} 碼)", expanded=True):
-                if count > 0:
-                    st.success(f"🎯 對中號碼：{', '.join([f'{n:02d}' for n in matched])}")
-                    mul = bet.get('bet_amount', 10) / 10
-                    if "車" in bet['type'] or "坐" in bet['type']:
-                        current_prize = mul * prize_car_base * count
-                        st.info(f"🚗 中獎！")
-                    elif "立柱" in bet['type']:
-                        matched_counts_per_col = [len(set(col) & set(draw_numbers)) for col in bet['cols']]
-                        h2, h3, h4 = bet['stars_bought']
-                        p2_w = calculate_lizhu_touches(matched_counts_per_col, 2) if h2 else 0
-                        p3_w = calculate_lizhu_touches(matched_counts_per_col, 3) if h3 else 0
-                        p4_w = calculate_lizhu_touches(matched_counts_per_col, 4) if h4 else 0
-                        p2_p, p3_p, p4_p = (p2_w * p_2star_val) * mul, (p3_w * p_3star_val) * mul, (p4_w * p_4star_val) * mul
-                        current_prize = p2_p + p3_p + p4_p
-                        if p2_w > 0: st.write(f"🥈 二星中獎：{p2_w} 碰 (獎金 {p2_p:,.0f} 元)")
-                        if p3_w > 0: st.write(f"🥇 三星中獎：{p3_w} 碰 (獎金 {p3_p:,.0f} 元)")
-                        if p4_w > 0: st.write(f"💎 四星中獎：{p4_w} 碰 (獎金 {p4_p:,.0f} 元)")
-                    elif "連碰" in bet['type']:
-                        h2, h3, h4 = bet['stars_bought']
-                        p2_w = calculate_combinations(count, 2) if h2 else 0
-                        p3_w = calculate_combinations(count, 3) if h3 else 0
-                        p4_w = calculate_combinations(count, 4) if h4 else 0
-                        p2_p, p3_p, p4_p = (p2_w * p_2star_val) * mul, (p3_w * p_3star_val) * mul, (p4_w * p_4star_val) * mul
-                        current_prize = p2_p + p3_p + p4_p
-                        if p2_w > 0: st.write(f"🥈 二星中獎：{p2_w} 碰 (獎金 {p2_p:,.0f} 元)")
-                        if p3_w > 0: st.write(f"🥇 三星中獎：{p3_w} 碰 (獎金 {p3_p:,.0f} 元)")
-                        if p4_w > 0: st.write(f"💎 四星中獎：{p4_w} 碰 (獎金 {p4_p:,.0f} 元)")
-                    g_prize += current_prize
-                    st.markdown(f"#### 💰 獲得獎金：{current_prize:,.0f} 元")
-                else: 
-                    st.write("❌ 本組未中獎 (金額: 0 元)")
-            
-            # 💡 收集這組的細節準備存檔
-            bet_details_list.append({
-                "type": bet['type'],
-                "nums": bet['nums'],
-                "cost": bet['actual_cost'],
-                "prize": current_prize,
-                "matched": matched
-            })
+        if settled_view['table'] is not None:
+            st.dataframe(settled_view['table'], use_container_width=True, hide_index=True)
+        else:
+            for idx, (bet, r) in enumerate(zip(st.session_state.my_bets, settled_view['rows'])):
+                with st.expander(f"組合 {idx+1}: 【{bet.label}】 (共中 {r['hits']} 碼)", expanded=True):
+                    if r['hits'] > 0:
+                        st.success(f"🎯 對中號碼：{', '.join([f'{n:02d}' for n in r['matched']])}")
+                        if bet.play == PlayType.CAR:
+                            st.info(f"🚗 中獎！")
+                        else:
+                            (p2_w, p3_w, p4_w), (p2_p, p3_p, p4_p) = r['won'], r['star_prizes']
+                            if p2_w > 0: st.write(f"🥈 二星中獎：{p2_w} 碰 (獎金 {p2_p:,.0f} 元)")
+                            if p3_w > 0: st.write(f"🥇 三星中獎：{p3_w} 碰 (獎金 {p3_p:,.0f} 元)")
+                            if p4_w > 0: st.write(f"💎 四星中獎：{p4_w} 碰 (獎金 {p4_p:,.0f} 元)")
+                        st.markdown(f"#### 💰 獲得獎金：{r['prize']:,.0f} 元")
+                    else: 
+                        st.write("❌ 本組未中獎 (金額: 0 元)")
 
         st.divider()
         st.header("🏁 今日總結")
@@ -1218,7 +1345,7 @@ elif st.session_state.page == "兌獎":
         ca.write("(含折扣後成本)")
         cb.metric("總獎金", f"{g_prize:,.1f} 元")
         cc.metric("總最終損益", f"{f_profit:,.1f} 元", delta=float(f_profit))
-        if f_profit > 0: st.balloons()
+        if f_profit > 0 and fresh_settle: st.balloons() # 只在剛對完獎時放一次，不是每次重跑都放
         
         st.write("---")
         st.write("---")
@@ -1230,23 +1357,19 @@ elif st.session_state.page == "兌獎":
             details_json = json.dumps(bet_details_list, ensure_ascii=False)
             
             try:
-                # ☁️ 這是雲端版，請確認裡面是 db.collection... 而不是 sqlite3
-                db.collection('records').add({
-                    "username": st.session_state.logged_in_user,
+                # ☁️ 先寫本機日誌馬上返回，背景執行緒再連同當日 / 當月彙總送上雲端 (不用卡在這裡等 Firestore)
+                journal_records([{
                     "date": draw_date_str,
                     "cost": g_cost,
                     "prize": g_prize,
                     "profit": f_profit,
                     "details": details_json,
-                    "timestamp": firestore.SERVER_TIMESTAMP 
-                })
-                
-                st.success("✅ 本次紀錄已成功同步至 Google 雲端資料庫！")
-                time.sleep(1.5)
+                }])
+                st.toast("✅ 本次紀錄已存檔，背景同步至 Google 雲端資料庫中！")
                 st.rerun() 
             except Exception as e:
 
-                st.error(f"❌ 雲端存檔失敗：{e}")
+                st.error(f"❌ 存檔失敗：{e}")
 
 
 
@@ -0,0 +1,168 @@
+# ==========================================
+# 📈 選號策略回測引擎 (「N 熱 + M 冷」逐期重播，全部向量化)
+# 用法：python backtest.py [--top 20] [--processes 4]
+# ==========================================
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lotto_rules import BASE_RATE, DEFAULT_ODDS, calculate_combinations
+
+# 玩法 → 買哪些星等 (None = 坐車)
+PLAYS = {
+    "坐車": None,
+    "連碰2星": (2,),
+    "連碰3星": (3,),
+    "連碰2星3星": (2, 3),
+    "連碰4星": (4,),
+}
+
+
+def play_tables(play, n, odds=DEFAULT_ODDS, bet_amount=10):
+    """
+    回傳 (每期成本, 中 0~5 顆各拿多少獎金)，算法與兌獎頁完全相同：
+    坐車成本 = ceil(n × 金額 × 坐車成本/10)、獎金 = 倍率 × 坐車獎金 × 中幾顆
+    連碰成本 = ceil(碰數 × 金額 × 折扣)、獎金 = Σ C(中幾顆, k) × k 星獎金 × 倍率
+    """
+    mul = bet_amount / BASE_RATE
+    stars = PLAYS[play]
+    if stars is None:
+        cost = math.ceil(n * (bet_amount * odds["car_cost"] / BASE_RATE))
+        prizes = [mul * odds["car_prize"] * h for h in range(6)]
+    else:
+        touches = sum(calculate_combinations(n, k) for k in stars)
+        cost = math.ceil(touches * bet_amount * odds["combo_discount"])
+        prizes = [sum(calculate_combinations(h, k) * odds["star_prizes"][k] * mul for k in stars) for h in range(6)]
+    return cost, np.array(prizes, dtype=np.float64)
+
+
+def rankings(onehot, window):
+    """
+    每一期「開獎前」的熱門 / 冷門排序，只用它之前的 window 期 (row 0 = 最新)
+    回傳 (hot, cold)，shape 都是 (可回測期數, 39)，內容是號碼索引 (0~38)
+    """
+    n_draws = len(onehot)
+    testable = n_draws - window
+    if testable <= 0: return np.empty((0, 39), np.intp), np.empty((0, 39), np.intp)
+
+    prefix = np.zeros((n_draws + 1, 39), dtype=np.int64)
+    np.cumsum(onehot, axis=0, out=prefix[1:])
+    t = np.arange(testable)
+    freq = prefix[t + 1 + window] - prefix[t + 1]
+
+    # next_hit[r, n] = 第 r 列 (含) 以後第一次開出 n 的列號，用反向累積最小值一次算完
+    rows = np.arange(n_draws)[:, None]
+    next_hit = np.minimum.accumulate(np.where(onehot.astype(bool), rows, n_draws + window)[::-1], axis=0)[::-1]
+    gap = np.minimum(next_hit[t + 1] - (t + 1)[:, None], window)
+
+    # 與預測頁相同的排序：熱門 = 次數多優先；冷門 = 次數少優先、同次數越久沒開越前面；再同分看號碼小
+    num = np.arange(39)
+    hot = np.argsort(-freq * 64 + num, axis=1, kind="stable")
+    cold = np.argsort((freq * (window + 1) + (window - gap)) * 64 + num, axis=1, kind="stable")
+    return hot, cold
+
+
+def pick_hits(onehot, hot, cold, n_hot, n_cold):
+    """每期選 n_hot 個熱門 + n_cold 個冷門 (跳過已選的熱門)，回傳每期中幾顆"""
+    testable = len(hot)
+    picks = np.zeros((testable, 39), dtype=bool)
+    r = np.arange(testable)[:, None]
+    picks[r, hot[:, :n_hot]] = True
+    cand = cold[:, :n_hot + n_cold]
+    fresh = ~picks[r, cand]
+    take = fresh & (np.cumsum(fresh, axis=1) <= n_cold)
+    picks[np.broadcast_to(r, cand.shape)[take], cand[take]] = True
+    return (picks & onehot[:testable].astype(bool)).sum(axis=1)
+
+
+def summarize(hits, play, n, odds=DEFAULT_ODDS, bet_amount=10, with_curve=False):
+    """hits 是新 → 舊；回傳總成本、總獎金、淨損益、報酬率、中獎率、最大回檔 (依時間順序累計)"""
+    cost, prize_by_hits = play_tables(play, n, odds, bet_amount)
+    prizes = prize_by_hits[hits[::-1]]
+    pnl = np.cumsum(prizes - cost)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], pnl)))[1:]
+    total_cost = cost * len(hits)
+    result = {
+        "draws": len(hits),
+        "cost": float(total_cost),
+        "prize": float(prizes.sum()),
+        "profit": float(pnl[-1]) if len(pnl) else 0.0,
+        "roi": float(pnl[-1] / total_cost) if total_cost else 0.0,
+        "hit_rate": float((prizes > 0).mean()) if len(prizes) else 0.0,
+        "max_drawdown": float((peak - pnl).max()) if len(pnl) else 0.0,
+    }
+    if with_curve: result["cum_pnl"] = pnl
+    return result
+
+
+def backtest(matrix, window=50, n_hot=3, n_cold=2, play="連碰2星", odds=DEFAULT_ODDS, bet_amount=10):
+    """
+    重播單一策略：每一期只用更早的 window 期選號，再用兌獎規則結算
+    matrix 是 DrawMatrix；回傳 summarize() 的結果加上 dates / cum_pnl (舊 → 新)
+    """
+    onehot = np.asarray(matrix.onehot)
+    hot, cold = rankings(onehot, window)
+    hits = pick_hits(onehot, hot, cold, n_hot, n_cold)
+    result = summarize(hits, play, n_hot + n_cold, odds, bet_amount, with_curve=True)
+    result["dates"] = matrix.dates[:len(hits)][::-1]
+    return result
+
+
+# ==========================================
+# 🔁 參數掃描：依視窗分組丟進 process pool，每個視窗的排序只算一次
+# ==========================================
+_WORKER = {}
+
+
+def _init_worker(onehot, odds, bet_amount):
+    _WORKER.update(onehot=onehot, odds=odds, bet_amount=bet_amount)
+
+
+def _run_window(task):
+    window, splits, plays = task
+    onehot = _WORKER["onehot"]
+    hot, cold = rankings(onehot, window)
+    out = []
+    for n_hot, n_cold in splits:
+        hits = pick_hits(onehot, hot, cold, n_hot, n_cold)
+        for play in plays:
+            row = summarize(hits, play, n_hot + n_cold, _WORKER["odds"], _WORKER["bet_amount"])
+            row.update(window=window, n_hot=n_hot, n_cold=n_cold, play=play)
+            out.append(row)
+    return out
+
+
+def sweep(matrix, windows, splits, plays=tuple(PLAYS), odds=DEFAULT_ODDS, bet_amount=10, processes=None):
+    """回傳每組 (視窗, 熱/冷個數, 玩法) 的回測摘要 list[dict]"""
+    onehot = np.ascontiguousarray(matrix.onehot, dtype=np.uint8)
+    tasks = [(w, list(splits), list(plays)) for w in windows if w < len(onehot)]
+    if processes == 1:
+        _init_worker(onehot, odds, bet_amount)
+        return [row for task in tasks for row in _run_window(task)]
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(onehot, odds, bet_amount)) as pool:
+        return [row for rows in pool.map(_run_window, tasks) for row in rows]
+
+
+def main():
+    import pandas as pd
+    from draw_archive import DrawArchive
+    from draw_stats import DrawMatrix
+
+    parser = argparse.ArgumentParser(description="539 熱冷選號策略參數掃描")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    matrix = DrawMatrix.from_draws(DrawArchive().contiguous(None)) # 零散的舊頁不算 (會跳期)
+    windows = range(5, 505, 5)
+    splits = [(h, c) for h in range(0, 7) for c in range(0, 7) if 2 <= h + c <= 8]
+    rows = sweep(matrix, windows, splits, processes=args.processes)
+    df = pd.DataFrame(rows).sort_values("profit", ascending=False)
+    print(f"{len(matrix)} 期、{len(df)} 組參數")
+    print(df.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# ==========================================
+# 🎲 多日資金蒙地卡羅模擬 (同一張單連續買 N 天，會不會破產？)
+# ==========================================
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bet_analysis import all_draw_prizes
+from bet_model import as_bet
+from lotto_rules import DEFAULT_ODDS
+
+SHARD_CELLS = 2_000_000 # 每個分片最多 (路徑數 × 天數) 個格子，控制記憶體
+
+
+def _simulate_shard(net, cost, days, bankroll, n_paths, seed):
+    """
+    一個分片：n_paths 條路徑 × days 天
+    每天從 575,757 種開獎結果均勻抽一個，直接查整張單在該結果下的淨損益 (與兌獎結算同一套規則)
+    某天開始前資金不夠買整張單就算破產，之後資金凍結
+    """
+    rng = np.random.default_rng(seed)
+    outcome = rng.integers(0, len(net), size=(n_paths, days))
+    after = bankroll + np.cumsum(net[outcome], axis=1)
+    before = np.concatenate((np.full((n_paths, 1), float(bankroll)), after[:, :-1]), axis=1)
+
+    broke = before < cost
+    ruined = broke.any(axis=1)
+    ruin_day = np.where(ruined, broke.argmax(axis=1), days)
+    frozen = before[np.arange(n_paths), np.minimum(ruin_day, days - 1)]
+    path = np.where(np.arange(days) >= ruin_day[:, None], frozen[:, None], after)
+
+    peak = np.maximum.accumulate(np.concatenate((np.full((n_paths, 1), float(bankroll)), path), axis=1), axis=1)[:, 1:]
+    return path[:, -1], ruined, (peak - path).max(axis=1), ruin_day
+
+
+_WORKER = {}
+
+
+def _init_worker(net):
+    _WORKER["net"] = net
+
+
+def _run_shard(args):
+    return _simulate_shard(_WORKER["net"], *args)
+
+
+def simulate_bankroll(bets, days=30, bankroll=100_000, paths=1_000_000, odds=DEFAULT_ODDS,
+                      seed=539, processes=None, percentiles=(1, 5, 25, 50, 75, 95, 99)):
+    """
+    蒙地卡羅模擬每天買同一張單 days 天
+    同樣的 seed 與 paths 一定得到同樣結果 (分片切法固定，與 process 數無關)
+    回傳期末資金分佈、破產機率、最大回檔分佈等
+    """
+    cost = float(sum(as_bet(b).actual_cost for b in bets))
+    net = all_draw_prizes(bets, odds) - cost
+
+    shard_paths = max(1, SHARD_CELLS // days)
+    sizes = [min(shard_paths, paths - i) for i in range(0, paths, shard_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(cost, days, bankroll, n, s) for n, s in zip(sizes, seeds)]
+
+    if processes == 1 or len(tasks) == 1:
+        parts = [_simulate_shard(net, *t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(processes or min(len(tasks), os.cpu_count() or 1),
+                                 initializer=_init_worker, initargs=(net,)) as pool:
+            parts = list(pool.map(_run_shard, tasks))
+
+    ending, ruined, drawdown, ruin_day = (np.concatenate(x) for x in zip(*parts))
+    return {
+        "paths": paths,
+        "days": days,
+        "daily_cost": cost,
+        "mean_ending": float(ending.mean()),
+        "ending_percentiles": dict(zip(percentiles, np.percentile(ending, percentiles).tolist())),
+        "p_ruin": float(ruined.mean()),
+        "p_profit": float((ending > bankroll).mean()),
+        "median_ruin_day": float(np.median(ruin_day[ruined]) + 1) if ruined.any() else None,
+        "drawdown_percentiles": dict(zip(percentiles, np.percentile(drawdown, percentiles).tolist())),
+        "ending": ending,
+    }
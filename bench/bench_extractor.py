@@ -0,0 +1,71 @@
+# ==========================================
+# ⏱️ 開獎號碼解析效能測試：BeautifulSoup 整棵樹 vs 串流 token 掃描
+# 用法：python bench/bench_extractor.py [--repeat 200]
+# ==========================================
+import argparse
+import os
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from draw_source import decode_page, parse_draw_rows  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse_draw_rows(html_text, innermost_only=False):
+    """
+    舊版 X光掃描法 (原封不動)，innermost_only=True 時跳過包著整張表格的外層排版 <tr>
+    (= 裡面還有帶日期的 <tr>；內層小表格只放號碼的，外層那行照算)
+    """
+    results = []
+    soup = BeautifulSoup(html_text, "html.parser")
+    for row in soup.find_all("tr"):
+        if innermost_only and any(re.search(r'\d{4}/\d{2}/\d{2}', r.get_text(separator=' ', strip=True)) for r in row.find_all("tr")): continue
+        row_text = row.get_text(separator=' ', strip=True)
+        date_match = re.search(r'(\d{4}/\d{2}/\d{2})', row_text)
+        if not date_match: continue
+        dt_str = date_match.group(1)
+        nums = []
+        for cell in row.find_all(['td', 'span', 'div', 'font']):
+            c_text = cell.get_text(strip=True).replace(',', ' ').replace('、', ' ').replace('\xa0', ' ')
+            tokens = [t for t in c_text.split() if t.isdigit() and len(t) == 2]
+            if len(tokens) >= 5:
+                nums = sorted([int(t) for t in tokens[:5]])
+                break
+            if len(c_text) == 10 and c_text.isdigit():
+                nums = sorted([int(c_text[k:k+2]) for k in range(0, 10, 2)])
+                break
+        if len(nums) == 5 and not any(d == dt_str for d, n in results):
+            results.append((dt_str, nums))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if not name.endswith(".html"): continue
+        with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+            raw = f.read()
+
+        fast = parse_draw_rows(decode_page(raw))
+        ref = legacy_parse_draw_rows(decode_page(raw), innermost_only=True)
+        assert fast == ref, f"{name}: 串流版與舊版解析結果不一致"
+        assert fast, f"{name}: 一期都沒解析出來"
+        # 舊版會先掃到包住整張表的外層 <tr>，把好幾行的字黏在一起，最新一期常被配錯號碼
+        legacy_diff = [d for d, n in legacy_parse_draw_rows(decode_page(raw)) if (d, n) not in fast]
+
+        t_old = timeit.timeit(lambda: legacy_parse_draw_rows(decode_page(raw)), number=args.repeat) / args.repeat
+        t_new = timeit.timeit(lambda: parse_draw_rows(decode_page(raw)), number=args.repeat) / args.repeat
+        print(f"{name}: {len(fast)} 期 | BeautifulSoup {t_old * 1000:.2f} ms | 串流 {t_new * 1000:.2f} ms"
+              f" | 加速 {t_old / t_new:.1f}x | 舊版配錯 {legacy_diff or '無'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# ==========================================
+# ⏱️ 對沖請求離線測試：本機開兩個假的開獎網站 (BIG 版 / 標準版)，主來源偶爾卡住，比較尾端延遲
+# 跟正式環境一樣只對沖第 1 頁 (每次同步都會抓；第 2 頁以後版面不同，只做整版切換)
+# 用法：python bench/bench_hedging.py [--requests 200] [--slow-rate 0.04]
+# ==========================================
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from draw_source import PilioSource, hedged_fetch  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def start_stub(body, base_delay, slow_rate, slow_delay, fail_rate=0.0):
+    """回傳 (server, url_template)；每個請求照設定的延遲 / 失敗率回應同一頁"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(base_delay + (slow_delay if random.random() < slow_rate else 0))
+            if random.random() < fail_rate:
+                self.send_response(503); self.end_headers(); return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=big5")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/list.asp?indexpage={{page}}"
+
+
+def percentiles(xs):
+    xs = sorted(xs)
+    return {q: xs[min(len(xs) - 1, int(q / 100 * len(xs)))] * 1000 for q in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.04) # 對沖針對的是 p90 以外的尾巴
+    parser.add_argument("--slow-delay", type=float, default=1.0)
+    args = parser.parse_args()
+    random.seed(539)
+    logging.getLogger("draw_source").setLevel(logging.ERROR) # 故意製造的 503 不用印
+
+    with open(os.path.join(FIXTURE_DIR, "list539BIG_indexpage1.html"), "rb") as f:
+        big_body = f.read()
+    with open(os.path.join(FIXTURE_DIR, "list_indexpage1.html"), "rb") as f:
+        list_body = f.read()
+    primary_srv, primary_url = start_stub(big_body, 0.02, args.slow_rate, args.slow_delay, fail_rate=0.02)
+    backup_srv, backup_url = start_stub(list_body, 0.05, 0.0, 0.0)
+
+    for label, hedge in (("只用主來源", False), ("主來源 + 對沖", True)):
+        session = requests.Session()
+        # 跟 draw_source.SOURCES 一樣：BIG 版主來源、標準版備援，兩種版面
+        primary = PilioSource("stub-big", primary_url, session, layout="big")
+        backup = PilioSource("stub-list", backup_url, session, layout="list")
+        sources = [primary, backup] if hedge else [primary]
+        for _ in range(20): hedged_fetch(1, sources, timeout=5) # 暖機：先累積延遲樣本，不列入統計
+        lat, misses = [], 0
+        for _ in range(args.requests):
+            start = time.monotonic()
+            rows = hedged_fetch(1, sources, timeout=5)
+            lat.append(time.monotonic() - start)
+            misses += not rows
+        p = percentiles(lat)
+        print(f"{label}: p50 {p[50]:.0f} ms | p95 {p[95]:.0f} ms | p99 {p[99]:.0f} ms | 失敗 {misses}/{args.requests}")
+
+    primary_srv.shutdown(); backup_srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
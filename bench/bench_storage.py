@@ -0,0 +1,135 @@
+# ==========================================
+# ⏱️ 儲存後端壓力測試：N 個模擬使用者同時登入 / 存檔 / 查損益表，回報每種動作的 p50 / p99 延遲
+# 用法：python bench/bench_storage.py [--storage memory] [--users 50] [--sessions 20] [--concurrency 16]
+#       --storage sqlite:bench.sqlite3 測本機檔案；--storage firestore 打真的雲端 (測試帳號與紀錄跑完會刪掉)
+# ==========================================
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_journal import JournalFlusher, RecordJournal  # noqa: E402
+from record_pages import RecordPager, date_range  # noqa: E402
+from storage import open_storage  # noqa: E402
+
+FILTERS = ["全部紀錄", "近一周", "近一個月", "自訂區間"]
+
+
+def fake_record(rng, today, days=720):
+    day = today - timedelta(days=rng.randrange(days))
+    cost = rng.randrange(100, 5000)
+    prize = rng.choice([0, 0, 0, 0, 530, 2120, 5300, 30000])
+    return {"date": str(day), "cost": cost, "prize": prize, "profit": prize - cost, "details": "[]"}
+
+
+class Timer:
+    """每種動作的延遲 (秒)，多個執行緒一起記"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def time(self, name, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock: self.samples[name].append(dt)
+
+
+def seed(store, users, history, today):
+    """建立測試帳號並灌入歷史紀錄 (不計時)"""
+    rng = random.Random(0)
+    for u in users:
+        store.create_user(u, {"password": "pw", "nickname": u})
+        if history: store.save_records(u, [fake_record(rng, today) for _ in range(history)])
+
+
+def session(store, timer, username, today, rng, save):
+    """一個使用者開一次網頁：登入 → 存一筆對獎紀錄 → 看損益表 (第一頁 + 區間總計，有時候翻到第二頁)"""
+    user = timer.time("login", store.get_user, username)
+    assert user and user["password"] == "pw"
+    timer.time("save", save, username, [fake_record(rng, today, days=30)])
+    tf = rng.choice(FILTERS)
+    custom = (today - timedelta(days=rng.randrange(30, 365)), today) if tf == "自訂區間" else None
+    start, end, _ = date_range(tf, today, custom)
+    pager = RecordPager(store, username, start, end)
+    timer.time("history_page", pager.page, 0)
+    timer.time("history_totals", pager.totals)
+    if rng.random() < 0.3: timer.time("history_next_page", pager.page, 1)
+
+
+def run(args, store, users, today):
+    """建帳號灌資料 → 全部使用者一起操作 → 印出各動作的延遲"""
+    t0 = time.perf_counter()
+    seed(store, users, args.history, today)
+    print(f"{args.storage}：建立 {len(users)} 個帳號、每人 {args.history} 筆歷史紀錄，{time.perf_counter() - t0:.1f} 秒")
+
+    flusher = None
+    if args.write_behind:
+        journal = RecordJournal(os.path.join(tempfile.mkdtemp(), "journal.sqlite3"))
+        flusher = JournalFlusher(journal, store).start()
+
+        def journal_save(username, records):
+            journal.append(username, records)
+            flusher.notify()
+    save = journal_save if args.write_behind else store.save_records
+
+    timer = Timer()
+    jobs = [(u, random.Random(f"{u}-{k}")) for k in range(args.sessions) for u in users]
+    random.Random(1).shuffle(jobs)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for fut in [pool.submit(session, store, timer, u, today, rng, save) for u, rng in jobs]: fut.result()
+    elapsed = time.perf_counter() - t0
+
+    if flusher:
+        t1 = time.perf_counter()
+        while journal.count(): time.sleep(0.05)
+        print(f"日誌送完還要 {time.perf_counter() - t1:.2f} 秒")
+
+    print(f"{len(jobs)} 次操作 (同時 {args.concurrency} 人)，{elapsed:.2f} 秒，{len(jobs) / elapsed:,.1f} 次/秒")
+    print(f"{'動作':<18}{'次數':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, xs in timer.samples.items():
+        ms = np.array(xs) * 1000
+        print(f"{name:<18}{len(ms):>8}{np.percentile(ms, 50):>10.2f}{np.percentile(ms, 99):>10.2f}{ms.max():>10.2f}")
+
+
+def teardown(store, users):
+    """雲端測試資料連同帳號一起清掉 (測試帳號的密碼是公開的 "pw"，不能留著)；中途出錯也要清"""
+    for u in users:
+        store.clear_history(u)
+        store.delete_user(u)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="儲存後端壓力測試")
+    parser.add_argument("--storage", default="memory", help="memory / sqlite:檔名 / firestore")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=20, help="每個使用者開幾次網頁")
+    parser.add_argument("--history", type=int, default=500, help="每個使用者事先有幾筆紀錄")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時幾個使用者在操作")
+    parser.add_argument("--write-behind", action="store_true", help="存檔走本地日誌 (背景再送進後端)")
+    args = parser.parse_args()
+
+    store = open_storage(args.storage)
+    today = date.today()
+    run_id = f"{int(time.time()):x}"
+    users = [f"bench-{run_id}-{i}" for i in range(args.users)]
+    try:
+        run(args, store, users, today)
+    finally:
+        if args.storage == "firestore": teardown(store, users)
+
+
+if __name__ == "__main__":
+    main()
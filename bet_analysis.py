@@ -0,0 +1,226 @@
+# ==========================================
+# 📊 下注單風險分析 (對全部 575,757 種開獎結果精算整張單的獎金分佈)
+# ==========================================
+import itertools
+import math
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+from bet_model import PlayType, as_bet, mask_nums
+from lotto_rules import (BASE_RATE, DEFAULT_ODDS, all_draw_masks, all_draw_numbers, calculate_combinations, get_tail_numbers,
+                         popcount)
+from touch_math import total_touches
+
+TOTAL_DRAWS = math.comb(39, 5)
+SUBSET_CHUNK = 1 << 21 # 建子集權重時一次最多展開幾個 (注 × 子集)
+_COMB = np.array([[math.comb(n, k) for k in range(6)] for n in range(40)], dtype=np.int64)
+
+
+def bet_prizes(bet, draw_masks, odds=DEFAULT_ODDS):
+    """
+    一注對一整批開獎結果 (uint64 bitmask 陣列) 的獎金，回傳 float64 陣列
+    規則與兌獎頁完全相同：坐車 = 倍率 × 坐車獎金 × 中幾顆；連碰 = Σ C(中, k) × k星獎金 × 倍率；
+    立柱 = Σ (各柱中獎數的 k 次基本對稱多項式) × k星獎金 × 倍率
+    """
+    bet = as_bet(bet)
+    mul = bet.bet_amount / BASE_RATE
+    hits = popcount(draw_masks & np.uint64(bet.mask))
+
+    if bet.play == PlayType.CAR:
+        return mul * odds["car_prize"] * hits.astype(np.float64)
+
+    bought = [k for k, b in zip((2, 3, 4), bet.stars_bought) if b]
+    if bet.play == PlayType.COMBO:
+        # 中 0~5 顆各值多少錢，查表就好
+        table = np.array([sum(calculate_combinations(h, k) * odds["star_prizes"][k] for k in bought) * mul for h in range(6)])
+        return table[hits]
+
+    if bet.play == PlayType.LIZHU:
+        # e[k] = 各柱中獎數的 k 次基本對稱多項式 = 跨 k 柱的中獎碰數
+        e = [np.ones(len(draw_masks), dtype=np.int64)] + [np.zeros(len(draw_masks), dtype=np.int64) for _ in range(4)]
+        for col_mask in bet.col_masks:
+            c = popcount(draw_masks & np.uint64(col_mask)).astype(np.int64)
+            for k in range(4, 0, -1): e[k] = e[k] + e[k - 1] * c
+        return sum(e[k] * odds["star_prizes"][k] for k in bought) * mul
+
+    return np.zeros(len(draw_masks))
+
+
+def slip_prizes(bets, draw_masks, odds=DEFAULT_ODDS):
+    """整張單的總獎金；一模一樣的注只算一次再乘張數"""
+    groups = {}
+    for bet in map(as_bet, bets): groups[bet] = groups.get(bet, 0) + 1
+    total = np.zeros(len(draw_masks))
+    for bet, n in groups.items(): total += n * bet_prizes(bet, draw_masks, odds)
+    return total
+
+
+def _subset_ranks(nums, pos):
+    """
+    nums (注, n) 是 0-based 號碼，pos (子集數, k) 是要取的位置組合
+    回傳每注每個 k 碼子集在全部 C(39, k) 個子集裡的編號 (colex：由小到大 a0 < a1 < ... → Σ C(aj, j + 1))
+    """
+    sub = np.sort(nums[:, pos], axis=-1)
+    return sum(_COMB[sub[..., j], j + 1] for j in range(pos.shape[1]))
+
+
+def _structure_groups(bets):
+    """
+    依「結構」分組：連碰看碼數、立柱看各柱碼數；同一組的注子集位置都一樣，可以整組一起展開
+    回傳 ({(玩法, 結構): [注, ...]}, 坐車的注, 要逐注算的注)
+    """
+    groups, cars, odd = defaultdict(list), [], []
+    for bet in bets:
+        if bet.play == PlayType.CAR: cars.append(bet)
+        elif bet.play == PlayType.COMBO: groups[(bet.play, (len(mask_nums(bet.mask)),))].append(bet)
+        elif bet.play == PlayType.LIZHU:
+            sizes = tuple(bin(m).count("1") for m in bet.col_masks)
+            if sum(sizes) == bin(bet.mask).count("1"): groups[(bet.play, sizes)].append(bet)
+            else: odd.append(bet) # 柱與柱有重複號碼 (舊資料)，子集算法不適用
+        else: odd.append(bet)
+    return groups, cars, odd
+
+
+def _subset_weights(groups):
+    """
+    每個 k 碼子集 (k = 2, 3, 4) 被整張單買到幾次 (依倍率加權)：W[k][子集編號]
+    連碰 = 號碼裡任 k 碼；立柱 = 任選 k 柱各一碼 (= 各柱中獎數的 k 次基本對稱多項式)
+    """
+    W = {k: np.zeros(math.comb(39, k)) for k in (2, 3, 4)}
+    for (play, sizes), bets in groups.items():
+        col_of = [i for i, s in enumerate(sizes) for _ in range(s)]
+        nums = np.array([[n - 1 for m in (b.col_masks if play == PlayType.LIZHU else (b.mask,)) for n in mask_nums(m)] for b in bets],
+                        dtype=np.int64).reshape(len(bets), len(col_of))
+        mul = np.array([b.bet_amount / BASE_RATE for b in bets])
+        stars = np.array([b.stars for b in bets])
+        for bit, k in enumerate((2, 3, 4)):
+            w = mul * (stars >> bit & 1)
+            if not w.any(): continue
+            pos = np.array([p for p in itertools.combinations(range(len(col_of)), k)
+                            if play != PlayType.LIZHU or len({col_of[i] for i in p}) == k], dtype=np.int64).reshape(-1, k)
+            if not len(pos): continue
+            step = max(1, SUBSET_CHUNK // len(pos))
+            for s in range(0, len(bets), step):
+                ranks = _subset_ranks(nums[s:s + step], pos)
+                W[k] += np.bincount(ranks.ravel(), weights=np.repeat(w[s:s + step], len(pos)), minlength=len(W[k]))
+    return W
+
+
+def all_draw_prizes(bets, odds=DEFAULT_ODDS):
+    """
+    整張單對全部 C(39,5) 種開獎的總獎金 (與 slip_prizes(bets, all_draw_masks()) 相同)
+    不逐注掃 57 萬種開獎：先把整張單攤成「每個 1 / 2 / 3 / 4 碼子集值多少」，
+    每種開獎的獎金 = 它包含的 5 個號碼、10 個二星、10 個三星、5 個四星子集的值加總，跟注數無關
+    """
+    bets = [as_bet(b) for b in bets]
+    groups, cars, odd = _structure_groups(bets)
+    draws = all_draw_numbers()
+    total = np.zeros(len(draws))
+    if cars:
+        W1 = np.zeros(39)
+        for b in cars:
+            for n in mask_nums(b.mask): W1[n - 1] += b.bet_amount / BASE_RATE
+        total += odds["car_prize"] * W1[draws].sum(axis=1)
+    for k, Wk in _subset_weights(groups).items():
+        if not Wk.any(): continue
+        for pos in itertools.combinations(range(5), k):
+            total += odds["star_prizes"][k] * Wk[sum(_COMB[draws[:, p], j + 1] for j, p in enumerate(pos))]
+    if odd: total += slip_prizes(odd, all_draw_masks(), odds)
+    return total
+
+
+def payout_distribution(bets, odds=DEFAULT_ODDS, percentiles=(1, 5, 25, 50, 75, 95, 99)):
+    """
+    整張單對全部 C(39,5) 種開獎的精確損益分佈 (每種開獎機率相同)
+    回傳成本、期望獎金 / 期望損益、賺錢機率、有中獎機率、損益百分位數、最差 / 最好情況，
+    以及完整分佈 (所有可能的淨損益值與各自機率)
+    """
+    prizes = all_draw_prizes(bets, odds)
+    cost = float(sum(as_bet(b).actual_cost for b in bets))
+    net = np.sort(prizes - cost) # 排序一次，百分位數與分佈都從這裡取
+    starts = np.flatnonzero(np.concatenate(([True], net[1:] != net[:-1])))
+    counts = np.diff(np.append(starts, len(net)))
+    return {
+        "cost": cost,
+        "expected_prize": float(prizes.mean()),
+        "expected_profit": float(net.mean()),
+        "p_profit": float((net > 0).mean()),
+        "p_any_win": float((prizes > 0).mean()),
+        "percentiles": dict(zip(percentiles, np.percentile(net, percentiles, method="inverted_cdf").tolist())),
+        "worst": float(net[0]),
+        "best": float(net[-1]),
+        "values": net[starts],
+        "probs": counts / TOTAL_DRAWS,
+    }
+
+
+# ==========================================
+# 🎲 超幾何精算：連碰 / 立柱 / 坐車 / 坐尾數 的中獎機率與期望值 (每 10 元)
+# ==========================================
+def odds_key(odds):
+    """賠率 dict 轉成可以當快取鍵的 tuple"""
+    p = odds["star_prizes"]
+    return (odds["car_cost"], odds["combo_discount"], odds["car_prize"], p[2], p[3], p[4])
+
+
+def _touch_distribution(cols):
+    """
+    多變量超幾何：各柱有 cols[i] 個號碼，開出 5 顆時「各柱中幾顆」的所有情況
+    逐柱 DP，狀態 = (總中獎數, 2星碰數, 3星碰數, 4星碰數)，k星碰數就是各柱中獎數的 k 次基本對稱多項式
+    連碰 n 碼 = n 柱各 1 碼 (碰數剛好是 C(中, k))
+    回傳 {(中, 2星碰, 3星碰, 4星碰): 機率}
+    """
+    states = {(0, 0, 0, 0): 1}
+    for c in cols:
+        nxt = defaultdict(int)
+        for (e1, e2, e3, e4), w in states.items():
+            for h in range(min(c, 5 - e1) + 1):
+                nxt[(e1 + h, e2 + e1 * h, e3 + e2 * h, e4 + e3 * h)] += w * math.comb(c, h)
+        states = nxt
+    rest = 39 - sum(cols)
+    return {k: w * math.comb(rest, 5 - k[0]) / TOTAL_DRAWS for k, w in states.items() if rest >= 5 - k[0]}
+
+
+@lru_cache(maxsize=4096)
+def _analyze(kind, layout, stars, okey):
+    car_cost, discount, car_prize, p2, p3, p4 = okey
+    star_prizes = {2: p2, 3: p3, 4: p4}
+
+    if kind in ("car", "tail"):
+        n = layout[0] if kind == "car" else sum(len(get_tail_numbers(t)) for t in layout)
+        cost = math.ceil(n * car_cost)
+        outcomes = {}
+        for h in range(min(n, 5) + 1):
+            prob = math.comb(n, h) * math.comb(39 - n, 5 - h) / TOTAL_DRAWS
+            if prob: outcomes[(h, h * car_prize)] = prob
+    else:
+        cols = (1,) * layout[0] if kind == "combo" else layout
+        touches = total_touches(cols, stars=stars)
+        cost = math.ceil(touches * BASE_RATE * discount)
+        outcomes = defaultdict(float)
+        for (h, e2, e3, e4), prob in _touch_distribution(cols).items():
+            won = {2: e2, 3: e3, 4: e4}
+            outcomes[(h, sum(won[k] * star_prizes[k] for k in stars))] += prob
+
+    expected = sum(prize * prob for (_, prize), prob in outcomes.items())
+    return {
+        "cost": cost,
+        "expected_prize": expected,
+        "ev_per_10": BASE_RATE * expected / cost if cost else 0.0,
+        "house_edge": 1 - expected / cost if cost else 0.0,
+        "p_win": sum(prob for (_, prize), prob in outcomes.items() if prize > 0),
+        # [(中幾顆, 獎金, 機率), ...]，獎金大的在前
+        "outcomes": sorted(((h, prize, prob) for (h, prize), prob in outcomes.items()), key=lambda x: (-x[1], -x[0])),
+    }
+
+
+def hit_analysis(kind, layout, stars=(), odds=DEFAULT_ODDS):
+    """
+    10 元基準下單一注的精確中獎分析 (同樣的玩法 + 賠率只算一次)
+    kind：combo (layout=(碼數,))、lizhu (layout=各柱碼數)、car (layout=(碼數,))、tail (layout=尾數們)
+    stars：連碰 / 立柱買的星等，例如 (2, 3)
+    回傳成本、期望獎金、每 10 元期望回收、莊家優勢、中獎機率與每種結果的機率
+    """
+    return _analyze(kind, tuple(layout), tuple(sorted(set(stars))), odds_key(odds))
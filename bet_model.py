@@ -0,0 +1,111 @@
+# ==========================================
+# 🎫 下注資料模型 (my_bets 裡每一注都是一個 Bet，取代自由格式 dict)
+# 號碼存成 39-bit mask、立柱每柱一個 mask、星等存成 3 個 bit，玩法用列舉判斷不用比對字串
+# ==========================================
+from enum import IntEnum
+
+from lotto_rules import to_mask
+
+
+class PlayType(IntEnum):
+    CAR = 0   # 坐車 / 坐尾數
+    COMBO = 1 # 連碰
+    LIZHU = 2 # 立柱
+
+
+def play_type_of(label):
+    """從玩法名稱判斷 (與原本兌獎頁的字串判斷相同)：坐車/坐尾數 → CAR、立柱 → LIZHU、連碰 → COMBO"""
+    if "車" in label or "坐" in label: return PlayType.CAR
+    if "立柱" in label: return PlayType.LIZHU
+    if "連碰" in label: return PlayType.COMBO
+    return None
+
+
+def mask_nums(mask):
+    """mask → 由小到大的號碼 list"""
+    return [n for n in range(1, 40) if mask >> (n - 1) & 1]
+
+
+class Bet:
+    """
+    一注：label 是畫面上的玩法名稱 (例：連碰 (號碼)、坐尾數(1,3))，play 是結算用的玩法
+    stars 的 bit 0/1/2 = 有沒有買 2/3/4 星；touches = 買到的 (2星, 3星, 4星) 碰數，加入時就算好
+    """
+
+    __slots__ = ("label", "play", "mask", "col_masks", "bet_amount", "actual_cost", "stars", "touches")
+
+    def __init__(self, label, play, mask, col_masks=(), bet_amount=10, actual_cost=0, stars=0, touches=(0, 0, 0)):
+        self.label = label
+        self.play = play
+        self.mask = mask
+        self.col_masks = tuple(col_masks)
+        self.bet_amount = bet_amount
+        self.actual_cost = actual_cost
+        self.stars = stars
+        self.touches = tuple(touches)
+
+    @classmethod
+    def build(cls, label, nums=(), cols=(), bet_amount=10, actual_cost=0, stars_bought=(False, False, False), touches=(0, 0, 0)):
+        """從號碼 / 各柱號碼建立；立柱的號碼 mask 就是各柱 mask 的聯集"""
+        col_masks = tuple(to_mask(c) for c in cols)
+        mask = 0
+        for m in col_masks: mask |= m
+        return cls(label, play_type_of(label), mask or to_mask(nums), col_masks, bet_amount, actual_cost,
+                   sum(1 << i for i, b in enumerate(stars_bought) if b), touches)
+
+    @property
+    def nums(self):
+        return mask_nums(self.mask)
+
+    @property
+    def cols(self):
+        return [mask_nums(m) for m in self.col_masks]
+
+    @property
+    def stars_bought(self):
+        return tuple(bool(self.stars >> i & 1) for i in range(3))
+
+    def _fields(self):
+        return (self.label, self.play, self.mask, self.col_masks, self.bet_amount, self.actual_cost, self.stars, self.touches)
+
+    def __eq__(self, other):
+        return isinstance(other, Bet) and self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __reduce__(self):
+        return (Bet, self._fields())
+
+    def __repr__(self):
+        return f"Bet({self.label!r}, nums={self.nums}, amount={self.bet_amount}, cost={self.actual_cost})"
+
+    # 💾 精簡格式：存進 Firestore details / 快取鍵用的 JSON list，讀回來不用重算 mask 與碰數
+    def to_compact(self):
+        return [self.label, self.mask, list(self.col_masks), self.bet_amount, self.actual_cost, self.stars, list(self.touches)]
+
+    @classmethod
+    def from_compact(cls, data):
+        label, mask, col_masks, bet_amount, actual_cost, stars, touches = data
+        return cls(label, play_type_of(label), mask, col_masks, bet_amount, actual_cost, stars, touches)
+
+    @classmethod
+    def from_dict(cls, d):
+        """舊版 my_bets dict (type / nums / cols / bet_amount / actual_cost / stars_bought / touches)"""
+        return cls.build(d['type'], d.get('nums', ()), d.get('cols', ()), d.get('bet_amount', 10), d.get('actual_cost', 0),
+                         d.get('stars_bought', (False, False, False)), d.get('touches', (0, 0, 0)))
+
+    def detail(self, prize, matched):
+        """損益表 details 的一筆：原本的可讀欄位 + bet (精簡格式，可以還原成 Bet)"""
+        return {"type": self.label, "nums": self.nums, "cost": self.actual_cost, "prize": prize, "matched": matched,
+                "bet": self.to_compact()}
+
+    @classmethod
+    def from_detail(cls, d):
+        """從損益表 details 的一筆還原；舊紀錄沒有 bet 欄位就回 None"""
+        return cls.from_compact(d['bet']) if d.get('bet') else None
+
+
+def as_bet(bet):
+    """引擎的入口：Bet 直接用，舊格式 dict 轉一次"""
+    return bet if isinstance(bet, Bet) else Bet.from_dict(bet)
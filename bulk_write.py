@@ -0,0 +1,90 @@
+# ==========================================
+# 📦 Firestore 大量寫入 / 刪除 (切成 ≤500 筆的 batch，多個 batch 同時送，失敗自動重試)
+# 清空紀錄、整段存檔都走這裡，不再一個 batch 硬塞全部或一筆一筆往返
+# ==========================================
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from google.api_core import exceptions as gexc
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH_OPS = 500 # Firestore 單一 batch 上限
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5 # 第 n 次重試前等 BACKOFF_BASE × 2^n 秒 (再加一點隨機，避免同時撞回去)
+BACKOFF_MAX = 16
+
+# 只重試「確定沒寫進去」的錯誤：彙總用 Increment 累加，逾時之類結果不明的錯誤重送會重複累加
+RETRYABLE = (gexc.Aborted, gexc.ResourceExhausted, gexc.ServiceUnavailable)
+
+
+def set_op(ref, data, merge=False):
+    return ("set", ref, data, merge)
+
+
+def create_op(ref, data):
+    """文件已存在就讓整個 batch 失敗 (AlreadyExists，不重試)：用固定 ID 寫入時保證同一筆不會寫兩次"""
+    return ("create", ref, data)
+
+
+def delete_op(ref):
+    return ("delete", ref)
+
+
+def pack(groups, limit=MAX_BATCH_OPS):
+    """
+    把操作群組裝進 batch：同一組 (例：一筆紀錄 + 它的彙總增量) 一定放在同一個 batch，一起成功或一起失敗
+    回傳 [[op, ...], ...]，每個 batch 不超過 limit 筆
+    """
+    batches, cur = [], []
+    for group in groups:
+        if len(group) > limit: raise ValueError(f"一組操作 {len(group)} 筆，超過單一 batch 上限 {limit}")
+        if len(cur) + len(group) > limit: batches.append(cur); cur = []
+        cur.extend(group)
+    if cur: batches.append(cur)
+    return batches
+
+
+def _commit(db, ops, retries=MAX_RETRIES):
+    for attempt in range(retries + 1):
+        batch = db.batch()
+        for op in ops:
+            if op[0] == "set": batch.set(op[1], op[2], merge=op[3])
+            elif op[0] == "create": batch.create(op[1], op[2])
+            else: batch.delete(op[1])
+        try:
+            batch.commit()
+            return len(ops)
+        except RETRYABLE as e:
+            if attempt == retries: raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random())
+            log.warning("batch commit 失敗 (%s)，%.1f 秒後重試 (%d/%d)", type(e).__name__, delay, attempt + 1, retries)
+            time.sleep(delay)
+
+
+def commit_groups(db, groups, progress=None, workers=MAX_WORKERS, retries=MAX_RETRIES):
+    """
+    送出全部操作群組，回傳實際寫入的操作筆數
+    progress(已完成筆數, 總筆數) 在呼叫端的執行緒回報 (Streamlit 元件只能在主執行緒更新)
+    有 batch 重試到最後還是失敗就丟出例外；已經成功的 batch 不會回滾
+    """
+    batches = pack(groups)
+    total = sum(map(len, batches))
+    done = 0
+    if progress: progress(0, total)
+    if not batches: return 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches)), thread_name_prefix="bulk-write") as pool:
+        futures = [pool.submit(_commit, db, ops, retries) for ops in batches]
+        for fut in as_completed(futures):
+            done += fut.result()
+            if progress: progress(done, total)
+    return done
+
+
+def delete_query(db, query, progress=None, workers=MAX_WORKERS, retries=MAX_RETRIES):
+    """刪掉查詢到的所有文件 (只抓文件參照，不讀欄位內容)，回傳刪除筆數"""
+    refs = [doc.reference for doc in query.select([]).stream()]
+    return commit_groups(db, [[delete_op(ref)] for ref in refs], progress, workers, retries)
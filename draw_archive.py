@@ -0,0 +1,276 @@
+# ==========================================
+# 🗃️ 539 開獎號碼本地資料庫 (SQLite，重開機也不會忘記)
+# ==========================================
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from draw_source import FETCH_DEADLINE, LayoutFetch, fetch_pages
+
+ARCHIVE_PATH = os.environ.get("LTO539_ARCHIVE_PATH", "draws_539.sqlite3")
+COLD_MAX_PAGES = 30 # 冷啟動最多往回翻幾頁 (網站壞掉時不要無限翻)
+MAX_DRAW_GAP = timedelta(days=10) # 相鄰兩期最多隔幾天還算連續 (春節停開約一週)
+
+
+class DrawArchive:
+    """
+    以開獎日期 (YYYY/MM/DD) 為主鍵的開獎號碼資料庫
+    啟動時整批載入記憶體的 日期→號碼 字典，查單日是 O(1)，SQLite 只負責落地
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS draws ("
+                " date TEXT PRIMARY KEY,"
+                " n1 INTEGER NOT NULL, n2 INTEGER NOT NULL, n3 INTEGER NOT NULL,"
+                " n4 INTEGER NOT NULL, n5 INTEGER NOT NULL)"
+            )
+            # 確定「那天沒開獎」的日期 (週日、停開)，一樣永久記住，不用再翻網頁
+            self._conn.execute("CREATE TABLE IF NOT EXISTS no_draws (date TEXT PRIMARY KEY)")
+            # 多個 process 共用同一個檔案時，用租約決定誰去抓網站
+            self._conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, expires_at REAL)")
+            # 其他零星狀態 (例如網站最舊一期的日期)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.reload()
+
+    def reload(self):
+        """重新從 SQLite 載入索引 (別的 process 剛同步完時用)"""
+        with self._lock:
+            self._by_date = {r[0]: list(r[1:]) for r in self._conn.execute("SELECT date, n1, n2, n3, n4, n5 FROM draws")}
+            self._no_draw = {r[0] for r in self._conn.execute("SELECT date FROM no_draws")}
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'history_start'").fetchone()
+            self._history_start = row[0] if row else None
+
+    def count(self):
+        return len(self._by_date)
+
+    def has(self, dt_str):
+        return dt_str in self._by_date
+
+    def newest(self):
+        return max(self._by_date, default=None)
+
+    def get(self, dt_str):
+        nums = self._by_date.get(dt_str)
+        return list(nums) if nums else None
+
+    def is_no_draw(self, dt_str):
+        return dt_str in self._no_draw
+
+    def history_start(self):
+        """網站最後一頁的最舊一期 (沒翻到底過是 None)；比它還舊的日期網站上沒有"""
+        return self._history_start
+
+    def set_history_start(self, dt_str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('history_start', ?)", (dt_str,))
+            self._history_start = dt_str
+
+    def recent(self, limit=100):
+        """回傳最新的 limit 期 (新 → 舊，None = 全部)，格式與網頁抓取相同：[(日期, [5 個號碼]), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, n1, n2, n3, n4, n5 FROM draws ORDER BY date DESC LIMIT ?", (-1 if limit is None else limit,)
+            ).fetchall()
+        return [(r[0], list(r[1:])) for r in rows]
+
+    def contiguous(self, limit=100):
+        """
+        跟 recent() 一樣新 → 舊，但遇到斷層 (相鄰兩期隔超過 MAX_DRAW_GAP) 就停
+        查舊日期時 locate_draw 會存進零散的舊頁，算統計 / 回測只能用從最新一期一路接下來的這段
+        """
+        out = []
+        prev = None
+        for dt, nums in self.recent(None):
+            d = datetime.strptime(dt, "%Y/%m/%d")
+            if prev is not None and prev - d > MAX_DRAW_GAP: break
+            out.append((dt, nums))
+            if limit is not None and len(out) >= limit: break
+            prev = d
+        return out
+
+    def between(self, start, end):
+        """日期區間 (含頭含尾，YYYY/MM/DD) 內的開獎，舊 → 新：[(日期, [5 個號碼]), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, n1, n2, n3, n4, n5 FROM draws WHERE date BETWEEN ? AND ? ORDER BY date", (start, end)
+            ).fetchall()
+        return [(r[0], list(r[1:])) for r in rows]
+
+    def upsert(self, draws):
+        """寫入 [(日期, 號碼), ...]，回傳實際新增的筆數"""
+        rows = [(dt, *sorted(nums)) for dt, nums in draws if len(nums) == 5 and dt not in self._by_date]
+        if not rows: return 0
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO draws VALUES (?, ?, ?, ?, ?, ?)", rows)
+            for r in rows: self._by_date[r[0]] = list(r[1:])
+            return self._conn.total_changes - before
+
+    def mark_no_draw(self, dt_str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO no_draws VALUES (?)", (dt_str,))
+            self._no_draw.add(dt_str)
+
+    def acquire_lease(self, name, holder, ttl):
+        """搶租約：沒人拿或前一個已過期才搶得到，回傳是否成功"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO leases VALUES (?, '', 0)", (name,))
+            cur = self._conn.execute(
+                "UPDATE leases SET holder = ?, expires_at = ? WHERE name = ? AND (expires_at < ? OR holder = ?)",
+                (holder, now + ttl, name, now, holder),
+            )
+            return cur.rowcount == 1
+
+    def release_lease(self, name, holder):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_active(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return bool(row) and row[0] > time.time()
+
+
+def sync_archive(archive, fetch=None, target=100, max_pages=3, deadline=FETCH_DEADLINE, cold_max_pages=COLD_MAX_PAGES):
+    """
+    增量同步：
+    - 熱啟動：從第 1 頁往後翻，一看到資料庫裡已有的日期就停
+      (平常第 1 頁就碰到；離線太久就一路翻到接上為止，最多 cold_max_pages 頁，不留斷層)
+    - 冷啟動 (從最新一期接下來的連續資料不滿 target 筆，例如上次同步超時留下斷層)：
+      往後翻舊頁，每次 max_pages 頁一起並行抓，
+      一直翻到連續湊滿 target 筆、翻到空白頁 (沒有更舊的了) 或 cold_max_pages 頁為止
+      (每頁筆數不固定，不能假設幾頁一定夠)
+    整次同步不超過 deadline 秒，超時就保留已經存進來的部分
+    fetch 預設是 LayoutFetch：整次同步都用同一種版面翻頁
+    回傳新增的筆數
+    """
+    fetch = fetch or LayoutFetch()
+    end = time.monotonic() + deadline
+    added = 0
+
+    if len(archive.contiguous(target)) < target:
+        page = 1
+        while len(archive.contiguous(target)) < target and page <= cold_max_pages:
+            remaining = end - time.monotonic()
+            if remaining <= 0: break
+            wave = range(page, min(page + max_pages, cold_max_pages + 1))
+            exhausted = False
+            for _, rows in fetch_pages(wave, fetch=fetch, deadline=remaining):
+                if not rows: exhausted = True
+                added += archive.upsert(rows)
+                if len(archive.contiguous(target)) >= target: break
+            if exhausted: break
+            page = wave.stop
+        return added
+
+    for page in range(1, cold_max_pages + 1):
+        remaining = end - time.monotonic()
+        if remaining <= 0: break
+        rows = next((r for _, r in fetch_pages([page], fetch=fetch, deadline=remaining)), [])
+        if not rows: break
+
+        fresh = []
+        for dt, nums in rows:
+            if archive.has(dt): break
+            fresh.append((dt, nums))
+        added += archive.upsert(fresh)
+        if len(fresh) < len(rows): break # 碰到已知日期，後面都有了
+    return added
+
+
+def locate_draw(archive, t_str, fetch=None, max_pages=2000, latest=None):
+    """
+    查任意一天的開獎號碼 (t_str = YYYY/MM/DD)：
+    1. 資料庫有就直接回 (O(1))
+    2. 週日、比 latest (現在應該已開出的最新一期，YYYY/MM/DD) 還新、比網站最舊一期還舊的，不用翻網頁直接回 None
+    3. 其他的對 indexpage 做「倍增 + 二分」搜尋：網頁由新到舊排，
+       每抓一頁看它的第一期 (最新) 與最後一期 (最舊) 判斷目標在前面還是後面，
+       約 log(頁數) 次就找到；抓過的頁整頁存進資料庫
+    查無開獎 (週日/停開) 的過去日期也會記下來；比第 1 頁還新的日期代表還沒開，不記
+    翻到最後一頁還比目標新，就記下網站最舊一期，之後更舊的日期都不用再翻
+    fetch 預設是 LayoutFetch：同一次搜尋只用一種版面 (頁碼才對得起來)
+    """
+    nums = archive.get(t_str)
+    if nums or archive.is_no_draw(t_str): return nums
+    if datetime.strptime(t_str, "%Y/%m/%d").weekday() == 6: return None # 週日不開獎
+    if latest and t_str > latest: return None # 還沒開獎
+    if archive.history_start() and t_str < archive.history_start(): return None
+
+    fetch = fetch or LayoutFetch()
+    oldest = {} # 每頁最舊一期
+
+    sides = {} # 每頁抓過就記住方向，同一次搜尋不重抓
+
+    def probe(page):
+        if page not in sides:
+            rows = fetch(page)
+            archive.upsert(rows)
+            if rows: oldest[page] = rows[-1][0]
+            if not rows: sides[page] = None
+            elif t_str > rows[0][0]: sides[page] = -1  # 目標比這頁最新一期還新，往前找
+            elif t_str < rows[-1][0]: sides[page] = 1  # 目標比這頁最舊一期還舊，往後找
+            else: sides[page] = 0
+        return sides[page]
+
+    # 倍增：1, 2, 4, 8 ... 找到「目標不再比整頁還舊」的那頁當上界
+    lo, page = 1, 1
+    while True:
+        side = probe(page)
+        if side == 1 and page < max_pages:
+            lo = page + 1
+            page = min(page * 2, max_pages)
+            continue
+        if side == 0: lo = hi = page
+        elif side == -1 and page == 1: return None # 還沒開獎
+        else: hi = page - 1
+        break
+
+    # 二分：在 [lo, hi] 之間夾出目標所在的頁
+    while lo < hi:
+        mid = (lo + hi) // 2
+        side = probe(mid)
+        if side == 0: lo = hi = mid
+        elif side == 1: lo = mid + 1
+        else: hi = mid - 1
+    if lo == hi: probe(lo)
+
+    nums = archive.get(t_str)
+    if nums is None:
+        # 有一頁包住目標日期卻沒有它 → 確定那天沒開獎
+        # (相鄰兩頁可能來自不同來源、每頁筆數不同，夾在頁與頁之間的不能當證據)
+        if 0 in sides.values(): archive.mark_no_draw(t_str)
+        else:
+            # 目標比最後一頁 (下一頁是空的) 還舊：記下網站最舊一期
+            # 抓失敗也會回空頁，所以空頁再確認一次才算數
+            last = max((p for p, side in sides.items() if side == 1), default=None)
+            if last is not None and last + 1 in sides and sides[last + 1] is None and not fetch(last + 1):
+                archive.set_history_start(oldest[last])
+    return nums
+
+
+def fill_range(archive, start, end, fetch=None, latest=None):
+    """
+    補齊 [start, end] (date 物件) 之間每個開獎日 (週一到週六)：資料庫沒有、也沒記成停開的日期才 locate_draw
+    latest 同 locate_draw (呼叫端算一次傳進來)，區間尾巴還沒開獎的日子不會每天各翻一次第 1 頁
+    一次翻到的整頁都會存進資料庫，同一頁涵蓋的其他日期就直接命中，不會每天各搜一次
+    回傳區間內的開獎 [(日期, 號碼), ...] (舊 → 新)
+    """
+    fetch = fetch or LayoutFetch()
+    d = end
+    while d >= start:
+        t_str = d.strftime("%Y/%m/%d")
+        if d.weekday() != 6 and not archive.has(t_str) and not archive.is_no_draw(t_str):
+            try: locate_draw(archive, t_str, fetch, latest=latest)
+            except Exception: pass # 網站抓不到就先用資料庫裡有的
+        d -= timedelta(days=1)
+    return archive.between(start.strftime("%Y/%m/%d"), end.strftime("%Y/%m/%d"))
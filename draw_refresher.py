@@ -0,0 +1,130 @@
+# ==========================================
+# ⏰ 開獎排程感知的背景更新器 (舊資料先給、背景再更新、同時只有一人去抓)
+# ==========================================
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, time as dtime, timedelta, timezone
+
+from draw_archive import sync_archive
+from draw_source import FETCH_DEADLINE
+
+log = logging.getLogger(__name__)
+
+TW = timezone(timedelta(hours=8), "Asia/Taipei")
+RESULTS_READY = dtime(20, 40)   # 539 週一到週六 20:30 開獎，網站大約幾分鐘後更新
+HOT_POLL = 60                   # 開獎後還沒抓到當期：每分鐘問一次
+HOT_WINDOW = timedelta(hours=3) # 超過 3 小時還沒有 (停開、網站掛了) 就放慢
+WARM_POLL = 15 * 60
+IDLE_POLL_MAX = 6 * 3600        # 已是最新也至少 6 小時確認一次 (補開、改期)
+LEASE_NAME = "pilio_sync"
+LEASE_TTL = FETCH_DEADLINE + 15
+
+
+def latest_expected_draw(now):
+    """現在這個時間點，網站上「應該已經有」的最新一期開獎時間 (台灣時間)"""
+    now = now.astimezone(TW)
+    d = now.date()
+    if now.time() < RESULTS_READY: d -= timedelta(days=1)
+    while d.weekday() == 6: d -= timedelta(days=1) # 週日不開獎
+    return datetime.combine(d, RESULTS_READY, tzinfo=TW)
+
+
+def next_results_ready(now):
+    now = now.astimezone(TW)
+    d = now.date()
+    if now.time() >= RESULTS_READY: d += timedelta(days=1)
+    while d.weekday() == 6: d += timedelta(days=1)
+    return datetime.combine(d, RESULTS_READY, tzinfo=TW)
+
+
+def is_stale(archive, now):
+    newest = archive.newest()
+    return newest is None or newest < latest_expected_draw(now).strftime("%Y/%m/%d")
+
+
+def poll_interval(archive, now):
+    """離開獎時間越近問越勤：當期還沒抓到就每分鐘問，抓到了就睡到下一期開獎"""
+    if is_stale(archive, now):
+        if now - latest_expected_draw(now) < HOT_WINDOW: return HOT_POLL
+        return WARM_POLL
+    return min(IDLE_POLL_MAX, max(HOT_POLL, (next_results_ready(now) - now).total_seconds()))
+
+
+class DrawRefresher:
+    """
+    一個 process 一個 (搭配 st.cache_resource)，所有 session 共用：
+    - refresh()：single-flight，同一時間只有一個執行緒真的去抓，其他人等它的結果
+    - 跨 process 用 SQLite 租約，拿不到租約代表別人正在抓，等它做完再重新載入索引
+    - start()：背景執行緒依開獎排程自己更新，使用者不用付抓網頁的等待時間
+    """
+
+    def __init__(self, archive, sync=sync_archive, clock=lambda: datetime.now(TW)):
+        self.archive = archive
+        self._sync = sync
+        self._clock = clock
+        self._holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._flight = None
+        self._thread = None
+        self.last_refresh = None
+        self.last_error = None # 上一次更新失敗的例外 (成功就清掉)，給頁面顯示
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="draw-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            self.refresh()
+            time.sleep(poll_interval(self.archive, self._clock()))
+
+    def ensure_fresh(self):
+        """
+        資料庫是空的才讓使用者等；舊資料就先給，背景再更新
+        距離上次更新還不到 poll_interval 就不再觸發 (平常由背景執行緒照排程問，不是每次開網頁都去抓)
+        """
+        if self.archive.count() == 0:
+            self.refresh(wait=True)
+            return
+        now = self._clock()
+        if not is_stale(self.archive, now): return
+        if self.last_refresh is not None and (now - self.last_refresh).total_seconds() < poll_interval(self.archive, now): return
+        self.refresh(wait=False)
+
+    def refresh(self, wait=True, timeout=LEASE_TTL):
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader: flight = self._flight = threading.Event()
+        if leader:
+            if wait: self._run(flight)
+            else: threading.Thread(target=self._run, args=(flight,), daemon=True).start()
+        elif wait:
+            flight.wait(timeout)
+
+    def _run(self, flight):
+        try:
+            if self.archive.acquire_lease(LEASE_NAME, self._holder, LEASE_TTL):
+                try: self._sync(self.archive)
+                finally: self.archive.release_lease(LEASE_NAME, self._holder)
+            else:
+                # 別的 process 正在抓：等它放掉租約，再把它寫進 SQLite 的新資料載回來
+                end = time.monotonic() + LEASE_TTL
+                while self.archive.lease_active(LEASE_NAME) and time.monotonic() < end:
+                    time.sleep(0.5)
+                self.archive.reload()
+            self.last_error = None
+        except Exception as e:
+            # 網站掛掉就繼續用資料庫裡既有的，但記下來讓頁面看得到
+            self.last_error = e
+            log.warning("開獎號碼更新失敗：%s", e, exc_info=True)
+        finally:
+            self.last_refresh = self._clock()
+            with self._lock: self._flight = None
+            flight.set()
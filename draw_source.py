@@ -0,0 +1,292 @@
+# ==========================================
+# 🌐 539 開獎號碼來源 (pilio 網頁抓取與解析)
+# ==========================================
+import html
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait, TimeoutError as FuturesTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+# 雙重保險：BIG 版抓不到就抓標準版 (兩種版面每頁筆數不同，同一個頁碼不是同一段日期)
+BIG_URL = "https://www.pilio.idv.tw/lto539/list539BIG.asp?indexpage={page}&orderby=new"
+LIST_URL = "https://www.pilio.idv.tw/lto539/list.asp?indexpage={page}&orderby=new"
+
+DATE_RE = re.compile(r'(\d{4}/\d{2}/\d{2})')
+
+# 💡 一口氣切出「標籤 / 註解 / 文字」的 token，不建 DOM 樹
+_TOKEN_RE = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][a-zA-Z0-9]*)[^>]*>|([^<]+|<)', re.S)
+_CELL_TAGS = frozenset(('td', 'span', 'div', 'font'))
+_SKIP_TAGS = frozenset(('script', 'style'))
+
+# 💡 共用連線池：同一個 Session 重複使用 TCP 連線，多頁一起抓
+MAX_WORKERS = 8
+FETCH_DEADLINE = 15  # 一次同步最多等幾秒 (不管抓了幾頁)
+_POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="pilio")
+# 對沖請求另開一個池：外層 _POOL 的每頁會同時等好幾個來源，共用會互卡
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS * 2, thread_name_prefix="pilio-hedge")
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=MAX_WORKERS * 2))
+
+# 💡 對沖請求：主來源超過「自己最近 p90 延遲」還沒回，就同時問下一個來源，誰先給有效答案用誰
+#    第 1 頁在每種版面都是「最新的幾期」(結果是 日期 → 號碼，跟版面無關)，可以跨版面對沖；
+#    第 2 頁以後各版面的頁碼對不上，只在同版面的來源之間對沖
+HEDGE_PERCENTILE = 0.90
+HEDGE_DEFAULT_DELAY = 1.5 # 樣本不夠時先等這麼久
+LATENCY_WINDOW = 100
+
+
+def decode_page(content):
+    try: return content.decode('big5')
+    except UnicodeDecodeError: return content.decode('utf-8', errors='ignore')
+
+
+def _cell_nums(c_text):
+    # 把所有的逗號、全形頓號、隱藏空白全部變成普通空白
+    c_text = c_text.replace(',', ' ').replace('、', ' ').replace('\xa0', ' ')
+
+    # 把字串切開，只要長度是 2 且都是數字的，就收起來
+    tokens = [t for t in c_text.split() if t.isdigit() and len(t) == 2]
+    if len(tokens) >= 5: # 成功抓到至少 5 個號碼
+        return sorted([int(t) for t in tokens[:5]])
+
+    # 防呆：如果網頁把數字黏在一起 (例如 0102030405)
+    if len(c_text) == 10 and c_text.isdigit():
+        return sorted([int(c_text[k:k+2]) for k in range(0, 10, 2)])
+    return None
+
+
+def parse_draw_rows(html_text):
+    """
+    💡 X光掃描法 (串流版)：回傳網頁上所有 (日期, 5 個號碼)，依網頁順序 (新 → 舊)
+    不建 BeautifulSoup 整棵樹，直接順著 token 掃過去：
+    - 每個 <tr> 是一行，行內第一個 YYYY/MM/DD 就是日期；表格裡再包表格時，外層的行放在堆疊上，
+      內層格子的字也算外層的 (日期在外層、號碼在內層小表格的版面)
+    - 外層的行如果包著有日期的內層行，就只是排版用的外框，讓內層的行自己算
+    - td/span/div/font 各自累積「去頭尾空白後直接黏起來」的文字 (= get_text(strip=True))，
+      依開標籤順序找第一格湊得出 5 個號碼的
+    """
+    results = []
+    seen = set()
+    rows = []       # 還沒結算的行 (外 → 內)，每行 {depth, date, nested, cells, open}
+    depth = 0       # 目前在第幾層 <table> 裡
+    skip = None
+
+    def close_row():
+        row = rows.pop()
+        dt_str = row["date"]
+        if rows and (dt_str or row["nested"]): rows[-1]["nested"] = True
+        if not dt_str or row["nested"] or dt_str in seen: return
+        for parts in row["cells"]:
+            nums = _cell_nums("".join(parts))
+            if nums:
+                seen.add(dt_str)
+                results.append((dt_str, nums))
+                return
+
+    for m in _TOKEN_RE.finditer(html_text):
+        is_close, tag, text = m.groups()
+
+        if skip:
+            if is_close and tag.lower() == skip: skip = None
+            continue
+
+        if text is not None:
+            if not rows: continue
+            if '&' in text: text = html.unescape(text)
+            text = text.strip()
+            if not text: continue
+            date_match = None
+            for row in rows:
+                if row["date"] is None:
+                    date_match = date_match or DATE_RE.search(text)
+                    if date_match: row["date"] = date_match.group(1)
+                for _, i in row["open"]: row["cells"][i].append(text)
+            continue
+
+        if tag is None: continue # 註解
+        tag = tag.lower()
+        if tag in _SKIP_TAGS:
+            if not is_close: skip = tag # <script> 裡的字串可能長得像 <tr>，整段跳過
+        elif tag == 'table':
+            if not is_close: depth += 1
+            else:
+                # 表格結束：裡面還沒結算的行一起結算
+                while rows and rows[-1]["depth"] >= depth: close_row()
+                depth = max(depth - 1, 0)
+        elif tag == 'tr':
+            # 同一層表格的新一行 (或 </tr>)：先把手上這行結算掉；外層表格的行留在堆疊上
+            while rows and rows[-1]["depth"] >= depth: close_row()
+            if not is_close: rows.append({"depth": depth, "date": None, "nested": False, "cells": [], "open": []})
+        elif not rows:
+            continue
+        elif tag in _CELL_TAGS:
+            for row in rows:
+                if not is_close:
+                    row["cells"].append([])
+                    if not m.group(0).endswith('/>'): row["open"].append((tag, len(row["cells"]) - 1))
+                else:
+                    # 跟 html.parser 一樣：關掉最近一個同名標籤，連同它裡面沒關的
+                    open_cells = row["open"]
+                    for k in range(len(open_cells) - 1, -1, -1):
+                        if open_cells[k][0] == tag:
+                            del open_cells[k:]
+                            break
+
+    while rows: close_row()
+    return results
+
+
+class PilioSource:
+    """
+    開獎來源轉接器：一個網站 / 一種版面一個，統一回傳 [(日期, [5 個號碼]), ...]
+    換別的網站只要換 url_template 或覆寫 parse()
+    layout：分頁方式相同 (第 N 頁是同一段日期) 的來源用同一個名字，只有它們之間可以互相對沖
+    """
+
+    def __init__(self, name, url_template, session=None, layout=None):
+        self.name = name
+        self.url_template = url_template
+        self.layout = layout or name
+        self.session = session or _SESSION
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def parse(self, content):
+        return parse_draw_rows(decode_page(content))
+
+    def fetch_page(self, page, timeout=10):
+        start = time.monotonic()
+        r = self.session.get(self.url_template.format(page=page), headers=HEADERS, timeout=timeout)
+        r.raise_for_status()
+        rows = self.parse(r.content)
+        self.latencies.append(time.monotonic() - start)
+        return rows
+
+    def latency_percentile(self, q=HEDGE_PERCENTILE):
+        if len(self.latencies) < 5: return HEDGE_DEFAULT_DELAY
+        xs = sorted(self.latencies)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+# 雙重保險：BIG 版是主來源，標準版當備援 (第 1 頁互相對沖；之後的頁版面不同，只做整版切換)
+SOURCES = [PilioSource("pilio-big", BIG_URL, layout="big"), PilioSource("pilio-list", LIST_URL, layout="list")]
+
+
+def _layouts(sources=SOURCES):
+    """依 layout 分組，照 sources 裡第一次出現的順序：[(layout, [來源, ...]), ...]"""
+    groups = {}
+    for src in sources: groups.setdefault(src.layout, []).append(src)
+    return list(groups.items())
+
+
+def hedged_fetch(page, sources=SOURCES, timeout=10):
+    """
+    依序對沖：先問第一個來源，等到它的 p90 延遲還沒回 (或直接失敗) 就加問下一個，
+    先回來的有效結果 (抓得到號碼) 勝出；全部失敗回 []
+    第 2 頁以後 sources 必須是同一種 layout (同一個頁碼對到同一段日期)，不然第 N 頁會混到別的版面的第 N 頁
+    """
+    return _hedge(page, sources, timeout)[0]
+
+
+def _hedge(page, sources, timeout):
+    """hedged_fetch 的本體，回傳 (rows, 勝出的來源)；全部失敗回 ([], None)"""
+    backups = list(sources)
+    futures = {}
+    end = time.monotonic() + timeout
+
+    def launch():
+        src = backups.pop(0)
+        futures[_HEDGE_POOL.submit(src.fetch_page, page, timeout)] = src
+        return src.latency_percentile()
+
+    delay = launch()
+    try:
+        while futures:
+            remaining = end - time.monotonic()
+            if remaining <= 0: break
+            done, _ = wait(futures, timeout=min(delay, remaining) if backups else remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                if backups: delay = launch()
+                continue
+            for fut in done:
+                src = futures.pop(fut)
+                try: rows = fut.result()
+                except Exception as e:
+                    log.warning("開獎來源 %s 第 %s 頁抓取失敗：%s", src.name, page, e)
+                    continue
+                if rows: return rows, src
+                log.warning("開獎來源 %s 第 %s 頁抓不到號碼 (可能改版)", src.name, page)
+            if backups and not futures: delay = launch() # 在跑的都失敗了，立刻換下一個
+    finally:
+        for fut in futures: fut.cancel()
+    return [], None
+
+
+def fetch_page_layout(page, timeout=10):
+    """
+    不指定版面抓第 page 頁，回傳 (rows, 抓到的版面)：
+    第 1 頁所有來源一起對沖 (每種版面的第 1 頁都是最新幾期)；其他頁照順序一個版面一個版面換
+    """
+    if page == 1:
+        rows, src = _hedge(page, SOURCES, timeout)
+        return rows, src and src.layout
+    for name, group in _layouts():
+        rows = hedged_fetch(page, group, timeout)
+        if rows: return rows, name
+    return [], None
+
+
+def fetch_page(page, timeout=10, layout=None):
+    """
+    抓取第 page 頁 (見 fetch_page_layout)；layout 指定時只問那種版面的來源 (抓不到回 [])
+    """
+    if layout is None: return fetch_page_layout(page, timeout)[0]
+    group = dict(_layouts()).get(layout)
+    return hedged_fetch(page, group, timeout) if group else []
+
+
+class LayoutFetch:
+    """
+    一次翻頁作業 (同步、二分搜尋) 用的 fetch：第一頁用哪種版面抓到，之後每一頁都只問那種版面
+    不同版面每頁筆數不同，混著用的話「第 N 頁」前後接不起來 (漏期、搜尋方向判斷錯)
+    第一頁是第 1 頁時 (同步、二分搜尋都從第 1 頁開始) 跨版面對沖，誰先回來就用誰的版面
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.layout = None
+
+    def __call__(self, page, timeout=10):
+        if self.layout is None:
+            # 還沒決定版面：第一個抓的人決定，同時並行的其他頁等它決定完再抓
+            with self._lock:
+                if self.layout is None:
+                    rows, self.layout = fetch_page_layout(page, timeout)
+                    return rows
+        return fetch_page(page, timeout, self.layout)
+
+
+def fetch_pages(pages, fetch=fetch_page, deadline=FETCH_DEADLINE):
+    """
+    並行抓多頁，誰先回來就先 yield (page, rows)
+    整批共用一個 deadline，時間到就不等了；呼叫端 break 掉就取消還沒開始的頁
+    """
+    futures = {_POOL.submit(fetch, p): p for p in pages}
+    end = time.monotonic() + deadline
+    try:
+        for fut in as_completed(futures, timeout=max(0, end - time.monotonic())):
+            try: rows = fut.result()
+            except Exception: continue
+            yield futures[fut], rows
+    except FuturesTimeout:
+        return
+    finally:
+        for fut in futures: fut.cancel()
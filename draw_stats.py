@@ -0,0 +1,165 @@
+# ==========================================
+# 📐 開獎統計引擎 (N 期 × 39 號 one-hot 矩陣，全部向量化)
+# ==========================================
+import threading
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+
+NUM_BALLS = 39
+
+# 三個號碼 (a < b < c) 壓成一個整數鍵：a*40*40 + b*40 + c
+_TRIPLE_BASE = NUM_BALLS + 1
+ALL_TRIPLES = np.array(list(combinations(range(1, NUM_BALLS + 1), 3)), dtype=np.int64)  # 9,139 組
+_ALL_TRIPLE_KEYS = (ALL_TRIPLES[:, 0] * _TRIPLE_BASE + ALL_TRIPLES[:, 1]) * _TRIPLE_BASE + ALL_TRIPLES[:, 2]
+_TRIPLE_POS = np.array(list(combinations(range(5), 3)), dtype=np.intp)  # 一期 5 碼裡的 10 組三星
+
+
+class DrawMatrix:
+    """
+    row 0 是最新一期 (與 get_recent_100_draws 同順序)，onehot[i, n-1] = 第 i 期有沒有開出 n
+    任何「最近 w 期」的統計都只是對前 w 列做一次 reduce，換視窗不用重掃資料
+    """
+
+    def __init__(self, dates, onehot):
+        self.dates = np.asarray(dates)
+        self.onehot = onehot
+
+    @classmethod
+    def from_draws(cls, draws):
+        onehot = np.zeros((len(draws), NUM_BALLS), dtype=np.uint8)
+        if draws:
+            idx = np.array([nums for _, nums in draws], dtype=np.intp) - 1
+            onehot[np.arange(len(draws))[:, None], idx] = 1
+        return cls([dt for dt, _ in draws], onehot)
+
+    # 💾 存成 .npy，之後用 mmap 開，好幾千期也不用整包讀進記憶體
+    def save(self, path):
+        np.save(path + ".onehot.npy", self.onehot)
+        np.save(path + ".dates.npy", self.dates.astype("U10"))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        onehot = np.load(path + ".onehot.npy", mmap_mode="r" if mmap else None)
+        return cls(np.load(path + ".dates.npy"), onehot)
+
+    def __len__(self):
+        return len(self.dates)
+
+    # 📚 前綴和索引：prefix[i] = 前 i 列 (row 0 ~ i-1) 每個號碼的累計次數
+    # 任意區間 [start, stop) 的次數 = prefix[stop] - prefix[start]，O(39) 搞定
+    @property
+    def prefix(self):
+        if getattr(self, "_prefix", None) is None:
+            self._prefix = np.zeros((len(self) + 1, NUM_BALLS), dtype=np.int32)
+            np.cumsum(self.onehot, axis=0, dtype=np.int32, out=self._prefix[1:])
+        return self._prefix
+
+    # 每個號碼開出的列號 (由小到大)，用二分找區間內第一次出現
+    @property
+    def occurrences(self):
+        if getattr(self, "_occurrences", None) is None:
+            nums, rows = np.nonzero(self.onehot.T)
+            self._occurrences = np.split(rows, np.cumsum(np.bincount(nums, minlength=NUM_BALLS))[:-1])
+        return self._occurrences
+
+    def window(self, size=None):
+        """實際使用的期數 (None = 全部)"""
+        return len(self) if size is None else min(size, len(self))
+
+    def rows_between(self, start_date, end_date):
+        """日期區間 (含頭含尾，YYYY/MM/DD) 對應的列範圍 [start, stop)"""
+        asc = self.dates[::-1]
+        lo = np.searchsorted(asc, start_date, side="left")
+        hi = np.searchsorted(asc, end_date, side="right")
+        return len(self) - hi, len(self) - lo
+
+    def range_frequency(self, start=0, stop=None):
+        """列 [start, stop) 裡每個號碼開出幾次，shape (39,)"""
+        stop = len(self) if stop is None else stop
+        return (self.prefix[stop] - self.prefix[start]).astype(np.int64)
+
+    def range_last_seen(self, start=0, stop=None):
+        """區間內每個號碼距離 start 那期幾期 (0 = 那期有開)，區間內沒開過是 -1"""
+        stop = len(self) if stop is None else stop
+        gap = np.full(NUM_BALLS, -1)
+        for n, occ in enumerate(self.occurrences):
+            k = np.searchsorted(occ, start)
+            if k < len(occ) and occ[k] < stop: gap[n] = occ[k] - start
+        return gap
+
+    def range_hot_cold(self, start=0, stop=None):
+        """
+        回傳 (熱門排序, 冷門排序)，都是號碼 (1~39) 的陣列
+        熱門：次數多的在前；冷門：次數少的在前，同次數越久沒開越前面 (沒開過視為整個區間)
+        """
+        stop = len(self) if stop is None else stop
+        freq = self.range_frequency(start, stop)
+        gap = self.range_last_seen(start, stop)
+        gap = np.where(gap < 0, stop - start, gap)
+        hot = np.argsort(-freq, kind="stable") + 1
+        cold = np.lexsort((-gap, freq)) + 1
+        return hot, cold
+
+    # 「最近 size 期」= 從最新一期開始的區間
+    def frequency(self, size=None):
+        return self.range_frequency(0, self.window(size))
+
+    def last_seen(self, size=None):
+        return self.range_last_seen(0, self.window(size))
+
+    def hot_cold(self, size=None):
+        return self.range_hot_cold(0, self.window(size))
+
+
+class CooccurrenceIndex:
+    """
+    2星 / 3星 同開次數索引
+    - pairs：39×39 稠密矩陣，pairs[a-1, b-1] = a、b 同一期開出的次數 (對稱)
+    - triples：稀疏 Counter，鍵是壓縮過的三碼整數，只存開過的組合
+    新開獎只要 add()，不用整個重算
+    """
+
+    def __init__(self):
+        self.pairs = np.zeros((NUM_BALLS, NUM_BALLS), dtype=np.int64)
+        self.triples = Counter()
+        self.dates = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def add(self, draws):
+        """加入還沒收錄過的 [(日期, 號碼), ...]，回傳新增幾期"""
+        with self._lock:
+            fresh = [(dt, nums) for dt, nums in draws if dt not in self.dates]
+            if not fresh: return 0
+            nums = np.sort(np.array([n for _, n in fresh], dtype=np.int64), axis=1)
+
+            onehot = np.zeros((len(fresh), NUM_BALLS), dtype=np.int64)
+            onehot[np.arange(len(fresh))[:, None], nums - 1] = 1
+            self.pairs += onehot.T @ onehot
+            np.fill_diagonal(self.pairs, 0)
+
+            t = nums[:, _TRIPLE_POS]  # (期數, 10, 3)
+            keys, counts = np.unique((t[..., 0] * _TRIPLE_BASE + t[..., 1]) * _TRIPLE_BASE + t[..., 2], return_counts=True)
+            self.triples.update(dict(zip(keys.tolist(), counts.tolist())))
+            self.dates.update(dt for dt, _ in fresh)
+            return len(fresh)
+
+    def top_pairs(self, k=10, hot=True):
+        """[((a, b), 次數), ...]；hot=False 取最少同開的"""
+        iu = np.triu_indices(NUM_BALLS, 1)
+        counts = self.pairs[iu]
+        order = np.argsort(-counts if hot else counts, kind="stable")[:k]
+        return [((int(iu[0][i]) + 1, int(iu[1][i]) + 1), int(counts[i])) for i in order]
+
+    def top_triples(self, k=10, hot=True):
+        """[((a, b, c), 次數), ...]；冷門會算進從沒開過的組合"""
+        if hot:
+            return [(tuple(int(x) for x in ALL_TRIPLES[np.searchsorted(_ALL_TRIPLE_KEYS, key)]), c)
+                    for key, c in self.triples.most_common(k)]
+        counts = np.array([self.triples.get(key, 0) for key in _ALL_TRIPLE_KEYS.tolist()])
+        order = np.argsort(counts, kind="stable")[:k]
+        return [(tuple(int(x) for x in ALL_TRIPLES[i]), int(counts[i])) for i in order]
@@ -0,0 +1,167 @@
+# ==========================================
+# ☁️ Firestore 儲存後端
+# users/{帳號}：password / nickname / rollups_ready (彙總已回填完成，之後的區間總計、損益曲線才讀彙總)
+# records/{ID}：username / date / cost / prize / profit / details / timestamp
+# users/{帳號}/pnl_daily/{YYYY-MM-DD}、users/{帳號}/pnl_monthly/{YYYY-MM}：cost / prize / profit / count
+# records 的分頁查詢需要複合索引 (username ↑, date ↓)，定義在 firestore.indexes.json
+# ==========================================
+from firebase_admin import firestore
+from google.api_core import exceptions as gexc
+
+from bulk_write import commit_groups, create_op, delete_op, delete_query, set_op
+from pnl_rollups import DAILY, MONTHLY, pnl_curve, rollup_deltas
+from storage import Storage
+
+RECORDS_PER_BATCH = 160 # 一筆紀錄最多帶 1 個日彙總 + 1 個月彙總，3 × 160 < 單一 batch 上限 500
+READY_FIELD = "rollups_ready"
+BACKFILL_ATTEMPTS = 3 # 重建期間一直有人存檔、對不起來時最多重做幾次
+
+
+def _record(doc):
+    d = doc.to_dict()
+    return {"id": doc.id, **{k: d.get(k) for k in ("date", "cost", "prize", "profit", "details")}}
+
+
+class FirestoreStorage(Storage):
+
+    def __init__(self, db):
+        self.db = db
+        self._ready = set() # 確定彙總已回填完成的帳號 (完成了就不會再變回未完成，記在記憶體省一次讀取)
+
+    def _user(self, username):
+        return self.db.collection('users').document(username)
+
+    def _rollups(self, username, kind):
+        return self._user(username).collection(kind)
+
+    def _records_query(self, username, start=None, end=None):
+        """某個使用者、某段日期的紀錄，新 → 舊 (日期篩選在伺服器端做，不用整包抓回來)"""
+        q = self.db.collection('records').where("username", "==", username)
+        if start: q = q.where("date", ">=", start)
+        if end: q = q.where("date", "<=", end)
+        return q.order_by("date", direction=firestore.Query.DESCENDING)
+
+    def get_user(self, username):
+        doc = self._user(username).get()
+        return doc.to_dict() if doc.exists else None
+
+    def create_user(self, username, data):
+        try:
+            # create 遇到已存在的文件會失敗，不會蓋掉別人的帳號；新帳號的紀錄都會帶彙總，不用回填
+            self._user(username).create({**data, READY_FIELD: True})
+            return True
+        except gexc.AlreadyExists:
+            return False
+
+    def update_user(self, username, fields):
+        self._user(username).update(fields)
+
+    def list_users(self):
+        return [doc.id for doc in self.db.collection('users').select([]).stream()]
+
+    def delete_user(self, username):
+        self._user(username).delete()
+        self._ready.discard(username)
+
+    def save_records(self, username, records, progress=None, ids=None):
+        """
+        每 RECORDS_PER_BATCH 筆紀錄和它們的彙總增量是同一組，放在同一個 batch
+        彙總用 firestore.Increment 在伺服器端累加，多個分頁同時存檔也不會互相覆蓋；各組之間由 bulk_write 平行送出
+        紀錄用 create：同一個 ID (日誌的冪等鍵) 已經存在的話整組失敗，彙總增量也不會加，
+        兩個 flusher 搶到同一筆 (認領過期) 或重送時都不會重複記帳
+        """
+        groups = []
+        for i in range(0, len(records), RECORDS_PER_BATCH):
+            chunk = records[i:i + RECORDS_PER_BATCH]
+            chunk_ids = ids[i:i + RECORDS_PER_BATCH] if ids else [None] * len(chunk)
+            ops = [create_op(self.db.collection('records').document(doc_id), {**rec, "username": username, "timestamp": firestore.SERVER_TIMESTAMP})
+                   for rec, doc_id in zip(chunk, chunk_ids)]
+            ops += [set_op(self._rollups(username, kind).document(period),
+                           {"period": period, **{f: firestore.Increment(v) for f, v in d.items()}}, merge=True)
+                    for (kind, period), d in rollup_deltas(chunk).items()]
+            groups.append(ops)
+        return commit_groups(self.db, groups, progress)
+
+    def existing_records(self, ids):
+        refs = [self.db.collection('records').document(i) for i in ids]
+        return {snap.id for snap in self.db.get_all(refs, field_paths=["date"]) if snap.exists}
+
+    def records_page(self, username, start, end, limit, cursor=None):
+        """cursor = 上一頁最後一筆的文件快照，用 start_after 接著往後抓"""
+        q = self._records_query(username, start, end).limit(limit)
+        if cursor is not None: q = q.start_after(cursor)
+        docs = list(q.stream())
+        return [_record(d) for d in docs], docs[-1] if docs else cursor
+
+    def read_rollups(self, username, kind, start=None, end=None):
+        q = self._rollups(username, kind)
+        if start: q = q.where("period", ">=", start)
+        if end: q = q.where("period", "<=", end)
+        return [doc.to_dict() for doc in q.stream()]
+
+    def rollups_ready(self, username):
+        """這個帳號的彙總回填完了沒 (回填一半的帳號彙總只有部分紀錄，不能拿來算)"""
+        if username in self._ready: return True
+        doc = self._user(username).get()
+        if doc.exists and doc.to_dict().get(READY_FIELD): self._ready.add(username)
+        return username in self._ready
+
+    def _raw_rollups(self, username, kind, start=None, end=None):
+        """還沒回填完的帳號：直接讀區間內的紀錄 (只拿日期與金額)，在記憶體裡組出跟 read_rollups 一樣的彙總"""
+        if end and len(end) == 7: end += "-31" # 月彙總的期間是 YYYY-MM，紀錄的日期是 YYYY-MM-DD
+        records = [doc.to_dict() for doc in self._records_query(username, start, end).select(["date", "cost", "prize", "profit"]).stream()]
+        deltas = rollup_deltas(r for r in records if r.get("date"))
+        return [{"period": period, **d} for (k, period), d in deltas.items() if k == kind]
+
+    def _record_totals(self, username, start=None, end=None):
+        """直接對紀錄做 Firestore 彙總查詢 (筆數與金額加總在伺服器端算，不用把每一筆讀回來)"""
+        agg = self._records_query(username, start, end).count(alias="n").sum("cost", alias="cost").sum("prize", alias="prize").sum("profit", alias="profit")
+        return {r.alias: r.value or 0 for r in agg.get()[0]}
+
+    def range_totals(self, username, start=None, end=None):
+        """回填完成的帳號讀每日 / 每月彙總；還沒回填完 (舊帳號) 退回對紀錄的彙總查詢"""
+        if self.rollups_ready(username): return super().range_totals(username, start, end)
+        return self._record_totals(username, start, end)
+
+    def pnl_curve(self, username, start=None, end=None, by=DAILY):
+        """還沒回填完的帳號從紀錄現算 (彙總不完整，畫出來的曲線會少一段)"""
+        if self.rollups_ready(username): return super().pnl_curve(username, start, end, by)
+        return pnl_curve(lambda kind, s, e: self._raw_rollups(username, kind, s, e), start, end, by)
+
+    def delete_rollups(self, username, progress=None):
+        return sum(delete_query(self.db, self._rollups(username, kind), progress) for kind in (DAILY, MONTHLY))
+
+    def clear_history(self, username, progress=None):
+        """紀錄與彙總一起切 batch 平行刪除"""
+        queries = [self.db.collection('records').where("username", "==", username)] + [self._rollups(username, k) for k in (DAILY, MONTHLY)]
+        return commit_groups(self.db, [[delete_op(doc.reference)] for q in queries for doc in q.select([]).stream()], progress)
+
+    def backfill(self, username):
+        """
+        從原始紀錄重建彙總，做完才在帳號上標記 rollups_ready (中途失敗的話區間總計 / 損益曲線繼續從紀錄現算)
+        舊紀錄的日期可能是 YYYY/MM/DD，紀錄文件本身也一起改成存檔格式 (不然日期區間查詢查不到)
+        重建期間別的 process 照樣可以存檔，所以一開始先清掉 rollups_ready，重建完再核對：
+        - 讀紀錄之後、寫回彙總之前存進來的紀錄，增量會被刪掉或蓋掉 → 彙總筆數比紀錄少
+        - 先讀彙總再數紀錄，中間新存的只會讓紀錄那邊變多，不會剛好把少掉的補平
+        兩邊筆數一樣才標記完成，不一樣就整個重做，BACKFILL_ATTEMPTS 次都對不起來就丟 RuntimeError
+        """
+        self.update_user(username, {READY_FIELD: False})
+        self._ready.discard(username)
+        for _ in range(BACKFILL_ATTEMPTS):
+            docs = list(self.db.collection('records').where("username", "==", username).select(["date", "cost", "prize", "profit"]).stream())
+            records = [doc.to_dict() for doc in docs]
+            fixes = []
+            for doc, rec in zip(docs, records):
+                day = str(rec.get("date") or "")
+                rec["date"] = day.replace("/", "-")
+                if rec["date"] != day: fixes.append([set_op(doc.reference, {"date": rec["date"]}, merge=True)])
+            if fixes: commit_groups(self.db, fixes)
+            self.delete_rollups(username)
+            commit_groups(self.db, [[set_op(self._rollups(username, kind).document(period), {"period": period, **d})]
+                                    for (kind, period), d in rollup_deltas(r for r in records if r["date"]).items()])
+            rolled = super().range_totals(username)["n"]
+            if rolled == self._record_totals(username)["n"]:
+                self.update_user(username, {READY_FIELD: True})
+                self._ready.add(username)
+                return len(records)
+        raise RuntimeError(f"{username} 重建彙總期間一直有新紀錄寫入，對不起來，請稍後再跑一次")
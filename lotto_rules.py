@@ -0,0 +1,73 @@
+# ==========================================
+# 📏 539 玩法規則與預設賠率 (兌獎、計算機、回測共用)
+# ==========================================
+import itertools
+import math
+
+import numpy as np
+
+from touch_math import touch_counts
+
+BASE_RATE = 10 # 所有成本 / 獎金都以 10 元為基準
+
+# 側邊欄的預設值：坐車成本與獎金 (每 10 元)、連碰/立柱折扣、各星等每碰獎金 (每 10 元)
+DEFAULT_ODDS = {
+    "car_cost": 304,
+    "combo_discount": 0.78,
+    "car_prize": 2120,
+    "star_prizes": {2: 530, 3: 5700, 4: 800000},
+}
+
+def calculate_combinations(n, k):
+    if n < k: return 0
+    return math.comb(n, k)
+
+# 💰 成本一律無條件進位 (計算機、兌獎頁加注、批次匯入共用同一套算法)
+def car_cost(n, amount=10, odds=DEFAULT_ODDS):
+    """坐車 / 坐尾數：n 個號碼 × 金額 × (坐車成本 / 10)"""
+    return math.ceil(n * (amount * (odds["car_cost"] / BASE_RATE)))
+
+def touch_cost(touches, amount=10, odds=DEFAULT_ODDS):
+    """連碰 / 立柱：總碰數 × 金額 × 折扣"""
+    return math.ceil(touches * amount * odds["combo_discount"])
+
+def get_tail_numbers(tail_digit):
+    return [i * 10 + tail_digit for i in range(4) if 1 <= i * 10 + tail_digit <= 39]
+
+def calculate_lizhu_touches(counts, star_level):
+    # 💡 改用基本對稱多項式 DP (touch_math)，不再列舉每一種跨柱組合
+    return touch_counts(counts).get(star_level, 0)
+
+# ==========================================
+# 🧮 號碼 bitmask：第 n 號 = 第 n-1 個 bit，一組號碼就是一個 39-bit 整數
+# ==========================================
+def to_mask(nums):
+    mask = 0
+    for n in nums: mask |= 1 << (n - 1)
+    return mask
+
+_ALL_DRAW_MASKS = None
+_ALL_DRAW_NUMBERS = None
+
+def all_draw_numbers():
+    """全部 C(39,5) 種開獎結果的號碼 (0-based、由小到大，uint8 (575757, 5))，順序與 all_draw_masks 相同"""
+    global _ALL_DRAW_NUMBERS
+    if _ALL_DRAW_NUMBERS is None:
+        _ALL_DRAW_NUMBERS = np.array(list(itertools.combinations(range(39), 5)), dtype=np.uint8)
+    return _ALL_DRAW_NUMBERS
+
+def all_draw_masks():
+    """全部 C(39,5) = 575,757 種開獎結果的 bitmask (uint64)，第一次用到才建"""
+    global _ALL_DRAW_MASKS
+    if _ALL_DRAW_MASKS is None:
+        idx = all_draw_numbers().astype(np.uint64)
+        _ALL_DRAW_MASKS = np.bitwise_or.reduce(np.left_shift(np.uint64(1), idx), axis=1)
+    return _ALL_DRAW_MASKS
+
+_POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount(masks):
+    """uint64 陣列每個元素有幾個 bit 是 1 (= 中幾顆)"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"): return np.bitwise_count(masks)
+    return _POPCOUNT_8[masks.view(np.uint8)].reshape(masks.shape + (8,)).sum(axis=-1, dtype=np.uint8)
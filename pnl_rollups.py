@@ -0,0 +1,85 @@
+# ==========================================
+# 📆 損益表每日 / 每月彙總 (存檔時一起累加，區間總計只要讀幾個月份的彙總，不用把每一筆紀錄讀回來)
+# 每個帳號每天一筆 (DAILY，YYYY-MM-DD)、每月一筆 (MONTHLY，YYYY-MM)：cost / prize / profit / count
+# 這裡只放跟儲存後端無關的算法，實際讀寫在 storage.py / firestore_storage.py
+# 用法 (重建彙總)：python pnl_rollups.py [--storage firestore] [--user 帳號]
+# ==========================================
+import argparse
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+
+DAILY = "pnl_daily"
+MONTHLY = "pnl_monthly"
+FIELDS = ("cost", "prize", "profit", "count")
+
+
+def _add(acc, key, rec, sign=1):
+    r = acc.setdefault(key, dict.fromkeys(FIELDS, 0))
+    for f in ("cost", "prize", "profit"): r[f] += sign * (rec.get(f) or 0)
+    r["count"] += sign
+
+
+def rollup_deltas(records, sign=1):
+    """一批紀錄 → {(DAILY, 日期): {cost, prize, profit, count}, (MONTHLY, 月份): {...}}；刪除時 sign = -1"""
+    acc = {}
+    for rec in records:
+        day = rec["date"]
+        _add(acc, (DAILY, day), rec, sign)
+        _add(acc, (MONTHLY, day[:7]), rec, sign)
+    return acc
+
+
+def _month_end(d):
+    return d.replace(day=calendar.monthrange(d.year, d.month)[1])
+
+
+def range_totals(read, start=None, end=None):
+    """
+    區間 (含頭含尾，YYYY-MM-DD，None = 不限) 的筆數 / 成本 / 獎金 / 損益
+    read(種類, 起, 迄) 回傳那段期間的彙總 [{period, cost, prize, profit, count}, ...] (由儲存後端提供)
+    中間完整的月份讀月彙總，頭尾不滿一個月的部分讀日彙總：讀取次數是 O(月數)，不是 O(紀錄數)
+    """
+    s = date.fromisoformat(start) if start else None
+    e = date.fromisoformat(end) if end else None
+    # 完整月份 [m1, m2]：開頭不是 1 號就從下個月算，結尾不是月底就算到上個月
+    m1 = None if s is None else s if s.day == 1 else _month_end(s) + timedelta(days=1)
+    m2 = None if e is None else e if e == _month_end(e) else e.replace(day=1) - timedelta(days=1)
+    if m1 is not None and m2 is not None and m1 > m2:
+        docs = read(DAILY, start, end)
+    else:
+        docs = read(MONTHLY, m1 and m1.strftime("%Y-%m"), m2 and m2.strftime("%Y-%m"))
+        if m1 is not None and s < m1: docs += read(DAILY, start, str(m1 - timedelta(days=1)))
+        if m2 is not None and e > m2: docs += read(DAILY, str(_month_end(m2) + timedelta(days=1)), end)
+    return {"n": sum(d.get("count", 0) for d in docs), **{f: sum(d.get(f, 0) for d in docs) for f in ("cost", "prize", "profit")}}
+
+
+def pnl_curve(read, start=None, end=None, by=DAILY):
+    """
+    累計損益與回檔曲線 (直接讀彙總，一天 / 一個月一個點)：
+    {"periods", "profit", "cum_profit", "drawdown" = 累計損益離歷史高點差多少 (≤ 0)}
+    """
+    if by == MONTHLY: start, end = start and start[:7], end and end[:7]
+    docs = sorted((d for d in read(by, start, end) if d.get("count")), key=lambda d: d["period"])
+    profit = np.array([d.get("profit", 0) for d in docs], dtype=np.float64)
+    cum = np.cumsum(profit)
+    peak = np.maximum.accumulate(np.concatenate([[0.0], cum]))[1:] # 從 0 起算，一開始就賠也算回檔
+    return {"periods": [d["period"] for d in docs], "profit": profit, "cum_profit": cum, "drawdown": cum - peak}
+
+
+def main():
+    from storage import open_storage
+
+    parser = argparse.ArgumentParser(description="從損益紀錄重建每日 / 每月彙總")
+    parser.add_argument("--storage", default="firestore", help="firestore / sqlite:檔名 / memory")
+    parser.add_argument("--user", help="只重建這個帳號 (預設全部帳號)")
+    args = parser.parse_args()
+
+    store = open_storage(args.storage)
+    for username in [args.user] if args.user else store.list_users():
+        print(f"{username}: {store.backfill(username)} 筆紀錄")
+
+
+if __name__ == "__main__":
+    main()
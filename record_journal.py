@@ -0,0 +1,158 @@
+# ==========================================
+# 📝 損益紀錄的本地日誌 (先寫本機 SQLite 馬上返回，背景執行緒再整批送進儲存後端)
+# 每筆紀錄有一個冪等鍵 = 紀錄 ID：送出前先查這些 ID 在不在，在了就代表上次其實寫成功了，不會重複記帳
+# 儲存後端寫入時也是「這個 ID 不存在才寫」，認領過期、兩個 process 同時送同一筆也只會有一筆成功
+# ==========================================
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+JOURNAL_PATH = os.environ.get("LTO539_JOURNAL_PATH", "records_journal.sqlite3")
+FLUSH_INTERVAL = 2    # 沒人叫醒時多久檢查一次
+FLUSH_LIMIT = 2000    # 一輪最多送幾筆
+CLAIM_TTL = 120       # 認領後多久沒送完就讓別的 process 接手
+RETRY_MAX = 300       # 一直失敗時最長隔幾秒再試
+
+
+class RecordJournal:
+    """
+    待送出的損益紀錄 (WAL 模式，多個 process 可以共用同一個檔案)
+    一筆 = (冪等鍵, 帳號, 紀錄內容)；送進儲存後端成功才刪掉，程式當掉重開也不會遺失
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending ("
+                " key TEXT PRIMARY KEY, username TEXT NOT NULL, record TEXT NOT NULL, created REAL NOT NULL,"
+                " holder TEXT NOT NULL DEFAULT '', claimed_until REAL NOT NULL DEFAULT 0,"
+                " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pending_user ON pending (username, created)")
+
+    def append(self, username, records):
+        """寫進日誌就返回，回傳每筆的冪等鍵"""
+        now = time.time()
+        rows = [(uuid.uuid4().hex, username, json.dumps(rec, ensure_ascii=False), now) for rec in records]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO pending (key, username, record, created) VALUES (?, ?, ?, ?)", rows)
+        return [r[0] for r in rows]
+
+    def pending(self, username):
+        """這個帳號還沒送上去的紀錄 (舊 → 新)，每筆多帶 id (= 冪等鍵) 與 attempts / last_error"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, record, attempts, last_error FROM pending WHERE username = ? ORDER BY created", (username,)
+            ).fetchall()
+        return [{**json.loads(rec), "id": key, "attempts": attempts, "last_error": err} for key, rec, attempts, err in rows]
+
+    def claim(self, holder, limit=FLUSH_LIMIT, ttl=CLAIM_TTL):
+        """
+        認領一批沒人在送 (或認領已過期) 的紀錄：一個 UPDATE 完成，多個 process 不會搶到同一筆
+        回傳 [(冪等鍵, 帳號, 紀錄), ...]
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE pending SET holder = ?, claimed_until = ? WHERE key IN ("
+                " SELECT key FROM pending WHERE claimed_until < ? ORDER BY created LIMIT ?)",
+                (holder, now + ttl, now, limit),
+            )
+            rows = self._conn.execute(
+                "SELECT key, username, record FROM pending WHERE holder = ? AND claimed_until = ? ORDER BY created",
+                (holder, now + ttl),
+            ).fetchall()
+        return [(key, username, json.loads(rec)) for key, username, rec in rows]
+
+    def done(self, keys):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending WHERE key = ?", [(k,) for k in keys])
+
+    def failed(self, keys, error):
+        """送失敗：放掉認領、記下錯誤，下一輪再試"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE pending SET claimed_until = 0, attempts = attempts + 1, last_error = ? WHERE key = ?",
+                [(error, k) for k in keys],
+            )
+
+    def discard(self, username):
+        """清空紀錄時，連還沒送上去的也一起丟掉"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM pending WHERE username = ?", (username,)).rowcount
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+
+def flush(journal, store, holder):
+    """
+    送出一批日誌：同一個帳號的一起送
+    先用冪等鍵查儲存後端已經有哪些 (上次送成功但還沒來得及從日誌刪掉)，只送沒有的，
+    紀錄和它的彙總增量在同一個 batch，所以「紀錄在」就代表「彙總也加過了」，重送不會重複累加
+    回傳 (送出筆數, 失敗筆數)
+    """
+    by_user = {}
+    for key, username, rec in journal.claim(holder): by_user.setdefault(username, []).append((key, rec))
+    sent = failed = 0
+    for username, items in by_user.items():
+        keys = [k for k, _ in items]
+        try:
+            exists = store.existing_records(keys)
+            todo = [(k, rec) for k, rec in items if k not in exists]
+            if todo: store.save_records(username, [rec for _, rec in todo], ids=[k for k, _ in todo])
+            journal.done(keys)
+            sent += len(todo)
+        except Exception as e:
+            journal.failed(keys, f"{type(e).__name__}: {e}")
+            failed += len(keys)
+    return sent, failed
+
+
+class JournalFlusher:
+    """
+    一個 process 一個 (搭配 st.cache_resource) 的背景執行緒：
+    有人存檔就 notify() 馬上送，平常每 FLUSH_INTERVAL 秒看一次；一直失敗就退避，最久 RETRY_MAX 秒再試
+    """
+
+    def __init__(self, journal, store, interval=FLUSH_INTERVAL):
+        self.journal = journal
+        self.store = store
+        self.interval = interval
+        self._holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="record-journal", daemon=True)
+                self._thread.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    def _loop(self):
+        delay = self.interval
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                sent, failed = flush(self.journal, self.store, self._holder)
+                while sent and not failed: sent, failed = flush(self.journal, self.store, self._holder) # 還有就繼續送
+            except Exception as e:
+                failed, self.last_error = 1, e # SQLite 本身出錯也不能讓執行緒死掉
+            delay = min(RETRY_MAX, delay * 2) if failed else self.interval
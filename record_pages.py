@@ -0,0 +1,99 @@
+# ==========================================
+# 📄 損益表分頁查詢 (日期區間交給儲存後端篩，游標一頁一頁抓，抓過的頁留在 session 快取)
+# ==========================================
+from datetime import timedelta
+
+from pnl_rollups import DAILY, MONTHLY
+
+PAGE_SIZE = 30 # 一頁幾筆紀錄 (一筆 = 一次對獎)
+
+
+def date_range(time_filter, today, custom=None):
+    """
+    損益表的查詢範圍 → (起, 迄, 標題)；起 / 迄是 YYYY-MM-DD 字串 (與存檔格式相同)，None = 不限
+    自訂區間只點了一天就查那一天；還沒點完整就回 (None, None, None) 代表先不查
+    """
+    if time_filter == "近一周": return str(today - timedelta(days=7)), None, time_filter
+    if time_filter == "近一個月": return str(today - timedelta(days=30)), None, time_filter
+    if time_filter == "自訂區間":
+        if custom and len(custom) == 2: return str(custom[0]), str(custom[1]), f"{custom[0]} 至 {custom[1]}"
+        if custom and len(custom) == 1: return str(custom[0]), str(custom[0]), f"{custom[0]} 單日"
+        return None, None, None
+    return None, None, time_filter
+
+
+def record_row(d):
+    """儲存後端的一筆紀錄 {id, date, cost, prize, profit, details} → 損益表的欄位"""
+    return {
+        "id": d["id"],
+        "開獎日期": d.get("date"),
+        "總成本": d.get("cost"),
+        "總獎金": d.get("prize"),
+        "淨損益": d.get("profit"),
+        "details": d.get("details"),
+        "pending": False,
+    }
+
+
+def pending_row(rec):
+    """本地日誌裡還沒送上雲端的紀錄 (record_journal.RecordJournal.pending 的一筆) → 跟 record_row 同樣的欄位"""
+    return {
+        "id": rec["id"],
+        "開獎日期": rec.get("date"),
+        "總成本": rec.get("cost"),
+        "總獎金": rec.get("prize"),
+        "淨損益": rec.get("profit"),
+        "details": rec.get("details"),
+        "pending": True,
+    }
+
+
+class RecordPager:
+    """
+    一個使用者 × 一個日期區間的分頁快取
+    抓過的頁留在記憶體 (來回翻頁不再讀資料庫)，往後翻才用上一頁的游標接著抓下一頁
+    區間總計與損益曲線讀每日 / 每月彙總，也只算一次
+    """
+
+    def __init__(self, store, username, start=None, end=None, page_size=PAGE_SIZE):
+        self._store = store
+        self._args = (username, start, end)
+        self.page_size = page_size
+        self.pages = []
+        self.done = False  # 已經抓到最後一頁
+        self._cursor = None
+        self._totals = None
+        self._curve = None
+
+    def _fetch_next(self):
+        recs, self._cursor = self._store.records_page(*self._args, self.page_size, self._cursor)
+        if recs: self.pages.append([record_row(r) for r in recs])
+        if len(recs) < self.page_size: self.done = True
+
+    def page(self, i):
+        """第 i 頁 (從 0 開始)；還沒抓過就一路抓到那一頁，超過最後一頁回 []"""
+        while len(self.pages) <= i and not self.done: self._fetch_next()
+        return self.pages[i] if i < len(self.pages) else []
+
+    def totals(self):
+        """整個區間的筆數 / 成本 / 獎金 / 損益"""
+        if self._totals is None: self._totals = self._store.range_totals(*self._args)
+        return self._totals
+
+    def curve(self):
+        """累計損益 / 回檔曲線 (見 pnl_rollups.pnl_curve)；全部紀錄一個月一個點，有指定區間才一天一個點"""
+        username, start, end = self._args
+        if self._curve is None: self._curve = self._store.pnl_curve(username, start, end, DAILY if start or end else MONTHLY)
+        return self._curve
+
+
+def get_pager(cache, store, username, start=None, end=None):
+    """cache 是 session_state 裡的 dict：同一個使用者同一個區間沿用同一個 RecordPager"""
+    key = (username, start, end)
+    if key not in cache: cache[key] = RecordPager(store, username, start, end)
+    return cache[key]
+
+
+def invalidate(cache, username):
+    """這個使用者的紀錄有新增 / 刪除：丟掉他所有區間的快取頁"""
+    for key in [k for k in cache if k[0] == username]: del cache[key]
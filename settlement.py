@@ -0,0 +1,136 @@
+# ==========================================
+# 🧾 批次兌獎引擎 (整張單 × 一期或多期開獎，一次向量化算完)
+# 號碼、每一柱、每一期開獎都是 39-bit mask，中幾顆 = popcount(下注 & 開獎)
+# ==========================================
+import hashlib
+import itertools
+import json
+import math
+import pickle
+
+import numpy as np
+
+from bet_model import PlayType, as_bet, mask_nums
+from lotto_rules import BASE_RATE, DEFAULT_ODDS, popcount, to_mask
+
+# _COMBO_WON[h, k] = 連碰中 h 顆時 k 星中幾碰 = C(h, k)
+_COMBO_WON = np.array([[math.comb(h, k) for k in range(5)] for h in range(6)], dtype=np.int64)
+
+
+def group_masks(groups):
+    """很多組號碼一次轉成 mask 陣列 (一組 = 一個 uint64)，不用逐組跑 to_mask"""
+    lens = np.fromiter(map(len, groups), dtype=np.intp, count=len(groups))
+    out = np.zeros(len(groups), dtype=np.uint64)
+    if not lens.any(): return out
+    bits = np.left_shift(np.uint64(1), np.fromiter(itertools.chain.from_iterable(groups), dtype=np.uint64) - np.uint64(1))
+    # 空的組不參與 reduceat (起點必須遞增)，直接留 0
+    filled = lens > 0
+    out[filled] = np.bitwise_or.reduceat(bits, (np.cumsum(lens) - lens)[filled])
+    return out
+
+
+def encode_slip(bets):
+    """
+    把整張單壓成幾個 NumPy 欄位：玩法代碼、號碼 mask、每柱 mask (不足補 0)、倍率、買了哪些星等、成本
+    Bet 裡的 mask 都是加入時就算好的，這裡只是搬進陣列；同一張單兌多期時只要編一次
+    """
+    bets = [as_bet(b) for b in bets]
+    n = len(bets)
+    max_cols = max([len(b.col_masks) for b in bets] + [1])
+    stars = np.fromiter((b.stars for b in bets), dtype=np.uint8, count=n)
+    return {
+        "kind": np.fromiter((-1 if b.play is None else b.play for b in bets), dtype=np.int8, count=n),
+        "masks": np.fromiter((b.mask for b in bets), dtype=np.uint64, count=n),
+        "col_masks": np.array([b.col_masks + (0,) * (max_cols - len(b.col_masks)) for b in bets], dtype=np.uint64).reshape(n, max_cols),
+        "mul": np.fromiter((b.bet_amount / BASE_RATE for b in bets), dtype=np.float64, count=n),
+        "stars": (stars[:, None] >> np.arange(3, dtype=np.uint8) & 1).astype(bool),
+        "cost": np.fromiter((b.actual_cost for b in bets), dtype=np.float64, count=n),
+    }
+
+
+def settle_masks(slip, draw_masks, odds=DEFAULT_ODDS):
+    """
+    encode_slip() 的結果 × 開獎 mask 陣列 (m 期)
+    回傳 hits (注, 期)、won (注, 3, 期) = 2/3/4 星中幾碰、prize (注, 期)
+    規則與兌獎頁相同：坐車 = 倍率 × 坐車獎金 × 中幾顆；連碰 C(中, k)；立柱 = 各柱中獎數的基本對稱多項式
+    """
+    draws = np.asarray(draw_masks, dtype=np.uint64)
+    kind = slip["kind"][:, None]
+    hits = popcount(slip["masks"][:, None] & draws[None, :]).astype(np.int64)
+
+    # 立柱：逐柱更新基本對稱多項式 e[k] += e[k-1] × 該柱中獎數，整張單 × 全部期數一起算
+    e = [np.ones(hits.shape, dtype=np.int64)] + [np.zeros(hits.shape, dtype=np.int64) for _ in range(4)]
+    for j in range(slip["col_masks"].shape[1]):
+        c = popcount(slip["col_masks"][:, j, None] & draws[None, :]).astype(np.int64)
+        for k in range(4, 0, -1): e[k] = e[k] + e[k - 1] * c
+
+    won = np.zeros((len(slip["kind"]), 3, len(draws)), dtype=np.int64)
+    for i, k in enumerate((2, 3, 4)):
+        won[:, i] = np.where(kind == PlayType.LIZHU, e[k], np.where(kind == PlayType.COMBO, _COMBO_WON[hits, k], 0))
+    won *= slip["stars"][:, :, None]
+
+    star_prizes = np.array([odds["star_prizes"][k] for k in (2, 3, 4)], dtype=np.float64)
+    prize = np.where(kind == PlayType.CAR, odds["car_prize"] * hits, np.einsum("bkd,k->bd", won, star_prizes))
+    prize = np.where(kind == -1, 0.0, prize) * slip["mul"][:, None]
+    return {"hits": hits, "won": won, "prize": prize}
+
+
+def settle_slip(bets, draw_numbers, odds=DEFAULT_ODDS):
+    """
+    一張單對一期開獎，回傳每注一列的精簡結果 (不碰任何畫面)：
+    [{"hits", "matched", "won": (2星, 3星, 4星 碰數), "star_prizes": (各星等獎金), "prize", "cost"}, ...]
+    """
+    if not bets: return []
+    draw_mask = to_mask(draw_numbers)
+    slip = encode_slip(bets)
+    res = settle_masks(slip, [draw_mask], odds)
+    # 先整批轉成 Python list，逐列組 dict 時就不用一個一個取 NumPy 純量
+    matched = (slip["masks"] & np.uint64(draw_mask)).tolist()
+    star_prizes = np.array([odds["star_prizes"][k] for k in (2, 3, 4)], dtype=np.float64)
+    won = res["won"][:, :, 0]
+    won_prizes = (won * star_prizes * slip["mul"][:, None]).tolist()
+    draw_sorted = sorted(draw_numbers)
+    return [{
+        "hits": h,
+        "matched": [n for n in draw_sorted if m >> (n - 1) & 1] if m else [],
+        "won": tuple(w),
+        "star_prizes": tuple(wp),
+        "prize": p,
+        "cost": c,
+    } for h, m, w, wp, p, c in zip(res["hits"][:, 0].tolist(), matched, won.tolist(), won_prizes,
+                                   res["prize"][:, 0].tolist(), slip["cost"].tolist())]
+
+
+def settle_dates(bets, draws, odds=DEFAULT_ODDS):
+    """
+    同一張單對很多期 [(日期, 號碼), ...] 一次結算 (注 × 期 整個矩陣一起算，單只編一次)
+    回傳每期成本 (固定)、每期獎金 / 損益、累計損益，以及每注每期的獎金 bet_prize (注, 期)
+    """
+    slip = encode_slip(bets)
+    res = settle_masks(slip, group_masks([nums for _, nums in draws]), odds)
+    cost = float(slip["cost"].sum())
+    prize = res["prize"].sum(axis=0)
+    return {
+        "dates": [dt for dt, _ in draws],
+        "draws": [nums for _, nums in draws],
+        "cost": cost,
+        "prize": prize,
+        "profit": prize - cost,
+        "cum_profit": np.cumsum(prize - cost),
+        "bet_prize": res["prize"],
+    }
+
+
+def slip_details(bets, draw_numbers, prizes):
+    """存進損益表 details 的格式：每注一筆 Bet.detail()"""
+    draw_mask = to_mask(draw_numbers)
+    return [b.detail(float(p), mask_nums(b.mask & draw_mask)) for b, p in zip(map(as_bet, bets), prizes)]
+
+
+def settlement_key(bets, draw_numbers, odds=DEFAULT_ODDS):
+    """
+    (整張單, 開獎號碼, 賠率 / 折扣設定) 的內容雜湊；三者任何一個有變，鍵就不同
+    下注清單用 pickle 序列化 (比 json 快好幾倍)，內容一樣但寫法不同頂多是快取沒中，不會拿錯結果
+    """
+    payload = pickle.dumps((bets, sorted(draw_numbers), json.dumps(odds, sort_keys=True)), protocol=4)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
@@ -0,0 +1,147 @@
+# ==========================================
+# 🔁 重複碰數與號碼曝險分析 (整張單的 2星 / 3星 碰到底各買了幾次)
+# 不列舉任何組合：2星用 39×39 計數矩陣、3星用 39×39×39 計數張量，整張單用矩陣乘法一次累加
+# ==========================================
+import numpy as np
+
+from bet_model import PlayType, as_bet
+from lotto_rules import popcount
+
+NUM_BALLS = 39
+CHUNK = 2048 # 一次處理幾注 (3星那一步每注要 39×39 的暫存)
+_BITS = np.left_shift(np.uint64(1), np.arange(NUM_BALLS, dtype=np.uint64))
+
+
+def _onehot(masks):
+    """uint64 mask 陣列 → (..., 39) 的 0/1 float 陣列"""
+    return ((np.asarray(masks, dtype=np.uint64)[..., None] & _BITS) != 0).astype(np.float64)
+
+
+def _slip_arrays(bets):
+    """號碼矩陣 V (注, 39)、立柱各柱矩陣 C (注, 柱, 39；連碰全 0)、買 2/3 星、倍率、mask"""
+    max_cols = max([len(b.col_masks) for b in bets] + [1])
+    cols = np.array([b.col_masks + (0,) * (max_cols - len(b.col_masks)) if b.play == PlayType.LIZHU else (0,) * max_cols
+                     for b in bets], dtype=np.uint64).reshape(len(bets), max_cols)
+    masks = np.array([b.mask for b in bets], dtype=np.uint64)
+    touch = np.array([b.play in (PlayType.COMBO, PlayType.LIZHU) for b in bets], dtype=bool)
+    stars = np.array([b.stars for b in bets], dtype=np.int64)
+    return {
+        "V": _onehot(masks),
+        "C": _onehot(cols),
+        "masks": masks,
+        "col_masks": cols,
+        "buy2": touch & (stars & 1 > 0),
+        "buy3": touch & (stars & 2 > 0),
+        "mul": np.array([b.bet_amount / 10 for b in bets], dtype=np.float64),
+    }
+
+
+def _col_rows(C, W):
+    """立柱每一柱攤成一列 (注×柱, 39)，空柱丟掉；權重跟著所屬那注"""
+    cc = C.reshape(-1, NUM_BALLS)
+    cw = np.repeat(W, C.shape[1], axis=0)
+    keep = cc.any(axis=1)
+    return cc[keep], cw[keep], np.repeat(np.arange(len(C)), C.shape[1])[keep]
+
+
+def _pair_counts(V, C, W):
+    """
+    W 是 (注, m) 的權重，回傳 (m, 39, 39)：P[j, a, b] = Σ 權重 j × (這注有沒有買到 {a, b} 這個 2星碰)
+    連碰：號碼裡任兩碼；立柱：不同柱各一碼 = 全部兩兩 − 同柱兩兩
+    """
+    cc, cw, _ = _col_rows(C, W)
+    P = np.stack([(V * W[:, j, None]).T @ V - (cc * cw[:, j, None]).T @ cc for j in range(W.shape[1])])
+    P[:, np.arange(NUM_BALLS), np.arange(NUM_BALLS)] = 0
+    return P
+
+
+def _triple_counts(V, C, W):
+    """
+    W 是 (注, m) 的權重，回傳 (m, 39, 39, 39)：T[j, a, b, c] = Σ 權重 j × (這注有沒有買到 {a, b, c} 這個 3星碰)
+    只有 a、b、c 互不相同的格子有意義
+    立柱要三碼分屬三柱：排容 = 全部三三 − (ab 同柱) − (ac 同柱) − (bc 同柱) + 2 × (三碼同柱)
+    """
+    m = W.shape[1]
+    T = np.zeros((m, NUM_BALLS, NUM_BALLS ** 2))
+    use = W.any(axis=1) # 沒買 3星 的注 (含坐車) 整列跳過
+    V, C, W = V[use], C[use], W[use]
+    for s in range(0, len(V), CHUNK):
+        v, w = V[s:s + CHUNK], W[s:s + CHUNK]
+        vv = (v[:, :, None] * v[:, None, :]).reshape(len(v), -1)           # (注, 39×39)
+        for j in range(m): T[j] += (v * w[:, j, None]).T @ vv             # [a, (b, c)]
+    cc, cw, owner = _col_rows(C, W)
+    if len(cc):
+        B = np.zeros_like(T)
+        for s in range(0, len(cc), CHUNK):
+            c, w, vo = cc[s:s + CHUNK], cw[s:s + CHUNK], V[owner[s:s + CHUNK]]
+            pair = (c[:, :, None] * c[:, None, :]).reshape(len(c), -1)     # 同柱的兩碼 (柱, 39×39)
+            for j in range(m):
+                B[j] += ((vo - 2 / 3 * c) * w[:, j, None]).T @ pair        # [c, (a, b)]：a、b 同柱，三碼同柱的部分先扣掉
+        B = B.reshape(m, NUM_BALLS, NUM_BALLS, NUM_BALLS)                  # [c, a, b]
+        # (ab 同柱) + (ac 同柱) + (bc 同柱)；三碼同柱在三項裡各被扣 2/3，合起來 = −3 + 2 = +2 × (三碼同柱) 的排容修正
+        T = T.reshape(B.shape) - (B.transpose(0, 2, 3, 1) + B.transpose(0, 2, 1, 3) + B)
+    return T.reshape(m, NUM_BALLS, NUM_BALLS, NUM_BALLS)
+
+
+_IU2 = np.triu_indices(NUM_BALLS, 1)
+_IU3 = tuple(np.array(x) for x in zip(*[(a, b, c) for a in range(NUM_BALLS) for b in range(a + 1, NUM_BALLS)
+                                         for c in range(b + 1, NUM_BALLS)]))
+
+
+def _holders(arrays, buy, nums):
+    """哪幾注 (清單順序，從 1 開始) 買到了這個碰：號碼都在注裡，立柱還要每柱最多一碼"""
+    touch = np.uint64(sum(1 << (n - 1) for n in nums))
+    ok = buy & ((arrays["masks"] & touch) == touch) & (popcount(arrays["col_masks"] & touch) <= 1).all(axis=1)
+    return (np.flatnonzero(ok) + 1).tolist()
+
+
+def _summary(counts, keys, arrays, buy, top):
+    bought = int(counts.sum())
+    unique = int((counts > 0).sum())
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 1][:top]
+    return {
+        "bought": bought,
+        "unique": unique,
+        "duplicated": bought - unique,
+        "top": [(nums, int(counts[i]), _holders(arrays, buy, nums))
+                for i in order for nums in [tuple(int(k[i]) + 1 for k in keys)]],
+    }
+
+
+def slip_exposure(bets, top=20):
+    """
+    整張單的重複碰數與號碼曝險：
+    - pairs / triples：買了幾個 2星 / 3星 碰 (bought)、其中不重複的有幾個 (unique)、
+      重複買的次數 (duplicated)，以及重複最多的碰與買到它的組合編號 (top)
+    - by_number：每個號碼出現在幾注、被幾個 2星 / 3星 碰 (依倍率加權) 涵蓋、坐車押了幾倍
+    """
+    bets = [as_bet(b) for b in bets]
+    if not bets:
+        empty = {"bought": 0, "unique": 0, "duplicated": 0, "top": []}
+        zeros = np.zeros(NUM_BALLS)
+        return {"pairs": empty, "triples": dict(empty), "by_number": {"bets": zeros, "pair_stake": zeros, "triple_stake": zeros, "car_stake": zeros}}
+    a = _slip_arrays(bets)
+    V, C, mul = a["V"], a["C"], a["mul"]
+
+    # 權重兩欄一起算：第 0 欄 = 買了幾次 (計數)，第 1 欄 = 倍率 (曝險，同一個碰買 20 元算 2 倍)
+    pairs = _pair_counts(V, C, np.stack([a["buy2"], a["buy2"] * mul], axis=1).astype(np.float64))
+    triples = _triple_counts(V, C, np.stack([a["buy3"], a["buy3"] * mul], axis=1).astype(np.float64))
+    pair_counts = np.rint(pairs[0][_IU2]).astype(np.int64)
+    triple_counts = np.rint(triples[0][_IU3]).astype(np.int64)
+    car = np.array([b.play == PlayType.CAR for b in bets])
+    return {
+        "pairs": _summary(pair_counts, _IU2, a, a["buy2"], top),
+        "triples": _summary(triple_counts, _IU3, a, a["buy3"], top),
+        "by_number": {
+            "bets": V.sum(axis=0),
+            "pair_stake": pairs[1].sum(axis=1),
+            # 3星張量只有 a、b、c 互不相同的格子有效 (其他格子排容後不一定是 0)，取上三角再攤回三個號碼
+            "triple_stake": np.bincount(np.concatenate(_IU3), weights=np.tile(triples[1][_IU3], 3), minlength=NUM_BALLS),
+            "car_stake": (V[car] * mul[car, None]).sum(axis=0),
+        },
+    }
+
+
+def format_touch(nums):
+    return "-".join(f"{n:02d}" for n in nums)
@@ -0,0 +1,197 @@
+# ==========================================
+# 📥 下注單文法 (計算機簡寫、批次匯入共用同一套解析與成本算法)
+# ==========================================
+# 一行一注，空白 / 逗號分隔號碼，號碼群後面接玩法：
+#   5碰2星3星            → 連碰 5 碼 (只有碼數，計算機用)
+#   01 05 12 33碰2星3星  → 號碼連碰
+#   3柱4柱2星            → 立柱，各柱 3、4 碼 (只有碼數)
+#   01 02柱05 06 07柱2星 → 號碼立柱；後面再接 08 09碰 = 柱碰混合
+#   1尾柱3,5尾柱2星      → 尾數立柱；1,3尾碰2星 → 尾數連碰
+#   5車 / 01 05 12車     → 坐車；1,3尾車 (或 1,3尾) → 坐尾數
+# 結尾可加金額：x20、*20 或 20元 (預設 10 元)
+# 只有一個數字又沒補 0 (例：5車) 當作「碼數」；要單買一個號碼請寫 05車
+import re
+import unicodedata
+
+from bet_model import Bet, PlayType
+from lotto_rules import DEFAULT_ODDS, car_cost, get_tail_numbers, touch_cost
+from touch_math import touch_counts
+
+_AMOUNT_RE = re.compile(r"(?:[x×*＊@]\s*(\d+)|(\d+)\s*元)\s*$", re.IGNORECASE)
+_STARS_RE = re.compile(r"^(?:\d星)+$")
+_SEP_RE = re.compile(r"[\s,、;]+")
+
+
+class SlipError(ValueError):
+    """某一行看不懂或不合規則；訊息直接顯示給使用者"""
+
+
+def _group(text):
+    """
+    一個號碼群 → ("count", 碼數) / ("nums", 號碼) / ("tails", 尾數)
+    """
+    text = text.strip()
+    if text.endswith("尾"):
+        tails = [t for t in _SEP_RE.split(text[:-1]) if t]
+        if not tails or not all(t.isdigit() and len(t) == 1 for t in tails): raise SlipError("尾數請填 0~9")
+        if len(set(tails)) != len(tails): raise SlipError("尾數重複")
+        return "tails", sorted(int(t) for t in tails)
+    tokens = [t for t in _SEP_RE.split(text) if t]
+    if not tokens or not all(t.isdigit() for t in tokens): raise SlipError("格式錯誤 (例: 5碰2星)")
+    if len(tokens) == 1 and (tokens[0] == "0" or not tokens[0].startswith("0")): return "count", int(tokens[0])
+    nums = [int(t) for t in tokens]
+    if any(n < 1 or n > 39 for n in nums): raise SlipError("號碼請介於 01~39")
+    if len(set(nums)) != len(nums): raise SlipError("號碼重複")
+    return "nums", sorted(nums)
+
+
+def _group_nums(group):
+    kind, value = group
+    if kind == "count": return None
+    if kind == "tails": return sorted(n for t in value for n in get_tail_numbers(t))
+    return value
+
+
+def _group_size(group):
+    kind, value = group
+    return value if kind == "count" else len(_group_nums(group))
+
+
+def _stars(text):
+    text = text.strip()
+    if not text: raise SlipError("請選擇星等")
+    if not _STARS_RE.match(text): raise SlipError("格式錯誤 (例: 5碰2星)")
+    stars = tuple(sorted({int(s) for s in re.findall(r"(\d)星", text)}))
+    if any(k not in (2, 3, 4) for k in stars): raise SlipError("星等請選 2~4 星")
+    return stars
+
+
+def parse_bet(text):
+    """
+    解析一注，回傳 spec：
+    {"play", "label", "cols": 立柱各柱碼數, "singles": 連碰 / 坐車碼數 (立柱混合時是另外連碰的碼數),
+     "numbers": 有寫出號碼時 {"cols": [[...], ...], "singles": [...]}，只有碼數時 None,
+     "stars": 買的星等, "amount": 金額, "tails": 坐尾數的尾數}
+    """
+    text = unicodedata.normalize("NFKC", text).strip()
+    if not text: raise SlipError("空白行")
+    amount = 10
+    m = _AMOUNT_RE.search(text)
+    if m and (m.group(1) or m.group(2)) and m.start() > 0:
+        amount = int(m.group(1) or m.group(2))
+        text = text[:m.start()].strip()
+        if amount < 1: raise SlipError("金額至少 1 元")
+
+    if "柱" in text:
+        *col_texts, rest = text.split("柱")
+        cols = [_group(c) for c in col_texts]
+        singles = None
+        if "碰" in rest:
+            single_text, rest = rest.split("碰", 1)
+            singles = _group(single_text)
+        stars = _stars(rest)
+        groups = cols + ([singles] if singles else [])
+        if len(cols) + (_group_size(singles) if singles else 0) < 2: raise SlipError("立柱至少需 2 柱")
+        if any(_group_size(c) == 0 for c in cols): raise SlipError("每柱至少需 1 個號碼")
+        explicit = [g[0] != "count" for g in groups]
+        if any(explicit) and not all(explicit): raise SlipError("碼數與號碼不能混寫")
+        numbers = None
+        if all(explicit):
+            numbers = {"cols": [_group_nums(c) for c in cols], "singles": _group_nums(singles) if singles else []}
+            flat = [n for c in numbers["cols"] for n in c] + numbers["singles"]
+            if len(flat) != len(set(flat)): raise SlipError("不同柱之間不能包含「重複」的號碼")
+        label = "尾數立柱" if any(g[0] == "tails" for g in groups) else "號碼立柱"
+        return {"play": PlayType.LIZHU, "label": label, "cols": [_group_size(c) for c in cols],
+                "singles": _group_size(singles) if singles else 0, "numbers": numbers, "stars": stars, "amount": amount, "tails": None}
+
+    if "碰" in text:
+        group_text, rest = text.split("碰", 1)
+        group = _group(group_text)
+        stars = _stars(rest)
+        n = _group_size(group)
+        if n < 2: raise SlipError("連碰至少需 2 個號碼")
+        if n > 39: raise SlipError("號碼數量請介於 1~39")
+        numbers = None if group[0] == "count" else {"cols": [], "singles": _group_nums(group)}
+        label = "尾數連碰" if group[0] == "tails" else "號碼連碰"
+        return {"play": PlayType.COMBO, "label": label, "cols": [], "singles": n, "numbers": numbers,
+                "stars": stars, "amount": amount, "tails": None}
+
+    if text.endswith("車") or text.endswith("尾"):
+        group = _group(text[:-1] if text.endswith("車") else text)
+        n = _group_size(group)
+        if n < 1 or n > 39: raise SlipError("號碼數量請介於 1~39")
+        numbers = None if group[0] == "count" else {"cols": [], "singles": _group_nums(group)}
+        tails = group[1] if group[0] == "tails" else None
+        label = f"坐尾數({','.join(str(t) for t in tails)})" if tails else "坐車"
+        return {"play": PlayType.CAR, "label": label, "cols": [], "singles": n, "numbers": numbers,
+                "stars": (), "amount": amount, "tails": tails}
+
+    raise SlipError("看不懂的玩法 (例: 5碰2星、3柱4柱2星、5車)")
+
+
+def spec_touches(spec):
+    """{2: 碰數, 3: ..., 4: ..., 5: ...}；坐車沒有碰數"""
+    if spec["play"] == PlayType.CAR: return {}
+    return touch_counts(spec["cols"], spec["singles"])
+
+
+def spec_cost(spec, odds=DEFAULT_ODDS, touches=None):
+    if spec["play"] == PlayType.CAR: return car_cost(spec["singles"], spec["amount"], odds)
+    touches = touches or spec_touches(spec)
+    return touch_cost(sum(touches[k] for k in spec["stars"]), spec["amount"], odds)
+
+
+def spec_to_bet(spec, odds=DEFAULT_ODDS):
+    """有寫出號碼的 spec → Bet (成本、碰數都用兌獎頁同一套算法)；只有碼數的不能下注"""
+    numbers = spec["numbers"]
+    if numbers is None: raise SlipError("只有碼數、沒有號碼，不能加入下注 (例: 01 05 12碰2星)")
+    if spec["play"] == PlayType.CAR:
+        return Bet.build(spec["label"], nums=numbers["singles"], bet_amount=spec["amount"], actual_cost=spec_cost(spec, odds))
+    touches = spec_touches(spec)
+    cost = spec_cost(spec, odds, touches)
+    bought = tuple(k in spec["stars"] for k in (2, 3, 4))
+    won = tuple(touches[k] if b else 0 for k, b in zip((2, 3, 4), bought))
+    if spec["play"] == PlayType.LIZHU:
+        # 柱碰混合：另外連碰的號碼每碼自成一柱
+        cols = numbers["cols"] + [[n] for n in numbers["singles"]]
+        return Bet.build(spec["label"], cols=cols, bet_amount=spec["amount"], actual_cost=cost, stars_bought=bought, touches=won)
+    return Bet.build(spec["label"], nums=numbers["singles"], bet_amount=spec["amount"], actual_cost=cost, stars_bought=bought, touches=won)
+
+
+def iter_slip(lines, odds=DEFAULT_ODDS):
+    """
+    逐行解析 (可以直接丟檔案物件，不用整包讀進來)，空白行與 # 開頭的註解跳過
+    每行產出 (行號, 原文, Bet 或 None, 錯誤訊息或 None)
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        try:
+            yield lineno, line, spec_to_bet(parse_bet(line), odds), None
+        except SlipError as e:
+            yield lineno, line, None, str(e)
+
+
+def decode_slip(raw):
+    """上傳檔的 bytes → 文字：先試 UTF-8 (含 BOM)，不行再試 Big5 / CP950 (Excel 中文版存的 CSV)，都不行丟 SlipError"""
+    for encoding in ("utf-8-sig", "cp950"):
+        try: return raw.decode(encoding)
+        except UnicodeDecodeError: continue
+    raise SlipError("檔案編碼看不懂，請另存成 UTF-8 或 Big5 再上傳")
+
+
+def csv_lines(rows):
+    """CSV 每列：第 1 欄是下注內容，第 2 欄 (可省略) 是金額 → 轉成一般的一行一注"""
+    for row in rows:
+        if not row or not row[0].strip(): yield ""
+        elif len(row) > 1 and row[1].strip(): yield f"{row[0]} x{row[1].strip()}"
+        else: yield row[0]
+
+
+def parse_slip(lines, odds=DEFAULT_ODDS):
+    """整張單一次解析完，回傳 (bets, errors)；errors = [(行號, 原文, 錯誤訊息), ...]"""
+    bets, errors = [], []
+    for lineno, line, bet, err in iter_slip(lines, odds):
+        if bet is None: errors.append((lineno, line, err))
+        else: bets.append(bet)
+    return bets, errors
@@ -0,0 +1,216 @@
+# ==========================================
+# 🗄️ 儲存後端介面 (帳號 / 損益紀錄 / 每日每月彙總)
+# app.py 只認這個介面：雲端用 FirestoreStorage (firestore_storage.py)，本機 / 壓測用 SQLiteStorage
+# 選擇方式：環境變數 LTO539_STORAGE = firestore (預設) / sqlite:檔名 / memory
+# ==========================================
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+from pnl_rollups import DAILY, pnl_curve, range_totals, rollup_deltas
+
+STORAGE_SPEC = os.environ.get("LTO539_STORAGE", "firestore")
+
+
+class Storage(ABC):
+    """
+    所有後端都要有的操作；紀錄一律是 {id, date (YYYY-MM-DD), cost, prize, profit, details} 的 dict
+    區間總計 / 損益曲線由 read_rollups 組出來，各後端只要會讀彙總就好
+    """
+
+    # 👤 帳號
+    @abstractmethod
+    def get_user(self, username):
+        """帳號資料 dict (password / nickname)，沒有這個帳號回 None"""
+
+    @abstractmethod
+    def create_user(self, username, data):
+        """新增帳號，帳號已存在回 False (檢查與寫入是同一個動作，兩個人同時註冊同一個帳號只有一個會成功)"""
+
+    @abstractmethod
+    def update_user(self, username, fields):
+        """更新帳號的部分欄位，沒有這個帳號丟 KeyError"""
+
+    @abstractmethod
+    def list_users(self):
+        """全部帳號名稱"""
+
+    @abstractmethod
+    def delete_user(self, username):
+        """刪掉帳號本身 (紀錄與彙總要另外 clear_history)"""
+
+    # 📝 損益紀錄
+    @abstractmethod
+    def save_records(self, username, records, progress=None, ids=None):
+        """
+        寫入紀錄並累加每日 / 每月彙總 (紀錄和它的彙總一起成功或一起失敗)，回傳寫入的操作筆數
+        ids：指定每筆紀錄的 ID (本地日誌的冪等鍵)，None = 自動產生
+        同一個 ID 已經存在的紀錄絕不會再寫一次、彙總也不會再加 (SQLite 跳過那筆；Firestore 整組失敗，下一輪重送時跳過)
+        """
+
+    @abstractmethod
+    def existing_records(self, ids):
+        """這些紀錄 ID 裡已經存在的 set"""
+
+    @abstractmethod
+    def records_page(self, username, start, end, limit, cursor=None):
+        """
+        區間內的紀錄 (新 → 舊) 從 cursor 之後取 limit 筆，回傳 (紀錄 list, 下一頁的 cursor)
+        cursor 是後端自己的東西，呼叫端只負責原封不動傳回來
+        """
+
+    @abstractmethod
+    def clear_history(self, username, progress=None):
+        """刪掉這個帳號的全部紀錄與彙總，回傳刪除筆數"""
+
+    @abstractmethod
+    def backfill(self, username):
+        """從原始紀錄重算這個帳號的彙總，回傳紀錄筆數"""
+
+    # 📆 彙總
+    @abstractmethod
+    def read_rollups(self, username, kind, start=None, end=None):
+        """kind = DAILY / MONTHLY，期間 (含頭含尾，None = 不限) 內的 [{period, cost, prize, profit, count}, ...]"""
+
+    def range_totals(self, username, start=None, end=None):
+        return range_totals(lambda kind, s, e: self.read_rollups(username, kind, s, e), start, end)
+
+    def pnl_curve(self, username, start=None, end=None, by=DAILY):
+        return pnl_curve(lambda kind, s, e: self.read_rollups(username, kind, s, e), start, end, by)
+
+
+class SQLiteStorage(Storage):
+    """
+    本機版：行為跟 Firestore 版相同 (彙總一起累加、游標分頁、新 → 舊)，不用雲端專案就能開發與壓測
+    path = ":memory:" 是純記憶體 (一個 process 一份)；檔案用 WAL 模式，多個 process 可以共用
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " id TEXT PRIMARY KEY, username TEXT NOT NULL, date TEXT NOT NULL,"
+                " cost REAL, prize REAL, profit REAL, details TEXT, timestamp REAL)"
+            )
+            # 跟 Firestore 的複合索引 (username ↑, date ↓) 同一個用途
+            self._conn.execute("CREATE INDEX IF NOT EXISTS records_user_date ON records (username, date DESC, id DESC)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " username TEXT NOT NULL, kind TEXT NOT NULL, period TEXT NOT NULL,"
+                " cost REAL NOT NULL, prize REAL NOT NULL, profit REAL NOT NULL, count INTEGER NOT NULL,"
+                " PRIMARY KEY (username, kind, period))"
+            )
+
+    def get_user(self, username):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_user(self, username, data):
+        with self._lock, self._conn:
+            return self._conn.execute("INSERT OR IGNORE INTO users VALUES (?, ?)", (username, json.dumps(data, ensure_ascii=False))).rowcount == 1
+
+    def update_user(self, username, fields):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None: raise KeyError(f"沒有這個帳號：{username}") # Firestore 的 update 也不會自動建立文件
+            self._conn.execute("UPDATE users SET data = ? WHERE username = ?",
+                               (json.dumps({**json.loads(row[0]), **fields}, ensure_ascii=False), username))
+
+    def list_users(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT username FROM users")]
+
+    def delete_user(self, username):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    def save_records(self, username, records, progress=None, ids=None):
+        ids = ids or [uuid.uuid4().hex for _ in records]
+        if progress: progress(0, len(records))
+        now = time.time()
+        with self._lock, self._conn:
+            # 同 ID 已存在就跳過 (跟 Firestore 的 create 一樣不覆蓋)，彙總只加真的寫進去的
+            written = [r for i, r in zip(ids, records) if self._conn.execute(
+                "INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (i, username, r["date"], r.get("cost"), r.get("prize"), r.get("profit"), r.get("details"), now)).rowcount]
+            deltas = rollup_deltas(written)
+            total = len(written) + len(deltas)
+            self._conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (username, kind, period) DO UPDATE SET"
+                " cost = cost + excluded.cost, prize = prize + excluded.prize, profit = profit + excluded.profit, count = count + excluded.count",
+                [(username, kind, period, d["cost"], d["prize"], d["profit"], d["count"]) for (kind, period), d in deltas.items()],
+            )
+        if progress: progress(total, total)
+        return total
+
+    def existing_records(self, ids):
+        ids = list(ids)
+        with self._lock:
+            return {r[0] for i in range(0, len(ids), 500)
+                    for r in self._conn.execute(f"SELECT id FROM records WHERE id IN ({','.join('?' * len(ids[i:i + 500]))})", ids[i:i + 500])}
+
+    def records_page(self, username, start, end, limit, cursor=None):
+        sql, args = "SELECT id, date, cost, prize, profit, details FROM records WHERE username = ?", [username]
+        if start: sql += " AND date >= ?"; args.append(start)
+        if end: sql += " AND date <= ?"; args.append(end)
+        if cursor: sql += " AND (date < ? OR (date = ? AND id < ?))"; args += [cursor[0], cursor[0], cursor[1]]
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY date DESC, id DESC LIMIT ?", args + [limit]).fetchall()
+        recs = [dict(zip(("id", "date", "cost", "prize", "profit", "details"), r)) for r in rows]
+        return recs, (rows[-1][1], rows[-1][0]) if rows else cursor
+
+    def read_rollups(self, username, kind, start=None, end=None):
+        sql, args = "SELECT period, cost, prize, profit, count FROM rollups WHERE username = ? AND kind = ?", [username, kind]
+        if start: sql += " AND period >= ?"; args.append(start)
+        if end: sql += " AND period <= ?"; args.append(end)
+        with self._lock:
+            return [dict(zip(("period", "cost", "prize", "profit", "count"), r)) for r in self._conn.execute(sql, args)]
+
+    def clear_history(self, username, progress=None):
+        with self._lock, self._conn:
+            n = self._conn.execute("DELETE FROM records WHERE username = ?", (username,)).rowcount
+            n += self._conn.execute("DELETE FROM rollups WHERE username = ?", (username,)).rowcount
+        if progress: progress(n, n)
+        return n
+
+    def backfill(self, username):
+        with self._lock, self._conn:
+            # 舊紀錄的 YYYY/MM/DD 日期也改成存檔格式 (跟 Firestore 版一樣)
+            self._conn.execute("UPDATE records SET date = REPLACE(date, '/', '-') WHERE username = ? AND date LIKE '%/%'", (username,))
+            records = [{"date": r[0], "cost": r[1], "prize": r[2], "profit": r[3]}
+                       for r in self._conn.execute("SELECT date, cost, prize, profit FROM records WHERE username = ?", (username,))]
+            self._conn.execute("DELETE FROM rollups WHERE username = ?", (username,))
+            self._conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(username, kind, period, d["cost"], d["prize"], d["profit"], d["count"])
+                 for (kind, period), d in rollup_deltas(r for r in records if r["date"]).items()],
+            )
+        return len(records)
+
+
+def open_storage(spec=STORAGE_SPEC, key_path="firebase_key.json"):
+    """
+    firestore → FirestoreStorage (還沒初始化 Firebase 就用 key_path 的金鑰初始化)
+    sqlite:檔名 → 本機檔案；memory → 純記憶體
+    """
+    if spec == "memory": return SQLiteStorage(":memory:")
+    if spec.startswith("sqlite:"): return SQLiteStorage(spec[len("sqlite:"):])
+    if spec == "firestore":
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        from firestore_storage import FirestoreStorage
+        if not firebase_admin._apps: firebase_admin.initialize_app(credentials.Certificate(key_path))
+        return FirestoreStorage(firestore.client())
+    raise ValueError(f"看不懂的儲存後端：{spec} (firestore / sqlite:檔名 / memory)")
@@ -0,0 +1,40 @@
+# ==========================================
+# 🔢 碰數計算 (立柱 / 連碰 / 柱碰混合，一次 DP 算出 2~5 星全部碰數)
+# ==========================================
+import math
+from functools import lru_cache
+
+MAX_STAR = 5 # 一期只開 5 顆，最多到 5 星
+
+
+@lru_cache(maxsize=8192)
+def _esp(counts):
+    """
+    各柱碼數的基本對稱多項式 e[0..5]：e[k] = 任選 k 柱、每柱挑 1 碼的組合數 = k 星碰數
+    逐柱更新 e[k] += e[k-1] × c，O(柱數 × 星等)；counts 要先排序好當快取鍵
+    """
+    e = [1] + [0] * MAX_STAR
+    for c in counts:
+        for k in range(MAX_STAR, 0, -1): e[k] += e[k - 1] * c
+    return tuple(e)
+
+
+def touch_counts(cols=(), singles=0):
+    """
+    回傳 {2: 2星碰數, 3: ..., 4: ..., 5: ...}
+    cols：立柱各柱的碼數 (或中獎數)；singles：另外連碰的號碼數 (每碼自成一柱)
+    只有 singles = 連碰 C(n, k)；只有 cols = 立柱；兩者都有 = 柱碰混合
+    """
+    return dict(_touch_counts(tuple(sorted(cols)), singles))
+
+
+@lru_cache(maxsize=8192)
+def _touch_counts(cols, singles):
+    e = _esp(cols)
+    return tuple((k, sum(e[j] * math.comb(singles, k - j) for j in range(k + 1))) for k in range(2, MAX_STAR + 1))
+
+
+def total_touches(cols=(), singles=0, stars=(2,)):
+    """買了哪些星等的總碰數"""
+    t = touch_counts(cols, singles)
+    return sum(t[k] for k in stars)